@@ -7,10 +7,43 @@ const totalTimeInput = document.getElementById('total_time_ms');
 const intervalTimeInput = document.getElementById('interval_time_ms');
 const totalTimeInputPredict = document.getElementById('total_time_ms_predict');
 const intervalTimeInputPredict = document.getElementById('interval_time_ms_predict');
+const livePredictionSpan = document.getElementById('livePrediction');
+
+// Live predictions: every bounce goes to /ws/bounces right away and the server answers with an updated height.
+// the forms below keep working without it
+let socket = null;
+
+function connectLive() {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    socket = new WebSocket(`${protocol}//${window.location.host}/ws/bounces`);
+    socket.addEventListener('message', (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'prediction' && message.predicted_height_cm !== null) {
+            livePredictionSpan.textContent = message.predicted_height_cm.toFixed(2);
+        } else if (message.type === 'error') {
+            console.log("live prediction: ", message.detail);
+        }
+    });
+    socket.addEventListener('close', () => { socket = null; });
+}
+
+function sendLive(message) {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify(message));
+    }
+}
 
 // Start Timer
 function startTimer() {
     startTime = new Date();
+    bounces = [];
+    livePredictionSpan.textContent = '-';
+    if (!socket) {
+        connectLive();
+        socket.addEventListener('open', () => sendLive({ type: 'start' }));
+    } else {
+        sendLive({ type: 'start' });
+    }
     interval = setInterval(updateTime, 100);
     startButton.disabled = true;
     stopButton.disabled = false;
@@ -34,6 +67,7 @@ function recordBounce() {
     let now = new Date();
     let bounceTime = (now - startTime) / 1000; // in seconds
     bounces.push(bounceTime);
+    sendLive({ type: 'bounce', t_ms: bounceTime * 1000 });
     calculateInterval();
 }
 
@@ -0,0 +1,323 @@
+"""Benchmark suite for TenniScale.
+
+Times FortunaModel (calibrate, fit, mean_squared_error, predict), the rendering of the /api/results figures and the
+/api/predict and /api/measure routes through an in-process test client, on synthetic datasets of 10^2 up to 10^6 rows.
+Every timed run loops a benchmark for at least --min-time seconds like timeit does. Results are written as json, and
+can be compared against a stored baseline to flag regressions, by the fastest run and ignoring slowdowns within the
+noise of the two runs:
+
+    python -m src.bench --output bench.json
+    python -m src.bench --baseline bench.json --output new.json   # exits with 1 if something got slower than --threshold
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+from src.logs import configure_logging
+
+
+DEFAULT_SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+HEIGHTS = np.arange(20, 220, 20)
+
+# every timed run loops the benchmark for at least this long, see autorange()
+MIN_RUN_S = 0.2
+
+# the statistic compare() looks at. the min is what the code costs, everything above it is noise from the machine
+COMPARE_STATISTIC = "min_s"
+
+# slowdowns smaller than this are never a regression, in seconds per call
+NOISE_FLOOR_S = 1e-6
+
+# by name, run with python -m this module is __main__ and wouldnt hang below the "src" logger
+logger = logging.getLogger("src.bench")
+
+
+def synthetic_bounces(n, seed=0):
+    """generates n bounce measurements that look roughly like the real ones: drops from the usual heights
+    with shrinking intervals and a bit of noise
+
+    Args:
+        n (int): number of rows
+        seed (int, optional): seed of the generator, same seed same data. Defaults to 0.
+
+    Returns:
+        dict: the COLUMNS of the measurement store -> np.ndarray (without the string time columns)
+    """
+    rng = np.random.default_rng(seed)
+    height = rng.choice(HEIGHTS, size=n).astype(np.float64)
+    bounce_number = rng.integers(1, 9, size=n).astype(np.float64)
+    # the first interval grows with the height, every bounce after that is a bit shorter
+    first = 150 + 2.5 * height
+    interval = first * 0.75 ** (bounce_number - 1) + rng.normal(0, 40, size=n)
+    interval = np.clip(interval, 50, None).round()
+    total = (first * (1 - 0.75 ** bounce_number) / 0.25 + rng.normal(0, 80, size=n)).round()
+    total = np.maximum(total, interval)
+    return {
+        'Height': height,
+        'Bounce Number': bounce_number,
+        'Total Time (ms)': total,
+        'Interval Time (ms)': interval,
+    }
+
+
+def as_records(columns):
+    """the list of dicts format FortunaModel.calibrate and the plots take"""
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*(columns[key].tolist() for key in keys))]
+
+
+def autorange(timer, min_time=MIN_RUN_S):
+    """the number of loops that makes one timed run take at least min_time, like timeit's autorange: 1, 2, 5, 10,
+    20, 50... calls. the calls it makes along the way are the warmup
+
+    Args:
+        timer (timeit.Timer): the timer of the benchmark
+        min_time (float, optional): seconds. Defaults to MIN_RUN_S.
+    """
+    loops = 1
+    while True:
+        for multiplier in (1, 2, 5):
+            if timer.timeit(loops * multiplier) >= min_time:
+                return loops * multiplier
+        loops *= 10
+
+
+def measure(fn, repeat, min_time=MIN_RUN_S):
+    """times fn the way timeit does: every run calls it in a loop for at least min_time seconds, so one slow call
+    (or the resolution of the clock) doesnt decide the result of fast functions
+
+    Args:
+        fn (Callable[[], Any]): the benchmark
+        repeat (int): timed runs
+        min_time (float, optional): seconds per run, see autorange(). Defaults to MIN_RUN_S.
+
+    Returns:
+        dict: the loops per run and the stats of the time per call in seconds
+    """
+    timer = timeit.Timer(fn)
+    loops = autorange(timer, min_time)
+    times = [run / loops for run in timer.repeat(repeat, loops)]
+    return {
+        "repeat": repeat,
+        "loops": loops,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def bench_model(sizes, repeat, params_file, workers=1, min_time=MIN_RUN_S):
+    """FortunaModel.calibrate, fit, mean_squared_error and predict_array per dataset size. with workers > 1 the
+    parallel search is timed as well, as fortuna.calibrate_parallel"""
+    from src.fortuna import FortunaModel
+
+    results = []
+    for n in sizes:
+        columns = synthetic_bounces(n)
+        records = as_records(columns)
+        X = np.column_stack([columns['Total Time (ms)'], columns['Interval Time (ms)']])
+        y = columns['Height']
+        model = FortunaModel(params_file=params_file)
+        params = [0.02, 0.15, 0.9]
+        # set up once, outside the timed calls: an mse no candidate can beat, so every calibrate does the whole
+        # search but never publishes a snapshot or writes the params file
+        model.publish(params, 0.0)
+        _, predictions = model.fit(X, y, params)
+
+        benchmarks = [
+            ("fortuna.calibrate", lambda: model.calibrate(records)),
+            ("fortuna.fit", lambda: model.fit(X, y, params)),
+            ("fortuna.mean_squared_error", lambda: model.mean_squared_error(predictions, y)),
+            ("fortuna.predict_array", lambda: model.predict_array(X)),
+        ]
+        if workers > 1:
+            benchmarks.append(("fortuna.calibrate_parallel", lambda: model.calibrate(records, workers=workers, seed=0)))
+        for name, fn in benchmarks:
+            # calibrate on the big sizes takes a while, no need to do it as often
+            runs = repeat if not name.startswith("fortuna.calibrate") or n <= 10 ** 4 else max(1, repeat // 3)
+            results.append(dict(name=name, rows=n, **measure(fn, runs, min_time)))
+            logger.info("benchmark finished", extra={"benchmark": name, "rows": n,
+                                                     "median_s": results[-1]["median_s"]})
+    return results
+
+
+def bench_render(sizes, repeat, min_time=MIN_RUN_S):
+    """renders every /api/results figure from scratch, like a cold plot cache would"""
+    from src.plots import PLOT_NAMES, plot_inputs, render_png
+
+    results = []
+    for n in sizes:
+        records = as_records(synthetic_bounces(n))
+        groups, stats = plot_inputs(records, records)
+        for name in PLOT_NAMES:
+            timing = measure(lambda: render_png(name, groups, stats), repeat, min_time)
+            results.append(dict(name=f"render.{name}", rows=n, **timing))
+            logger.info("benchmark finished", extra={"benchmark": f"render.{name}", "rows": n,
+                                                     "median_s": timing["median_s"]})
+    return results
+
+
+def bench_routes(requests, repeat, min_time=MIN_RUN_S):
+    """/api/predict and /api/measure through the in-process test client, against a throw away database and params file
+
+    Args:
+        requests (int): requests per timed run
+        repeat (int): timed runs per route
+        min_time (float, optional): see measure(). Defaults to MIN_RUN_S.
+    """
+    from fastapi.testclient import TestClient
+    from src import main
+
+    results = []
+    with TestClient(main.app) as client:
+        form = {"total_time_ms": "900", "interval_time_ms": "500"}
+        measurement = dict(form, height="100")
+
+        def predict():
+            for _ in range(requests):
+                client.post("/api/predict", data=form)
+
+        def submit():
+            for _ in range(requests):
+                client.post("/api/measure", data=measurement, follow_redirects=False)
+
+        for name, fn in (("route.predict", predict), ("route.measure", submit)):
+            stats = measure(fn, repeat, min_time)
+            stats.update(requests=requests, per_request_median_s=stats["median_s"] / requests)
+            results.append(dict(name=name, rows=None, **stats))
+            logger.info("benchmark finished", extra={"benchmark": name, "requests": requests,
+                                                     "per_request_median_s": stats["per_request_median_s"]})
+    return results
+
+
+def compare(results, baseline, threshold, statistic=COMPARE_STATISTIC, noise_floor=NOISE_FLOOR_S):
+    """compares the results against a baseline run. a benchmark only counts as a regression when it is more than
+    `threshold` slower and the slowdown is bigger than the noise: the noise floor, or the spread (median - min)
+    of either run if that is bigger
+
+    Args:
+        results (List[dict]): the results of this run
+        baseline (dict): a json report written by an earlier run
+        threshold (float): allowed slowdown, 0.2 means 20% slower is still fine
+        statistic (str, optional): "min_s" or "median_s". Defaults to COMPARE_STATISTIC.
+        noise_floor (float, optional): seconds per call. Defaults to NOISE_FLOOR_S.
+
+    Returns:
+        List[dict]: one entry per benchmark that is in both runs, with the ratio and a regression flag
+    """
+    previous = {(entry["name"], entry["rows"]): entry for entry in baseline.get("results", [])}
+    comparison = []
+    for entry in results:
+        before = previous.get((entry["name"], entry["rows"]))
+        if before is None or not before.get(statistic):
+            continue
+        ratio = entry[statistic] / before[statistic]
+        noise = max(noise_floor, before["median_s"] - before["min_s"], entry["median_s"] - entry["min_s"])
+        comparison.append({
+            "name": entry["name"],
+            "rows": entry["rows"],
+            "statistic": statistic,
+            "baseline_s": before[statistic],
+            "current_s": entry[statistic],
+            "ratio": ratio,
+            "noise_s": noise,
+            "regression": ratio > 1 + threshold and entry[statistic] - before[statistic] > noise,
+        })
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="TenniScale benchmark suite")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="comma separated dataset sizes for the model benchmarks")
+    parser.add_argument("--render-max", type=int, default=10 ** 5,
+                        help="largest dataset size the figures are rendered for, rendering a million points takes minutes")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--min-time", type=float, default=MIN_RUN_S,
+                        help="seconds every timed run loops the benchmark for at least")
+    parser.add_argument("--requests", type=int, default=50, help="requests per timed run of the route benchmarks")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for the parallel calibration benchmark, 1 skips it")
+    parser.add_argument("--only", default="model,render,routes", help="which groups to run")
+    parser.add_argument("--output", help="write the json report here instead of stdout")
+    parser.add_argument("--baseline", help="json report of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown vs the baseline that counts as a regression")
+    parser.add_argument("--statistic", choices=("min_s", "median_s"), default=COMPARE_STATISTIC,
+                        help="what is compared against the baseline")
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR_S,
+                        help="slowdowns below this many seconds per call are never a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    configure_logging()
+    args = parse_args(argv)
+    sizes = [int(n) for n in args.sizes.split(",") if n]
+    groups = set(args.only.split(","))
+
+    # never touch the real database or params file
+    workdir = tempfile.mkdtemp(prefix="tenniscale-bench-")
+    params_file = os.path.join(workdir, "best_params.json")
+    shutil.copy("assets/best_params.json", params_file)
+    os.environ.update({
+        "TENNISCALE_DB": os.path.join(workdir, "measurements.sqlite3"),
+        "TENNISCALE_PARAMS_FILE": params_file,
+        "TENNISCALE_CALIBRATION_DEBOUNCE": "0.05",
+    })
+
+    results = []
+    try:
+        # anything the app prints goes to stderr, stdout is reserved for the json report
+        with contextlib.redirect_stdout(sys.stderr):
+            if "model" in groups:
+                results += bench_model(sizes, args.repeat, os.path.join(workdir, "bench_params.json"), args.workers,
+                                        args.min_time)
+            if "render" in groups:
+                results += bench_render([n for n in sizes if n <= args.render_max], args.repeat, args.min_time)
+            if "routes" in groups:
+                results += bench_routes(args.requests, args.repeat, args.min_time)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(results, json.load(f), args.threshold, args.statistic, args.noise_floor)
+        regressions = [entry for entry in report["comparison"] if entry["regression"]]
+        for entry in regressions:
+            logger.warning("regression against the baseline", extra={"benchmark": entry["name"], "rows": entry["rows"],
+                                                "ratio": entry["ratio"]})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import logging
+import queue
+import threading
+import time
+
+from src.metrics import CALIBRATION_EPOCHS, CALIBRATION_RUNS, CALIBRATION_SECONDS
+
+
+# put on the queue to tell the worker thread to exit
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class CalibrationService:
+    """Runs FortunaModel.calibrate on a dedicated worker thread so the request handlers never do the heavy lifting themselves.
+
+    handlers call request() which only puts a job on the queue. the worker waits until no new job has shown up for
+    `debounce` seconds and then does a single calibration run for all of the jobs it collected, so a burst of
+    measurements costs one calibration instead of one each. a steady stream of requests would keep it waiting
+    forever, so after `max_delay` seconds the collected batch runs anyway.
+    the run happens on a staging copy of the model and its new snapshot is swapped into the live model in one step
+    when it finishes, so predictions never see a half calibrated model.
+    """
+
+    def __init__(self, model, data_provider, debounce=0.5, on_publish=None, version_provider=None, max_delay=None):
+        """
+        Args:
+            model (FortunaModel): the live model the results get published to
+            data_provider (Callable[[], List[dict]]): returns the dataset to calibrate on. called once at the start of every run
+            debounce (float, optional): seconds without new requests before a run starts. Defaults to 0.5.
+            on_publish (Callable[[], None], optional): called after new params were published to the live model. Defaults to None.
+            version_provider (Callable[[], int], optional): returns the dataset version, it ends up in the published
+                snapshot. Defaults to None.
+            max_delay (float, optional): longest a request waits for its run, in seconds. Defaults to 10x debounce.
+        """
+        self.model = model
+        self.data_provider = data_provider
+        self.version_provider = version_provider
+        self.debounce = debounce
+        self.max_delay = max_delay if max_delay is not None else 10 * debounce
+        self.on_publish = on_publish
+
+        self._jobs = queue.Queue()
+        self._publish_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = 0
+        self._thread = None
+
+        self.running = False
+        self.runs = 0
+        self.coalesced = 0
+        self.last_duration = None
+        self.last_finished = None
+        self.last_error = None
+        self.last_evaluations = None
+        self.last_search = None
+
+    def start(self):
+        """starts the worker thread, does nothing if its already running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._work, name="calibration-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """asks the worker to finish and waits for it. a run that already started is allowed to complete"""
+        if self._thread is None:
+            return
+        self._jobs.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def request(self, reason="api"):
+        """schedules a calibration. cheap enough to call from inside a request handler
+
+        Args:
+            reason (str, optional): where the request came from, only kept for debugging. Defaults to "api".
+        """
+        with self._pending_lock:
+            self._pending += 1
+        self._jobs.put(reason)
+
+    def queue_depth(self):
+        """how many requests are waiting to be folded into the next run, including the ones the worker is debouncing"""
+        return self._pending
+
+    def status(self):
+        """a json friendly summary of what the worker is doing
+
+        Returns:
+            dict: queue depth, whether a run is going on right now and stats about the last run, including how many
+                candidates it evaluated
+        """
+        return {
+            "queue_depth": self.queue_depth(),
+            "running": self.running,
+            "runs": self.runs,
+            "coalesced_requests": self.coalesced,
+            "last_duration_s": self.last_duration,
+            "last_finished": self.last_finished,
+            "last_error": self.last_error,
+            "last_evaluations": self.last_evaluations,
+            "last_search": self.last_search,
+        }
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is _STOP:
+                return
+
+            # debounce: keep swallowing requests until it has been quiet for a while, but no longer than max_delay
+            batch = 1
+            stop = False
+            deadline = time.monotonic() + self.max_delay
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._jobs.get(timeout=min(self.debounce, remaining))
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+                batch += 1
+
+            self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch):
+        with self._pending_lock:
+            self._pending -= batch
+        self.running = True
+        started = time.perf_counter()
+        try:
+            # the version is read first, the data can only have grown since
+            version = self.version_provider() if self.version_provider is not None else None
+            data = self.data_provider()
+            staging = self.model.staging_copy()
+            baseline = staging.snapshot
+            staging.calibrate(data, dataset_version=version)
+            self.publish(staging, baseline)
+            self.last_error = None
+            self.last_evaluations = staging.last_evaluations
+            self.last_search = staging.last_search
+            CALIBRATION_RUNS.labels(outcome="ok").inc()
+            CALIBRATION_EPOCHS.inc(staging.last_evaluations)
+            # measurements that came in while we were busy are not part of this run, so go again
+            if len(self.data_provider()) != len(data):
+                self.request("stale")
+        except Exception as e:  # the worker has to survive a bad run, the error shows up in status()
+            self.last_error = repr(e)
+            CALIBRATION_RUNS.labels(outcome="error").inc()
+            logger.exception("calibration failed", extra={"requests": batch})
+        finally:
+            self.running = False
+            self.runs += 1
+            self.coalesced += batch - 1
+            self.last_duration = time.perf_counter() - started
+            self.last_finished = time.time()
+            CALIBRATION_SECONDS.observe(self.last_duration)
+            logger.debug("calibration run finished", extra={"requests": batch, "duration_s": self.last_duration})
+
+    def publish(self, staging, baseline=None):
+        """swaps the snapshot of `staging` into the live model. its one reference assignment, so a concurrent
+        predict() sees either the old or the new snapshot, never a mix
+
+        Args:
+            staging (FortunaModel): the calibrated copy, see FortunaModel.staging_copy()
+            baseline (ModelSnapshot, optional): the snapshot the copy started from. if the run didnt get past it there
+                is nothing to publish. Defaults to None (always publish).
+        """
+        with self._publish_lock:
+            live = self.model.qr
+            if live is not None and staging.qr is not None and live.n > staging.qr.n:
+                # update() folded in rows the run didnt have, its factorization and snapshot would take them out
+                # again. the stale rerun covers them
+                return
+            self.model.qr = staging.qr
+            if staging.snapshot is baseline:
+                return
+            self.model.install(staging.snapshot)
+        if self.on_publish is not None:
+            self.on_publish()
+
+    def update(self, rows, dataset_version=None):
+        """folds new measurements into the live least squares solution, see FortunaModel.update(). it holds the
+        same lock as publish(), so the live factorization and snapshot only ever have one writer at a time
+
+        Args:
+            rows (List[dict]): the new measurements
+            dataset_version (int, optional): the dataset version including them. Defaults to None.
+        """
+        if not rows:
+            return
+        with self._publish_lock:
+            for row in rows:
+                self.model.update(row['Total Time (ms)'], row['Interval Time (ms)'], row['Height'], dataset_version)
+        if self.on_publish is not None:
+            self.on_publish()
@@ -1,12 +1,14 @@
+"""Turns the lap log below into src/tennis_ball_bounce_data.csv and a markdown table.
+the parsing lives in src/ingest.py, run this from the repo root with `python -m src.clean`
+"""
 import csv
+import logging
+import os
+
+from src.ingest import iter_batches
+from src.logs import configure_logging
 
-def time_to_milliseconds(time_str):
-    """Convert time in format MM:SS.SS to milliseconds."""
-    minutes, seconds = time_str.split(':')
-    minutes = int(minutes)
-    seconds = float(seconds)
-    milliseconds = (minutes * 60 + seconds) * 1000
-    return int(milliseconds)
+logger = logging.getLogger(__name__)
 
 # Data as a multiline string
 data = """
@@ -269,56 +271,34 @@ data = """
   05      00:01.51      00:00.26
 """
 
-# Parsing the data
-rows = []
-lines = data.strip().split('\n')
-current_height = None
-
-for line in lines:
-    line = line.strip()
-    
-    if line.isdigit():  # Line with just a number indicates a new height
-        current_height = int(line)
-    elif line:  # If the line is not empty, it has data
-        parts = line.split()
-        bounce_number = int(parts[0])
-        total_time = parts[1]
-        interval_time = parts[2]
-        
-        # Append parsed data as a row in the rows list
-        rows.append({
-            "Height": current_height,
-            "Total Time (ms)": time_to_milliseconds(total_time),
-            "Interval Time (ms)": time_to_milliseconds(interval_time),
-            "Bounce Number": bounce_number,
-            "Total Time": total_time,
-            "Interval Time": interval_time
-        })
-        
-
-
-# Writing the data to a CSV file
-csv_filename = "tennis_ball_bounce_data.csv"
-with open(csv_filename, mode='w', newline='') as csv_file:
-    fieldnames = ["Height", "Bounce Number", "Total Time", "Interval Time", "Total Time (ms)", "Interval Time (ms)"]
-    writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-
-    writer.writeheader()
-    for row in rows:
-        writer.writerow(row)
-
-print(f"CSV file '{csv_filename}' created successfully.")
-
-
-# Creating Markdown table
-md_filename = "tennis_ball_bounce_data.md"
-with open(md_filename, mode='w') as md_file:
-    # Writing the header of the markdown table
-    md_file.write("| Height | Bounce Number | Total Time | Interval Time | Total Time (ms) | Interval Time (ms) |\n")
-    md_file.write("| ------ | ------------- | ---------- | ------------- | --------------- | ------------------ |\n")
-    
-    # Writing each row
-    for row in rows:
-        md_file.write(f"| {row['Height']} | {row['Bounce Number']} | {row['Total Time']} | {row['Interval Time']} | {row['Total Time (ms)']} | {row['Interval Time (ms)']} |\n")
-
-print(f"Markdown file '{md_filename}' created successfully.")
\ No newline at end of file
+
+def main():
+    configure_logging()
+    # write next to this file, where the app expects the csv
+    directory = os.path.dirname(os.path.abspath(__file__))
+    csv_filename = os.path.join(directory, "tennis_ball_bounce_data.csv")
+    md_filename = os.path.join(directory, "tennis_ball_bounce_data.md")
+
+    # Parsing the data and writing both files in one streaming pass
+    with open(csv_filename, mode='w', newline='') as csv_file, open(md_filename, mode='w') as md_file:
+        fieldnames = ["Height", "Bounce Number", "Total Time", "Interval Time", "Total Time (ms)", "Interval Time (ms)"]
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+
+        # Writing the header of the markdown table
+        md_file.write("| Height | Bounce Number | Total Time | Interval Time | Total Time (ms) | Interval Time (ms) |\n")
+        md_file.write("| ------ | ------------- | ---------- | ------------- | --------------- | ------------------ |\n")
+
+        for rows, errors in iter_batches(data.splitlines()):
+            for error in errors:
+                logger.warning("skipped a line", extra={"error": error})
+            for row in rows:
+                writer.writerow(row)
+                md_file.write(f"| {row['Height']} | {row['Bounce Number']} | {row['Total Time']} | {row['Interval Time']} | {row['Total Time (ms)']} | {row['Interval Time (ms)']} |\n")
+
+    logger.info("CSV file '%s' created successfully.", csv_filename)
+    logger.info("Markdown file '%s' created successfully.", md_filename)
+
+
+if __name__ == "__main__":
+    main()
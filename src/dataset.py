@@ -0,0 +1,241 @@
+"""The in memory dataset of bounce measurements, as numpy columns instead of a list of dicts.
+
+a dict per row costs a few hundred bytes and every consumer had to turn the list into tuples or a DataFrame
+again. BounceDataset keeps one growing array per column:
+
+    dataset = BounceDataset(rows)     # or BounceDataset.from_columns(columns)
+    dataset.append(row)               # amortized O(1), the arrays double when they are full
+    X, y = dataset.arrays()           # (N, 2) and (N,) float64 views, no copy
+    frozen = dataset.snapshot()       # O(1), keeps seeing the first N rows while the dataset grows
+    df = dataset.to_frame()           # only when pandas is really needed
+
+appends only ever write behind the rows that are already there, and growing copies into a new buffer, so the
+views and snapshots handed out earlier never change under the reader.
+"""
+import threading
+
+import numpy as np
+
+from src.store import COLUMNS
+
+
+# the numeric columns, a missing bounce number is nan
+NUMERIC_COLUMNS = ("Height", "Bounce Number", "Total Time (ms)", "Interval Time (ms)")
+
+# the lap log strings, None if the row has none
+STRING_COLUMNS = ("Total Time", "Interval Time")
+
+# the two features share one (capacity, 2) buffer so X is a view without a copy
+_FEATURES = ("Total Time (ms)", "Interval Time (ms)")
+
+
+class BounceDataset:
+    """append only measurements in numpy columns, see the module docstring"""
+
+    def __init__(self, rows=(), capacity=1024):
+        """
+        Args:
+            rows (Iterable[dict], optional): measurement dicts with the COLUMNS keys. Defaults to ().
+            capacity (int, optional): rows to allocate up front. Defaults to 1024.
+        """
+        self._lock = threading.Lock()
+        self._frozen = False
+        self._size = 0
+        self._allocate(max(int(capacity), 1))
+        self.extend(rows)
+
+    @classmethod
+    def from_columns(cls, columns, capacity=None):
+        """a dataset straight from numpy columns, like MeasurementStore.load_arrays() and the startup snapshot
+        give them. the columns are copied into the buffers as a whole, no dict per row
+
+        Args:
+            columns (dict): COLUMNS name -> array of equal length. the numbers as floats with nan for a missing
+                bounce number, the strings with None for missing ones. other keys (like 'id') are ignored
+            capacity (int, optional): rows to allocate. Defaults to the number of rows.
+        """
+        n = len(columns['Height'])
+        dataset = cls(capacity=max(n, capacity or 0, 1))
+        if n:
+            for position, column in enumerate(_FEATURES):
+                dataset._features[:n, position] = columns[column]
+            dataset._heights[:n] = columns['Height']
+            dataset._bounces[:n] = columns['Bounce Number']
+            for column in STRING_COLUMNS:
+                dataset._strings[column][:n] = columns[column]
+            dataset._size = n
+        return dataset
+
+    def _allocate(self, capacity):
+        features = np.empty((capacity, 2), dtype=np.float64)
+        heights = np.empty(capacity, dtype=np.float64)
+        bounces = np.empty(capacity, dtype=np.float64)
+        strings = {column: np.empty(capacity, dtype=object) for column in STRING_COLUMNS}
+        n = self._size
+        if n:
+            features[:n] = self._features[:n]
+            heights[:n] = self._heights[:n]
+            bounces[:n] = self._bounces[:n]
+            for column in STRING_COLUMNS:
+                strings[column][:n] = self._strings[column][:n]
+        # swapped in together, a reader always sees a complete set of buffers
+        self._features, self._heights, self._bounces, self._strings = features, heights, bounces, strings
+
+    @property
+    def capacity(self):
+        return len(self._heights)
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row):
+        """adds one measurement dict"""
+        self.extend((row,))
+
+    def extend(self, rows):
+        """adds measurement dicts, in order"""
+        rows = rows if isinstance(rows, (list, tuple)) else list(rows)
+        if not rows:
+            return
+        with self._lock:
+            if self._frozen:
+                raise ValueError("a dataset snapshot is read only")
+            n, new = self._size, len(rows)
+            if n + new > self.capacity:
+                capacity = self.capacity
+                while capacity < n + new:
+                    capacity *= 2
+                self._allocate(capacity)
+            end = n + new
+            self._features[n:end] = [(row['Total Time (ms)'], row['Interval Time (ms)']) for row in rows]
+            self._heights[n:end] = [row['Height'] for row in rows]
+            self._bounces[n:end] = [np.nan if row.get('Bounce Number') is None else row['Bounce Number'] for row in rows]
+            for column in STRING_COLUMNS:
+                self._strings[column][n:end] = [row.get(column) for row in rows]
+            # only now the new rows become visible to len() and the views
+            self._size = end
+
+    def snapshot(self, size=None):
+        """a read only dataset over the first `size` rows. it shares the buffers, so its O(1) and stays the same
+        no matter what gets appended to this dataset afterwards
+
+        Args:
+            size (int, optional): rows to include. Defaults to all of them.
+        """
+        frozen = BounceDataset.__new__(BounceDataset)
+        with self._lock:
+            frozen._lock = threading.Lock()
+            frozen._frozen = True
+            frozen._size = self._size if size is None else min(int(size), self._size)
+            frozen._features, frozen._heights, frozen._bounces = self._features, self._heights, self._bounces
+            frozen._strings = self._strings
+        return frozen
+
+    def arrays(self):
+        """the features and targets for the model, without copying
+
+        Returns:
+            tuple: (X, y), a read only C-contiguous (N, 2) float64 view of (total time, interval time) in ms and
+                a read only (N,) float64 view of the heights in cm
+        """
+        with self._lock:
+            n, features, heights = self._size, self._features, self._heights
+        return _read_only(features[:n]), _read_only(heights[:n])
+
+    def column(self, name):
+        """one column as a read only view, the string columns are object arrays
+
+        Raises:
+            KeyError: for names that arent in COLUMNS
+        """
+        with self._lock:
+            n = self._size
+            if name in _FEATURES:
+                values = self._features[:, _FEATURES.index(name)]
+            elif name == 'Height':
+                values = self._heights
+            elif name == 'Bounce Number':
+                values = self._bounces
+            else:
+                values = self._strings[name]
+        return _read_only(values[:n])
+
+    def mask(self, max_bounce):
+        """which rows the model learns from: the first `max_bounce` bounces and everything without a bounce number
+
+        Returns:
+            np.ndarray: (N,) bool
+        """
+        bounces = self.column('Bounce Number')
+        return np.isnan(bounces) | (bounces <= max_bounce)
+
+    def select(self, mask):
+        """a new (writable) dataset with the rows where `mask` is True"""
+        n = int(np.count_nonzero(mask))
+        selected = BounceDataset(capacity=max(n, 1024))
+        if n:
+            X, y = self.arrays()
+            selected._features[:n] = X[mask]
+            selected._heights[:n] = y[mask]
+            selected._bounces[:n] = self.column('Bounce Number')[mask]
+            for column in STRING_COLUMNS:
+                selected._strings[column][:n] = self.column(column)[mask]
+            selected._size = n
+        return selected
+
+    def row(self, position):
+        """one measurement as the dict the rest of the app knows"""
+        if not -self._size <= position < self._size:
+            raise IndexError(position)
+        position %= self._size
+        bounce = self._bounces[position]
+        return {
+            'Height': _plain(self._heights[position]),
+            'Bounce Number': None if bounce != bounce else _plain(bounce),
+            'Total Time': self._strings['Total Time'][position],
+            'Interval Time': self._strings['Interval Time'][position],
+            'Total Time (ms)': _plain(self._features[position, 0]),
+            'Interval Time (ms)': _plain(self._features[position, 1]),
+        }
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._size)
+            if start == 0 and step == 1:
+                return self.snapshot(stop)
+            return BounceDataset(self.row(position) for position in range(start, stop, step))
+        return self.row(key)
+
+    def __iter__(self):
+        # a fixed length, rows appended while iterating are not part of it
+        for position in range(self._size):
+            yield self.row(position)
+
+    def rows(self):
+        """all rows as a list of measurement dicts, for the code that still wants them"""
+        return list(self)
+
+    def to_frame(self):
+        """the rows as a DataFrame with the usual column names. copies, so only do it where pandas is needed"""
+        import pandas as pd
+        X, y = self.arrays()
+        return pd.DataFrame({
+            'Height': y.copy(),
+            'Bounce Number': self.column('Bounce Number').copy(),
+            'Total Time': self.column('Total Time').copy(),
+            'Interval Time': self.column('Interval Time').copy(),
+            'Total Time (ms)': X[:, 0].copy(),
+            'Interval Time (ms)': X[:, 1].copy(),
+        }, columns=list(COLUMNS))
+
+
+def _read_only(values):
+    view = values.view()
+    view.flags.writeable = False
+    return view
+
+
+def _plain(value):
+    # ints stay ints like they were in the csv
+    value = float(value)
+    return int(value) if value.is_integer() else value
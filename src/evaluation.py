@@ -0,0 +1,249 @@
+"""Cross-validation for FortunaModel.
+
+best_mse is measured on the very data the model was calibrated on, so it says little about how well the model
+does on a drop it hasnt seen. this module calibrates the model on part of the data and scores it on the rest:
+
+    kfold: the drops are shuffled and split into k folds, every fold is held out once
+    height: leave one height out, every height is held out once
+
+folds are always split by drop (see src/groups.py), never by row, so the bounces of one drop are never on both
+sides. the folds are calibrated in parallel on the process pool of src/fortuna.py and their results are cached
+until the dataset changes. from the command line:
+
+    python -m src.evaluation --scheme height
+    python -m src.evaluation --scheme kfold --folds 10 --strategy cma
+"""
+import argparse
+import csv
+import json
+import sys
+import threading
+
+import numpy as np
+
+from src.fortuna import FortunaModel, IncrementalQR, map_on_pool, search_shard
+from src.groups import GroupIndex
+from src.store import from_csv_row
+from src.strategies import Objective, initial_bounds, make_strategy
+
+
+SCHEMES = ("kfold", "height")
+
+
+def make_folds(drop_ids, heights, scheme="kfold", k=5, seed=0):
+    """splits the rows into folds along drop boundaries
+
+    Args:
+        drop_ids (np.ndarray): (N,) drop id of every row, see GroupIndex.drop_ids()
+        heights (np.ndarray): (N,) height of every row
+        scheme (str, optional): "kfold" or "height". Defaults to "kfold".
+        k (int, optional): number of folds for "kfold", capped at the number of drops. Defaults to 5.
+        seed (int, optional): seed of the drop shuffle for "kfold". Defaults to 0.
+
+    Returns:
+        List[tuple]: (name, test_mask) per fold, the mask is True for the held out rows
+    """
+    if scheme == "height":
+        return [(f"height={_plain(height)}", heights == height) for height in _unique_in_order(heights)]
+    if scheme != "kfold":
+        raise ValueError(f"unknown scheme {scheme!r}, expected one of {SCHEMES}")
+    drops = np.unique(drop_ids)
+    if len(drops) < 2:
+        raise ValueError("k-fold needs at least two drops")
+    drops = np.random.default_rng(seed).permutation(drops)
+    return [(f"fold={fold}", np.isin(drop_ids, held_out))
+            for fold, held_out in enumerate(np.array_split(drops, min(k, len(drops))))]
+
+
+def model_config(model):
+    """the parts of a FortunaModel that decide how it gets calibrated, its params are not part of it
+
+    Returns:
+        dict: solver, ridge, strategy and epochs
+    """
+    return {"solver": model.solver, "ridge": model.ridge, "strategy": model.strategy, "epochs": model.epochs}
+
+
+def fit_params(X, y, config, seed_sequence):
+    """calibrates (a, b, c) on the training rows of a fold without touching any params file
+
+    Args:
+        X (np.ndarray): (N, 2) float64 features
+        y (np.ndarray): (N,) float64 heights
+        config (dict): see model_config()
+        seed_sequence (np.random.SeedSequence): randomness of this fold
+
+    Returns:
+        list: the params
+    """
+    if config["solver"] == "lstsq":
+        qr = IncrementalQR(config["ridge"])
+        qr.add_many(X, y)
+        return qr.solve()
+    if config["strategy"] is not None:
+        objective = Objective(lambda candidates: FortunaModel.score_candidates(X, y, candidates), config["epochs"])
+        return make_strategy(config["strategy"]).search(
+            objective, None, initial_bounds(X, y), np.random.default_rng(seed_sequence)).params
+    return search_shard(X, y, seed_sequence, config["epochs"])[0]
+
+
+def run_fold(X, y, test_mask, config, seed_sequence):
+    """calibrates on everything but the fold and predicts the fold. runs on the process pool
+
+    Returns:
+        dict: the params, the in sample mse and the predictions for the held out rows
+    """
+    train = ~test_mask
+    params = fit_params(X[train], y[train], config, seed_sequence)
+    if params is None:
+        return {"params": None, "train_mse": None, "predictions": np.full(int(test_mask.sum()), np.nan)}
+    a, b, c = params
+    predictions = a * X[:, 0] + b * X[:, 1] + c
+    residuals = predictions[train] - y[train]
+    return {
+        "params": list(params),
+        "train_mse": float(np.mean(residuals ** 2)),
+        "predictions": predictions[test_mask],
+    }
+
+
+def error_summary(errors):
+    """distribution of a set of prediction errors (prediction - truth, in cm)"""
+    errors = errors[~np.isnan(errors)]
+    if len(errors) == 0:
+        return {"count": 0}
+    absolute = np.abs(errors)
+    return {
+        "count": int(len(errors)),
+        "bias": float(errors.mean()),
+        "mae": float(absolute.mean()),
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "p50_abs": float(np.percentile(absolute, 50)),
+        "p90_abs": float(np.percentile(absolute, 90)),
+        "max_abs": float(absolute.max()),
+    }
+
+
+class Evaluator:
+    """runs the cross-validation of a model and caches the fold results per dataset version.
+
+    a fold result only depends on the data, the fold split and the model config, so asking again for the same
+    version (or for a different report over the same folds) costs nothing. a new version drops the old results.
+    """
+
+    def __init__(self, workers=1):
+        """
+        Args:
+            workers (int, optional): processes the folds are spread over, 1 runs them in this process. Defaults to 1.
+        """
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._version = None
+        self._folds = {}
+
+    def evaluate(self, config, rows, drop_ids, version, scheme="kfold", k=5, seed=0):
+        """cross-validates a model config on `rows`
+
+        Args:
+            config (dict): the model config, see model_config()
+            rows (BounceDataset|List[dict]): the measurements
+            drop_ids (np.ndarray): drop id per row, same length as rows
+            version (int): the dataset version, the cache is only valid for one version
+            scheme (str, optional): "kfold" or "height". Defaults to "kfold".
+            k (int, optional): folds for "kfold". Defaults to 5.
+            seed (int, optional): seed of the split and of the calibration inside the folds. Defaults to 0.
+
+        Returns:
+            dict: overall and per height error distributions plus the per fold results
+        """
+        X, y = FortunaModel.data_arrays(rows)
+        folds = make_folds(np.asarray(drop_ids), y, scheme, k, seed)
+        key_base = (scheme, k if scheme == "kfold" else None, seed, tuple(sorted(config.items())))
+
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._folds = {}
+            cached = {name: self._folds.get(key_base + (name,)) for name, _ in folds}
+
+        missing = [(name, mask, sequence) for (name, mask), sequence
+                   in zip(folds, np.random.SeedSequence(seed).spawn(len(folds))) if cached[name] is None]
+        if missing:
+            if self.workers > 1:
+                results = map_on_pool(self.workers, run_fold,
+                                      [(X, y, mask, config, sequence) for _, mask, sequence in missing])
+            else:
+                results = [run_fold(X, y, mask, config, sequence) for _, mask, sequence in missing]
+            with self._lock:
+                for (name, _, _), result in zip(missing, results):
+                    cached[name] = result
+                    if version == self._version:
+                        self._folds[key_base + (name,)] = result
+
+        return self._report(folds, cached, y, scheme, version, config)
+
+    @staticmethod
+    def _report(folds, results, y, scheme, version, config):
+        errors = np.full(len(y), np.nan)
+        fold_reports = []
+        for name, mask in folds:
+            result = results[name]
+            fold_errors = result["predictions"] - y[mask]
+            errors[mask] = fold_errors
+            fold_reports.append({
+                "fold": name,
+                "train_rows": int((~mask).sum()),
+                "test_rows": int(mask.sum()),
+                "params": result["params"],
+                "train_mse": result["train_mse"],
+                "test_mse": float(np.nanmean(fold_errors ** 2)) if mask.any() else None,
+            })
+        return {
+            "scheme": scheme,
+            "dataset_version": version,
+            "config": config,
+            "overall": error_summary(errors),
+            "per_height": [dict(height=_plain(height), **error_summary(errors[y == height]))
+                           for height in _unique_in_order(y)],
+            "folds": fold_reports,
+        }
+
+
+def _unique_in_order(values):
+    _, first = np.unique(values, return_index=True)
+    return values[np.sort(first)]
+
+
+def _plain(height):
+    # 180.0 -> 180 for the json and the fold names
+    return int(height) if float(height).is_integer() else float(height)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="cross-validate the TenniScale model")
+    parser.add_argument("--csv", default="src/tennis_ball_bounce_data.csv", help="the dataset")
+    parser.add_argument("--scheme", choices=SCHEMES, default="kfold")
+    parser.add_argument("--folds", type=int, default=5, help="number of folds for --scheme kfold")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-bounce", type=int, default=4, help="only use the first bounces, like the app does")
+    parser.add_argument("--solver", default="random")
+    parser.add_argument("--ridge", type=float, default=0.0)
+    parser.add_argument("--strategy", default=None, help="search strategy, see src/strategies.py")
+    parser.add_argument("--epochs", type=int, default=1000, help="evaluation budget of the search per fold")
+    parser.add_argument("--workers", type=int, default=1, help="processes to calibrate the folds on")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.csv, newline='') as f:
+        rows = [row for row in (from_csv_row(row) for row in csv.DictReader(f)) if row['Bounce Number'] <= args.max_bounce]
+    config = {"solver": args.solver, "ridge": args.ridge, "strategy": args.strategy, "epochs": args.epochs}
+    report = Evaluator(args.workers).evaluate(config, rows, GroupIndex(rows).drop_ids(), version=0,
+                                              scheme=args.scheme, k=args.folds, seed=args.seed)
+    json.dump(report, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Streaming export of the measurements for /api/v1/export.
+
+the rows come from the store in chunks (see MeasurementStore.read_chunks()) and every chunk is encoded and sent
+before the next one is read, so an export needs the same memory for a thousand rows as for ten million:
+
+- csv: a header line and one line per row
+- parquet: one row group per chunk, the footer at the end
+- arrow: the arrow ipc stream format, one record batch per chunk
+
+every row has its store id in the "id" column. a job that pulls increments passes the biggest id it got as the
+offset of the next export. parquet and arrow need the optional pyarrow package
+"""
+import csv
+import io
+
+from src.store import COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, csv works everywhere
+    pa = pq = None
+
+
+# the columns of an export, in order
+EXPORT_COLUMNS = ("id",) + COLUMNS
+
+# rows read from the store and encoded at a time
+CHUNK_ROWS = 10_000
+
+# format -> (content type, file extension)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def available_formats():
+    """the FORMATS that can be written with the packages that are installed"""
+    return tuple(name for name in FORMATS if name == "csv" or pa is not None)
+
+
+def csv_chunks(chunks):
+    """encodes chunks of (id, *COLUMNS) records as csv, missing values are empty fields
+
+    Yields:
+        bytes: the header, then one piece per chunk
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for records in chunks:
+        writer.writerows(records)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def arrow_schema():
+    """the arrow schema of an export, a missing bounce number or lap time is null"""
+    return pa.schema([
+        ("id", pa.int64()),
+        ("Height", pa.float64()),
+        ("Bounce Number", pa.int64()),
+        ("Total Time", pa.string()),
+        ("Interval Time", pa.string()),
+        ("Total Time (ms)", pa.float64()),
+        ("Interval Time (ms)", pa.float64()),
+    ])
+
+
+def record_batch(records, schema):
+    """a chunk of (id, *COLUMNS) records as an arrow RecordBatch"""
+    columns = list(zip(*records)) if records else [()] * len(schema)
+    return pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                           schema=schema)
+
+
+class _Pending(io.RawIOBase):
+    """the bytes pyarrow wrote since they were last taken out"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def arrow_chunks(chunks, parquet=False):
+    """encodes chunks of (id, *COLUMNS) records as an arrow ipc stream, or as parquet with one row group each
+
+    Yields:
+        bytes: whatever the writer produced for each chunk, the footer at the end
+    """
+    if pa is None:
+        raise RuntimeError("parquet and arrow exports need the pyarrow package")
+    schema = arrow_schema()
+    pending = _Pending()
+    sink = pa.PythonFile(pending, mode="w")
+    writer = pq.ParquetWriter(sink, schema) if parquet else pa.ipc.new_stream(sink, schema)
+    try:
+        for records in chunks:
+            batch = record_batch(records, schema)
+            if parquet:
+                writer.write_table(pa.Table.from_batches([batch], schema=schema))
+            else:
+                writer.write_batch(batch)
+            data = pending.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield pending.take()
+
+
+def export_chunks(chunks, format="csv"):
+    """the encoded export of a chunk iterator, see MeasurementStore.read_chunks()
+
+    Raises:
+        ValueError: for formats that arent in FORMATS
+        RuntimeError: for parquet and arrow without pyarrow
+
+    Returns:
+        Iterator[bytes]: the body, piece by piece
+    """
+    if format not in FORMATS:
+        raise ValueError(f"unknown export format {format!r}, expected one of {tuple(FORMATS)}")
+    if format == "csv":
+        return csv_chunks(chunks)
+    if format not in available_formats():
+        raise RuntimeError(f"the {format} export needs the pyarrow package")
+    return arrow_chunks(chunks, parquet=format == "parquet")
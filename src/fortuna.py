@@ -1,17 +1,369 @@
-import json
+import atexit
+import collections
+import copy
+import logging
+import math
+import multiprocessing
 import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from src.persistence import ParamStore
+from src.strategies import Objective, initial_bounds, make_strategy
+
+
+# upper bound on how many (candidate x row) residuals we hold in memory at once while scoring.
+# 2**22 float64 values is about 32MB, which is plenty fast and still fits on the small containers
+MAX_CHUNK_ELEMENTS = 2 ** 22
+
+# "random" is the original uniform random search, "lstsq" solves the least squares problem exactly
+SOLVERS = ("random", "lstsq")
+
+# how many published snapshots a model keeps around for rollback()
+HISTORY_SIZE = 10
+
+logger = logging.getLogger(__name__)
+
+# process pools for the parallel search, one per worker count. they are shared by every model (the calibration
+# worker calibrates a fresh copy of the model each run) and live until the interpreter exits
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def process_pool(workers):
+    """the shared process pool with `workers` processes, created on first use"""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn instead of fork, the app forks from a process that already runs a bunch of threads
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
+
+
+def discard_pool(workers, pool):
+    """forgets a broken pool, so the next process_pool(workers) starts a new one"""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def map_on_pool(workers, function, calls):
+    """runs function(*args) for every args in `calls` on the shared pool and returns the results in order.
+    when a process of the pool died (killed, out of memory) the pool is broken for good, so it is replaced and the
+    calls run once more on the new one
+
+    Args:
+        workers (int): the pool size, see process_pool()
+        function (Callable): a picklable module level function
+        calls (List[tuple]): the positional arguments of each call
+
+    Returns:
+        list: the results
+    """
+    for attempt in range(2):
+        pool = process_pool(workers)
+        try:
+            futures = [pool.submit(function, *args) for args in calls]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            discard_pool(workers, pool)
+            if attempt:
+                raise
+            logger.warning("process pool broke, starting a new one", extra={"workers": workers})
+
+
+@atexit.register
+def shutdown_pools():
+    """stops the process pools of the parallel search"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+def search_shard(X, y, seed_sequence, count, chunk_size=None):
+    """one shard of the parallel random search: draws `count` candidates from its own rng stream and scores them
+
+    Args:
+        X (np.ndarray): (N, 2) float64 features
+        y (np.ndarray): (N,) float64 heights in cm
+        seed_sequence (np.random.SeedSequence): the seed of this shard, see FortunaModel.parallel_search()
+        count (int): how many candidates this shard tries
+        chunk_size (int, optional): see FortunaModel.score_candidates(). Defaults to None.
+
+    Returns:
+        tuple: (params, mse) of the best candidate of the shard, or (None, inf) for an empty shard
+    """
+    if count <= 0 or len(X) == 0:
+        return None, float('inf')
+    candidates = np.random.default_rng(seed_sequence).uniform(-1, 1, size=(count, 3))
+    mses = FortunaModel.score_candidates(X, y, candidates, chunk_size)
+    best = int(np.argmin(mses))
+    return candidates[best].tolist(), float(mses[best])
+
+
+# relative size below which a pivot of R is treated as zero: machine epsilon times the number of columns
+RANK_EPS = np.finfo(np.float64).eps * 3
+
+
+class IncrementalQR:
+    """Keeps the R factor of a QR decomposition of the design matrix [x1, x2, 1] so the least squares
+    solution can be updated one row at a time.
+
+    instead of the (N x 3) design matrix we only keep the 3x3 upper triangular R, the rotated targets z = Q^T y
+    and the residual sum of squares that the rotations pushed out of z. adding a measurement is then three
+    givens rotations, so it costs the same no matter how much data we already have.
+    with ridge > 0 the solver starts from the rows sqrt(ridge) * e_a and sqrt(ridge) * e_b, which penalizes
+    a and b (not the intercept c) in the units of the raw millisecond features.
+    """
+
+    def __init__(self, ridge=0.0):
+        if ridge < 0:
+            raise ValueError("ridge must be >= 0")
+        self.ridge = float(ridge)
+        self.R = np.zeros((3, 3), dtype=np.float64)
+        self.z = np.zeros(3, dtype=np.float64)
+        self.rss = 0.0
+        self.n = 0
+        if self.ridge > 0:
+            penalty = np.sqrt(self.ridge)
+            self._rotate_in(np.array([penalty, 0.0, 0.0]), 0.0)
+            self._rotate_in(np.array([0.0, penalty, 0.0]), 0.0)
+
+    def _rotate_in(self, row, target):
+        """rotates one (row, target) pair into R and z with givens rotations"""
+        row = row.astype(np.float64, copy=True)
+        for i in range(3):
+            if row[i] == 0.0:
+                continue
+            r = np.hypot(self.R[i, i], row[i])
+            c, s = self.R[i, i] / r, row[i] / r
+            R_i = self.R[i, i:].copy()
+            self.R[i, i:] = c * R_i + s * row[i:]
+            row[i:] = -s * R_i + c * row[i:]
+            self.z[i], target = c * self.z[i] + s * target, -s * self.z[i] + c * target
+        self.rss += target * target
+
+    def add(self, x1, x2, y):
+        """adds a single measurement in O(1)"""
+        self._rotate_in(np.array([x1, x2, 1.0]), float(y))
+        self.n += 1
+
+    def add_many(self, X, y):
+        """adds a whole batch of measurements with one householder QR of the stacked [R; new rows] system
+
+        Args:
+            X (np.ndarray): (N, 2) float64 features
+            y (np.ndarray): (N,) float64 heights in cm
+        """
+        if len(X) == 0:
+            return
+        A = np.empty((len(X) + 3, 3), dtype=np.float64)
+        A[:3] = self.R
+        A[3:, :2] = X
+        A[3:, 2] = 1.0
+        b = np.concatenate([self.z, y])
+        Q, R = np.linalg.qr(A)
+        z = Q.T @ b
+        residual = b - Q @ z
+        self.R, self.z = R, z
+        self.rss += float(residual @ residual)
+        self.n += len(X)
+
+    def solve(self):
+        """solves R theta = z
+
+        Returns:
+            list: the least squares (a, b, c)
+        """
+        diag = np.abs(np.diag(self.R))
+        # a pivot that is only rounding noise counts as zero, like the rank decision of np.linalg.matrix_rank
+        tolerance = RANK_EPS * diag.max()
+        if np.all(diag > tolerance):
+            theta = np.zeros(3)
+            for i in (2, 1, 0):
+                theta[i] = (self.z[i] - self.R[i, i + 1:] @ theta[i + 1:]) / self.R[i, i]
+        else:
+            # rank deficient (e.g all the same interval so far, or total == interval because there are only first
+            # bounces), take the minimum norm solution of the directions the data does pin down
+            theta = np.linalg.lstsq(self.R, self.z, rcond=RANK_EPS)[0]
+        return theta.tolist()
+
+    def mse(self, params):
+        """the mean squared error of params over the data that was added, without the ridge penalty"""
+        if self.n == 0:
+            return float('inf')
+        theta = np.asarray(params, dtype=np.float64)
+        misfit = self.R @ theta - self.z
+        rss = self.rss + float(misfit @ misfit) - self.ridge * float(theta[0] ** 2 + theta[1] ** 2)
+        return max(rss, 0.0) / self.n
+
+
+class VersionCounter:
+    """hands out the snapshot versions of a model and its staging copies. it never hands out a version at or below
+    one that was installed, wherever that snapshot came from (a restart, another worker, a rollback)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 1
+
+    def next(self):
+        with self._lock:
+            version = self._next
+            self._next += 1
+            return version
+
+    def advance(self, version):
+        """makes sure the next version is above `version`"""
+        with self._lock:
+            self._next = max(self._next, int(version) + 1)
+
+    @property
+    def last(self):
+        """the highest version handed out or seen, 0 if none"""
+        return self._next - 1
+
+
+class ModelSnapshot(NamedTuple):
+    """one published state of the model. never changed after it is created, a new calibration result is a new snapshot"""
+    version: int
+    params: Optional[tuple]
+    mse: float
+    # the dataset version (store offset) the params were calibrated on, None if unknown
+    dataset_version: Optional[int]
+    created_at: float
+
+    def as_dict(self):
+        return {
+            "version": self.version,
+            "params": None if self.params is None else list(self.params),
+            "mse": self.mse if math.isfinite(self.mse) else None,  # inf before the first calibration
+            "dataset_version": self.dataset_version,
+            "created_at": self.created_at,
+        }
 
 
 class FortunaModel:
-    def __init__(self, params_file="assets/best_params.json"):
+    def __init__(self, params_file="assets/best_params.json", solver="random", ridge=0.0, flush_interval=None,
+                 epochs=1000, workers=1, seed=None, strategy=None, time_budget=None, history_size=HISTORY_SIZE):
+        if solver not in SOLVERS:
+            raise ValueError(f"unknown solver {solver!r}, expected one of {SOLVERS}")
+        if strategy is not None:
+            make_strategy(strategy)  # fail early on a typo
 
-        self.best_params = None
-        self.best_mse = float('inf')
+        # the one reference predictions read. it is only ever replaced as a whole (see install()), so a reader that
+        # grabbed it once sees params and mse of the same calibration, no matter what the calibration does meanwhile
+        self.snapshot = ModelSnapshot(0, None, float('inf'), None, time.time())
+        # the last published snapshots, oldest first, for rollback()
+        self.history = collections.deque(maxlen=history_size)
+        # snapshot versions keep counting up from the ones saved in the params file, so they dont start over on a
+        # restart. staging copies share the counter with the model they were copied from
+        self._versions = VersionCounter()
         self.params_file = params_file
+        # improved params are staged here and written once per calibration run (or every flush_interval seconds)
+        self.store = ParamStore(params_file, flush_interval)
+        self.solver = solver
+        self.ridge = ridge
+        # only used by the "lstsq" solver. built on calibrate() and then kept up to date by update()
+        self.qr = None
+        # the random search budget. with more than one worker or a seed it runs as the parallel, reproducible search
+        self.epochs = epochs
+        self.workers = workers
+        self.seed = seed
+        # a search strategy from src/strategies.py instead of the plain random search. epochs is then the evaluation
+        # budget, time_budget (seconds) an optional wall clock budget on top
+        self.strategy = strategy
+        self.time_budget = time_budget
+        # how many candidate parameter sets the last calibrate() scored, for the metrics
+        self.last_evaluations = 0
+        # the SearchResult.as_dict() of the last strategy search
+        self.last_search = None
 
         # Load existing parameters if they exist
         self.load_params()
 
+    # read only views of the current snapshot. params and mse only change together, through publish()
+    @property
+    def best_params(self):
+        params = self.snapshot.params
+        return None if params is None else list(params)
+
+    @property
+    def best_mse(self):
+        return self.snapshot.mse
+
+    def publish(self, params, mse, dataset_version=None):
+        """makes (params, mse) the current model as a new snapshot. it doesnt save them, see save_params()
+
+        Args:
+            params (List[float]|None): (a, b, c)
+            mse (float): their mse
+            dataset_version (int, optional): the data they were calibrated on. Defaults to None.
+
+        Returns:
+            ModelSnapshot: the new snapshot
+        """
+        snapshot = ModelSnapshot(self._versions.next(), None if params is None else tuple(float(p) for p in params),
+                                 float(mse), dataset_version, time.time())
+        self.install(snapshot)
+        return snapshot
+
+    def install(self, snapshot, record=True):
+        """swaps in a snapshot, e.g one a staging copy or another process calibrated. a single reference assignment,
+        so concurrent predictions see either the old or the new snapshot and never a mix of both
+
+        Args:
+            snapshot (ModelSnapshot): the new current snapshot
+            record (bool, optional): whether to add it to the history. Defaults to True.
+        """
+        self.snapshot = snapshot
+        self._versions.advance(snapshot.version)
+        if record and snapshot.params is not None:
+            self.history.append(snapshot)
+
+    def staging_copy(self):
+        """a copy to calibrate on while this model keeps serving. it starts from the current snapshot and has a history
+        of its own, install() its snapshot on this model to publish the result
+        """
+        staging = copy.copy(self)
+        staging.history = collections.deque(maxlen=self.history.maxlen)
+        return staging
+
+    def rollback(self, version=None):
+        """puts an earlier snapshot from the history back in place and saves its params
+
+        Args:
+            version (int, optional): the snapshot version to go back to. Defaults to the one published before the current.
+
+        Raises:
+            KeyError: if the version is not (or no longer) in the history
+
+        Returns:
+            ModelSnapshot: the snapshot that is current now
+        """
+        current = self.snapshot
+        if version is None:
+            candidates = [snapshot for snapshot in self.history if snapshot.version < current.version]
+        else:
+            candidates = [snapshot for snapshot in self.history if snapshot.version == version]
+        if not candidates:
+            raise KeyError(version)
+        snapshot = candidates[-1]
+        # not recorded again, the history stays the list of what calibration published
+        self.install(snapshot, record=False)
+        self.save_params()
+        self.store.flush()
+        logger.info("rolled back", extra={"from_version": current.version, "to_version": snapshot.version})
+        return snapshot
+
     def fit(self, X, y, params):
         """IT is a simple linear model 
         e.g 
@@ -28,8 +380,9 @@ class FortunaModel:
         Returns:
             tuple: it return the predictions and the mean squared error. (mse, predictions)
         """
+        X, y = self.to_arrays(X, y)
         a, b, c = params
-        predictions = [(a * x1 + b * x2 + c) for x1, x2 in X]
+        predictions = a * X[:, 0] + b * X[:, 1] + c
         mse = self.mean_squared_error(predictions, y)
         return mse, predictions
 
@@ -48,16 +401,84 @@ class FortunaModel:
                 The objective of squaring the discrepancies is multifaceted.
                 Squaring the differences removes negative mean squared error differences and guarantees that the squared mean error is always larger than or equal to zero. The value is usually always positive. Only a model without any errors will have an MSE of zero. This does not occur in actuality.
         """
-        errors = [(pred - actual) ** 2 for pred, actual in zip(predictions, y)]
+        errors = (np.asarray(predictions, dtype=np.float64) - np.asarray(y, dtype=np.float64)) ** 2
         # im doing this cause the number were insanely big. it would be better if i also did sqrt() of the entire thing. but for now this works
-        mse = sum(errors) / len(errors)
+        # cumsum adds the errors up left to right like the builtin sum() did, so the mse comes out bit for bit the same
+        mse = float(np.cumsum(errors)[-1] / len(errors))
         return mse
 
-    def calibrate(self, data):
+    @staticmethod
+    def to_arrays(X, y=None):
+        """turns the features (and optionally the targets) into contiguous float64 arrays so numpy can work on them directly
+
+        Args:
+            X (Array(tuples)): list of (total time, interval time) tuples or an array shaped (N, 2)
+            y (Array[int], optional): the heights in cm. Defaults to None.
+
+        Returns:
+            tuple: (X, y) where X is a C-contiguous (N, 2) float64 array and y a (N,) float64 array or None
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64).reshape(-1, 2)
+        if y is not None:
+            y = np.ascontiguousarray(y, dtype=np.float64).reshape(-1)
+        return X, y
+
+    @staticmethod
+    def data_arrays(data):
+        """the features and heights of a dataset for fitting
+
+        Args:
+            data (BounceDataset|List[dict]): a BounceDataset gives its column views without copying, a list of
+                measurement dicts gets converted
+
+        Returns:
+            tuple: (X, y), see to_arrays()
+        """
+        if hasattr(data, "arrays"):
+            return data.arrays()
+        return FortunaModel.to_arrays([(d['Total Time (ms)'], d['Interval Time (ms)']) for d in data],
+                                      [d['Height'] for d in data])
+
+    @staticmethod
+    def score_candidates(X, y, candidates, chunk_size=None):
+        """scores a whole batch of (a, b, c) candidates at once instead of calling fit() for each of them.
+
+        the features get a column of ones so a candidate matrix C (K x 3) turns into all the predictions with one
+        matrix product (N x 3) @ (3 x K). the mse of every candidate is then a single reduction over the rows.
+        candidates are processed in chunks so the (N x chunk) residual matrix never grows past MAX_CHUNK_ELEMENTS.
+
+        Args:
+            X (np.ndarray): (N, 2) float64 features, see to_arrays()
+            y (np.ndarray): (N,) float64 heights in cm
+            candidates (np.ndarray): (K, 3) matrix where every row is one (a, b, c)
+            chunk_size (int, optional): how many candidates to score per chunk. Defaults to a size derived from MAX_CHUNK_ELEMENTS.
+
+        Returns:
+            np.ndarray: (K,) array with the mean squared error of every candidate
+        """
+        candidates = np.ascontiguousarray(candidates, dtype=np.float64).reshape(-1, 3)
+        n = len(X)
+        design = np.empty((n, 3), dtype=np.float64)
+        design[:, :2] = X
+        design[:, 2] = 1.0
+        if chunk_size is None:
+            chunk_size = max(1, MAX_CHUNK_ELEMENTS // max(n, 1))
+
+        mses = np.empty(len(candidates), dtype=np.float64)
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates[start:start + chunk_size]
+            residuals = design @ chunk.T
+            residuals -= y[:, None]
+            mses[start:start + chunk_size] = np.einsum('ij,ij->j', residuals, residuals) / n
+        return mses
+
+    def calibrate(self, data, epochs=None, chunk_size=None, workers=None, seed=None, strategy=None, dataset_version=None):
         """Calibrates the model. and tries to create better parameter every time its called. if it finds the better model it saves the parameters.
+        with solver="lstsq" it skips the search and solves for the exact (optionally ridge regularized) least squares parameters instead.
 
         Args:
-            data (List[dicts{}]): a List of Dicts containing containing all the collected data.
+            data (List[dicts{}]|BounceDataset): a List of Dicts containing containing all the collected data, or a src.dataset.BounceDataset
+                which is used without copying.
                 THe data is a List of this pydantic model:
                 '''python
                     from pydantic import BaseModel, Field
@@ -71,20 +492,146 @@ class FortunaModel:
                         Total_Time_ms: int = Field(..., alias="Total Time (ms)", description="The total time in milliseconds")
                         Interval_Time_ms: int = Field(..., alias="Interval Time (ms)", description="The interval time in milliseconds")
                 '''
-        """
 
-        X = [(d['Total Time (ms)'], d['Interval Time (ms)']) for d in data]
-        y = [d['Height'] for d in data]
+            epochs (int, optional): how many random candidates to try. Defaults to self.epochs (1000).
+            chunk_size (int, optional): candidates scored per chunk, see score_candidates(). Defaults to None.
+            workers (int, optional): processes to spread the candidates over, see parallel_search(). Defaults to self.workers.
+            seed (int, optional): seed of the parallel search and the strategies. Defaults to self.seed.
+            strategy (str, optional): one of src.strategies.STRATEGIES, see search(). Defaults to self.strategy.
+            dataset_version (int, optional): the version of `data`, goes into the published snapshot. Defaults to None.
+        """
+        epochs = self.epochs if epochs is None else epochs
+        workers = self.workers if workers is None else workers
+        seed = self.seed if seed is None else seed
+        strategy = self.strategy if strategy is None else strategy
+        X, y = self.data_arrays(data)
 
-        for _ in range(1000):
-            print("Epoch: ", _)
-            params = [random.uniform(-1, 1) for _ in range(3)]
-            mse, _ = self.fit(X, y, params)
+        if self.solver == "lstsq":
+            self.last_evaluations = 0
+            self.qr = IncrementalQR(self.ridge)
+            self.qr.add_many(X, y)
+            self.publish_least_squares(dataset_version)
+            self.store.flush()
+            return
 
-            if mse < self.best_mse:
-                self.best_mse = mse
-                self.best_params = params
+        if strategy is not None or workers > 1 or seed is not None:
+            if strategy is not None:
+                result = self.search(X, y, strategy, epochs, self.time_budget, seed, chunk_size)
+                params, mse = result.params, result.mse
+            else:
+                params, mse = self.parallel_search(X, y, epochs, workers, seed, chunk_size)
+                self.last_evaluations = epochs if len(X) else 0
+            if params is not None and mse < self.best_mse:
+                self.publish(params, self.fit(X, y, params)[0], dataset_version)
                 self.save_params()
+                self.store.flush()
+            return
+
+        # draw the candidates from the global random module in the exact same order as the old epoch loop did,
+        # so a given random.seed() still ends up with the same best parameters
+        candidates = np.array([[random.uniform(-1, 1) for _ in range(3)] for _ in range(epochs)],
+                              dtype=np.float64).reshape(-1, 3)
+        if len(candidates) == 0 or len(X) == 0:
+            self.last_evaluations = 0
+            return
+        self.last_evaluations = len(candidates)
+
+        mses = self.score_candidates(X, y, candidates, chunk_size)
+        # argmin returns the first minimum, which is the same candidate the old loop kept with its strict "<"
+        best = int(np.argmin(mses))
+        if mses[best] < self.best_mse:
+            params = candidates[best].tolist()
+            self.publish(params, self.fit(X, y, params)[0], dataset_version)
+            self.save_params()
+            self.store.flush()
+
+    def search(self, X, y, strategy, max_evaluations=None, max_seconds=None, seed=None, chunk_size=None):
+        """runs one of the adaptive search strategies. it starts from the current best params (if there are any) in a box
+        sized after the data and stops on the budget or once the mse plateaus
+
+        Args:
+            X (np.ndarray): (N, 2) float64 features
+            y (np.ndarray): (N,) float64 heights in cm
+            strategy (str): name of the strategy, see src.strategies.STRATEGIES
+            max_evaluations (int, optional): evaluation budget. Defaults to None.
+            max_seconds (float, optional): wall clock budget. Defaults to None.
+            seed (int, optional): seed of the strategy's rng. Defaults to None.
+            chunk_size (int, optional): see score_candidates(). Defaults to None.
+
+        Returns:
+            SearchResult: the best params, their mse, how many evaluations it took and why it stopped
+        """
+        objective = Objective(lambda candidates: self.score_candidates(X, y, candidates, chunk_size),
+                              max_evaluations, max_seconds)
+        if len(X) == 0:
+            objective.max_evaluations = 0
+        result = make_strategy(strategy).search(objective, self.best_params if len(X) else None,
+                                                initial_bounds(X, y), np.random.default_rng(seed))
+        self.last_evaluations = result.evaluations
+        self.last_search = dict(result.as_dict(), strategy=strategy)
+        logger.debug("search finished", extra=self.last_search)
+        return result
+
+    def parallel_search(self, X, y, epochs, workers, seed=None, chunk_size=None):
+        """the random search split into `workers` shards that run on a process pool.
+
+        every shard gets its own rng stream spawned from np.random.SeedSequence(seed), so the outcome only depends on
+        the seed and the worker count and not on which process finishes first. the budget is split as evenly as
+        possible and the best shard wins, ties go to the lower shard.
+
+        Args:
+            X (np.ndarray): (N, 2) float64 features
+            y (np.ndarray): (N,) float64 heights in cm
+            epochs (int): total number of candidates over all shards
+            workers (int): number of shards (and processes). 1 runs the shard right here without a pool
+            seed (int, optional): None draws fresh entropy from the os, so the run is not reproducible. Defaults to None.
+            chunk_size (int, optional): see score_candidates(). Defaults to None.
+
+        Returns:
+            tuple: (params, mse) of the best candidate, (None, inf) if there was nothing to search
+        """
+        workers = max(1, int(workers))
+        sequences = np.random.SeedSequence(seed).spawn(workers)
+        budgets = [epochs // workers + (shard < epochs % workers) for shard in range(workers)]
+        if workers == 1:
+            results = [search_shard(X, y, sequences[0], budgets[0], chunk_size)]
+        else:
+            results = map_on_pool(workers, search_shard, [(X, y, sequence, budget, chunk_size)
+                                                          for sequence, budget in zip(sequences, budgets)])
+        return min(results, key=lambda result: result[1])
+
+    def update(self, total_time_ms, interval_time_ms, height, dataset_version=None):
+        """adds one new measurement to the least squares solution without refitting on the whole dataset.
+        only works with solver="lstsq", the random search has nothing to update incrementally.
+
+        Args:
+            total_time_ms (float): the total time of the new measurement
+            interval_time_ms (float): the interval time of the new measurement
+            height (float): the measured height in cm
+            dataset_version (int, optional): the dataset version including this measurement. Defaults to None.
+
+        Raises:
+            ValueError: if the model uses a solver that can't be updated incrementally
+        """
+        if self.solver != "lstsq":
+            raise ValueError(f"solver {self.solver!r} does not support incremental updates")
+        if self.qr is None:
+            self.qr = IncrementalQR(self.ridge)
+        self.qr.add(total_time_ms, interval_time_ms, height)
+        self.publish_least_squares(dataset_version)
+
+    def publish_least_squares(self, dataset_version=None):
+        """takes the current least squares solution as the best parameters and saves them.
+        its the exact optimum for the data we have now, so its used even if an older params file had a lower mse
+
+        Args:
+            dataset_version (int, optional): the data the solution covers, see publish(). Defaults to None.
+        """
+        if self.qr.n == 0:
+            return
+        params = self.qr.solve()
+        self.publish(params, self.qr.mse(params), dataset_version)
+        self.save_params()
 
     def predict(self, X):
         """Predicts the height for the given indipendent parameters(time in ms) 
@@ -99,29 +646,52 @@ class FortunaModel:
         Returns:
             Array[float]: array of the predictions
         """
-        if self.best_params is None:
+        return self.predict_array(X).tolist()
+
+    def predict_array(self, X, snapshot=None):
+        """same as predict() but takes and returns numpy arrays, so thousands of predictions are one vectorized evaluation
+
+        Args:
+            X (np.ndarray): (N, 2) array (or anything numpy can turn into one) of (total time, interval time) in ms
+            snapshot (ModelSnapshot, optional): the snapshot to predict with, to report its version along with the
+                predictions. Defaults to the current one.
+
+        Raises:
+            Exception: if the best params are not saved. just means you have to run self.calibrate(data) first
+
+        Returns:
+            np.ndarray: (N,) float64 array of the predictions
+        """
+        params = (snapshot or self.snapshot).params  # read once, the calibration may swap in a new snapshot meanwhile
+        if params is None:
             raise Exception("Model is not calibrated yet.")
-        a, b, c = self.best_params
-        print("a, b, c:", a, b, c)
-        print("Predictions:", [(a * x1 + b * x2 + c) for x1, x2 in X])
+        a, b, c = params
+        X, _ = self.to_arrays(X)
         # Calculate The predictions
-        return [(a * x1 + b * x2 + c) for x1, x2 in X]
+        return a * X[:, 0] + b * X[:, 1] + c
 
     def save_params(self):
-        """save the best parameters and the best mean squared error as a json file
+        """save the best parameters and the best mean squared error as a json file.
+        they are only staged in the param store, the actual (atomic) write happens on the next flush. without a flush timer that is right away
         """
-        print("Hurra!! Found a better model :)")
-        with open(self.params_file, 'w') as f:
-            json.dump({'best_params': self.best_params,
-                      'best_mse': self.best_mse}, f)
+        snapshot = self.snapshot
+        params = None if snapshot.params is None else list(snapshot.params)
+        logger.debug("Hurra!! Found a better model :)",
+                     extra={"best_params": params, "best_mse": snapshot.mse, "model_version": snapshot.version})
+        # the snapshot version and the highest one handed out, a rollback saves an older version than that
+        self.store.stage(params, snapshot.mse, model_version=snapshot.version, last_model_version=self._versions.last)
+        if not self.store.flush_interval:
+            self.store.flush()
 
     def load_params(self):
-        """Reads the the json file that containe the best parameters and the best mean squared error
+        """Reads the the json file that containe the best parameters and the best mean squared error.
+        if the file is corrupt it falls back to the last good snapshot
         """
-        try:
-            with open(self.params_file, 'r') as f:
-                params = json.load(f)
-                self.best_params = params['best_params']
-                self.best_mse = params['best_mse']
-        except FileNotFoundError:
-            pass
+        saved = self.store.load()
+        if saved is not None:
+            params = saved['best_params']
+            # files from before the snapshot versions were saved only have the write counter
+            version = int(saved.get('model_version') or max(self.store.version, 1))
+            self._versions.advance(int(saved.get('last_model_version', 0)))
+            self.install(ModelSnapshot(version, None if params is None else tuple(params),
+                                       saved['best_mse'], None, saved.get('saved_at', time.time())))
@@ -0,0 +1,276 @@
+"""Group index over the bounce measurements: which rows belong to which height and to which drop.
+
+a drop is one ball dropped from one height, i.e one block of the lap log in src/clean.py. the same height shows
+up several times in the dataset, once per drop. the index finds the drops while the rows come in: a new drop starts
+when the height changes or the bounce number doesnt go up. measurements from /api/measure have no bounce number
+and are a drop of their own.
+
+the index is built once at startup and then only appended to, so looking up a group, its arrays or its aggregates
+never scans the dataset:
+
+    index = GroupIndex(rows)
+    index.append(row)
+    index.height(180).arrays()['Interval Time (ms)']
+    index.drop(index.drop_of(42)).summary()
+"""
+import math
+import operator
+import threading
+
+import numpy as np
+
+
+# the columns every group keeps as arrays
+GROUP_COLUMNS = ('Bounce Number', 'Total Time (ms)', 'Interval Time (ms)')
+
+# the columns every group keeps running aggregates of
+AGGREGATE_COLUMNS = ('Total Time (ms)', 'Interval Time (ms)')
+
+_COLUMN_INDEX = {column: index for index, column in enumerate(GROUP_COLUMNS)}
+
+_group_values = operator.itemgetter(*GROUP_COLUMNS)
+
+
+class RunningStats:
+    """count, mean, variance, min and max of a column. O(1) to update and to read. the variance uses welford's
+    update, a sum of squares loses all its digits when the mean is large compared to the spread"""
+    __slots__ = ('count', '_mean', '_m2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.extend((value,))
+
+    def extend(self, values):
+        """adds values in order, None and nan are skipped"""
+        # on locals, this runs for every row of the dataset at startup
+        count, mean, m2, low, high = self.count, self._mean, self._m2, self.min, self.max
+        for value in values:
+            if value is None or value != value:
+                continue
+            count += 1
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+            if value < low:
+                low = value
+            if value > high:
+                high = value
+        self.count, self._mean, self._m2, self.min, self.max = count, mean, m2, low, high
+
+    def mean(self):
+        return self._mean if self.count else None
+
+    def variance(self):
+        """the population variance, like np.var"""
+        return self._m2 / self.count if self.count else None
+
+    def std(self):
+        variance = self.variance()
+        return None if variance is None else math.sqrt(variance)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "variance": self.variance(),
+            "std": self.std(),
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+
+class Group:
+    """the rows of one height or one drop: their positions in the dataset, their GROUP_COLUMNS and running aggregates.
+
+    the positions and columns live in numpy buffers that double when they are full, like the ones of BounceDataset,
+    so adding a row is amortized O(1) and arrays() hands out views instead of building new arrays
+    """
+
+    def __init__(self, key, height, capacity=1):
+        self.key = key
+        self.height = height
+        self.last_bounce = None
+        self._size = 0
+        self._positions = np.empty(capacity, dtype=np.int64)
+        # one (capacity, len(GROUP_COLUMNS)) buffer, most drops only ever get a handful of rows
+        self._values = np.empty((capacity, len(GROUP_COLUMNS)), dtype=np.float64)
+        self._stats = {column: RunningStats() for column in AGGREGATE_COLUMNS}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def positions(self):
+        """the positions of the rows in the dataset, as a read only (N,) int64 view"""
+        return _read_only(self._positions[:self._size])
+
+    def add(self, position, row):
+        self.extend((position,), (row,))
+
+    def extend(self, positions, rows):
+        """adds rows at the given dataset positions, written into the buffers in one go"""
+        n = self._size
+        end = n + len(rows)
+        if end > len(self._positions):
+            self._grow(max(2 * len(self._positions), end))
+        self._positions[n:end] = positions
+        # None becomes nan
+        self._values[n:end] = [_group_values(row) for row in rows]
+        for column, stats in self._stats.items():
+            stats.extend(self._values[n:end, _COLUMN_INDEX[column]].tolist())
+        self.last_bounce = rows[-1]['Bounce Number']
+        # only now the rows become part of the views
+        self._size = end
+
+    def _grow(self, capacity):
+        # copies into new buffers, the views handed out earlier keep pointing at the old ones
+        n = self._size
+        positions = np.empty(capacity, dtype=np.int64)
+        positions[:n] = self._positions[:n]
+        values = np.empty((capacity, len(GROUP_COLUMNS)), dtype=np.float64)
+        values[:n] = self._values[:n]
+        self._positions, self._values = positions, values
+
+    def arrays(self):
+        """the GROUP_COLUMNS of the group as read only float64 views (a missing bounce number is nan). rows added
+        later dont show up in them
+
+        Returns:
+            dict: column -> np.ndarray
+        """
+        values = self._values[:self._size]
+        return {column: _read_only(values[:, index]) for column, index in _COLUMN_INDEX.items()}
+
+    def stats(self, column):
+        """the RunningStats of one of the AGGREGATE_COLUMNS"""
+        return self._stats[column]
+
+    def summary(self):
+        """json friendly size and aggregates of the group"""
+        return {
+            "height": self.height,
+            "rows": self._size,
+            **{column: stats.as_dict() for column, stats in self._stats.items()},
+        }
+
+
+class GroupIndex:
+    """Groups the rows of a dataset by height and by drop, updated row by row as the dataset grows."""
+
+    def __init__(self, rows=()):
+        """
+        Args:
+            rows (Iterable[dict], optional): the measurements already in the dataset, in order. Defaults to ().
+        """
+        self._lock = threading.Lock()
+        self._heights = {}
+        self._drops = []
+        self._drop_of = []
+        self._drops_per_height = {}
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self._drop_of)
+
+    def append(self, row):
+        """adds the next row of the dataset"""
+        self.extend((row,))
+
+    def extend(self, rows):
+        """adds the next rows of the dataset, in order. the rows are sorted into their groups first and every group
+        then takes its share in one go"""
+        with self._lock:
+            pending = {}
+            for row in rows:
+                self._add(row, pending)
+            for group, (positions, group_rows) in pending.items():
+                group.extend(positions, group_rows)
+
+    def _add(self, row, pending):
+        position = len(self._drop_of)
+        height = row['Height']
+        group = self._heights.get(height)
+        if group is None:
+            group = self._heights[height] = Group(height, height)
+        _pend(pending, group, position, row)
+
+        bounce = row['Bounce Number']
+        drop = self._drops[-1] if self._drops else None
+        if (drop is None or bounce is None or drop.last_bounce is None
+                or drop.height != height or bounce <= drop.last_bounce):
+            drop = Group(len(self._drops), height)
+            self._drops.append(drop)
+            self._drops_per_height[height] = self._drops_per_height.get(height, 0) + 1
+        _pend(pending, drop, position, row)
+        # the next row is compared with this one before the drop got its rows
+        drop.last_bounce = bounce
+        self._drop_of.append(drop.key)
+
+    def heights(self):
+        """the heights in the order they first showed up in the dataset"""
+        return list(self._heights)
+
+    def height(self, height):
+        """the Group of a height
+
+        Raises:
+            KeyError: if there is no row with that height
+        """
+        return self._heights[height]
+
+    def drop(self, drop_id):
+        """the Group of a drop, drop ids count up from 0 in dataset order"""
+        return self._drops[drop_id]
+
+    def drop_of(self, position):
+        """the drop id of the row at `position` in the dataset"""
+        return self._drop_of[position]
+
+    def drop_count(self):
+        return len(self._drops)
+
+    def drop_ids(self):
+        """the drop id of every row, in dataset order
+
+        Returns:
+            np.ndarray: (N,) int64
+        """
+        with self._lock:
+            return np.array(self._drop_of, dtype=np.int64)
+
+    def height_arrays(self):
+        """a consistent snapshot of the arrays of every height, for handing the groups to another thread
+
+        Returns:
+            dict: height -> Group.arrays()
+        """
+        with self._lock:
+            return {height: group.arrays() for height, group in self._heights.items()}
+
+    def summary(self):
+        """json friendly aggregates per height plus the number of drops per height"""
+        with self._lock:
+            return {
+                "rows": len(self._drop_of),
+                "drops": len(self._drops),
+                "heights": [dict(group.summary(), drops=self._drops_per_height[height])
+                            for height, group in self._heights.items()],
+            }
+
+
+def _pend(pending, group, position, row):
+    positions, rows = pending.setdefault(group, ([], []))
+    positions.append(position)
+    rows.append(row)
+
+
+def _read_only(values):
+    view = values.view()
+    view.flags.writeable = False
+    return view
@@ -0,0 +1,258 @@
+"""HTTP caching and compression for the responses that are the same for every request.
+
+the landing page, the static assets and the results page (per dataset and model version) dont change between
+requests, so they are built once and kept as a CachedBody: the bytes, a strong etag and the compressed variants,
+which are only compressed the first time a client asks for them.
+
+- If-None-Match is answered with an empty 304
+- assets get content hashed urls (/assets/timer.js?v=<hash>). a url with the current hash can never change, so
+  it is cached by the browser for a year. without the hash the browser has to revalidate
+- text bodies from COMPRESS_MIN_BYTES on are sent gzip or brotli compressed, brotli only if the brotli package
+  is installed
+"""
+import collections
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from urllib.parse import quote
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional, gzip works everywhere
+    brotli = None
+
+
+# bodies below this size are sent as they are, compressing them saves less than the headers cost
+COMPRESS_MIN_BYTES = 1024
+
+# content types worth compressing, images and the like are compressed already
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# what we can produce, in the order we prefer them
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def compress(body, encoding):
+    """compresses a body with one of ENCODINGS at the highest level, its done once per body"""
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    if encoding == "gzip":
+        # mtime=0 keeps the output the same for the same body
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    raise ValueError(f"unknown encoding {encoding!r}")
+
+
+def choose_encoding(accept_encoding, available=ENCODINGS):
+    """picks the encoding for a response from the Accept-Encoding header
+
+    Args:
+        accept_encoding (str|None): the raw header value
+        available (tuple, optional): encodings we can send, preferred first. Defaults to ENCODINGS.
+
+    Returns:
+        str|None: the encoding, None for the uncompressed body
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match, etag):
+    """checks an If-None-Match header against an etag, weak comparison like the http spec wants for GET
+
+    Args:
+        if_none_match (str|None): the raw header value
+        etag (str): our quoted etag
+
+    Returns:
+        bool: True if the client already has this exact representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class CachedBody:
+    """a response body that doesnt change, with its etag and its compressed variants"""
+
+    def __init__(self, body, media_type, min_size=COMPRESS_MIN_BYTES):
+        """
+        Args:
+            body (bytes|str): the body, str is encoded as utf-8
+            media_type (str): its content type
+            min_size (int, optional): smallest body that gets compressed. Defaults to COMPRESS_MIN_BYTES.
+        """
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.media_type = media_type
+        self.digest = hashlib.sha1(self.body).hexdigest()
+        self.etag = f'"{self.digest}"'
+        self.compressible = len(self.body) >= min_size and media_type.startswith(COMPRESSIBLE_TYPES)
+        self._lock = threading.Lock()
+        self._variants = {}
+
+    @property
+    def version(self):
+        """short content hash for the url of the body"""
+        return self.digest[:12]
+
+    def variant(self, encoding):
+        """the body compressed with `encoding`, compressed on first use
+
+        Returns:
+            bytes|None: None if compressing doesnt make it smaller
+        """
+        with self._lock:
+            if encoding not in self._variants:
+                compressed = compress(self.body, encoding)
+                self._variants[encoding] = compressed if len(compressed) < len(self.body) else None
+            return self._variants[encoding]
+
+    def response(self, request, cache_control="no-cache", headers=None):
+        """the response for a request: a 304 if the client has it already, else the best variant it accepts
+
+        Args:
+            request (Request): the request, for If-None-Match and Accept-Encoding
+            cache_control (str, optional): the Cache-Control header. Defaults to "no-cache" (always revalidate).
+            headers (dict, optional): extra headers. Defaults to None.
+
+        Returns:
+            Response
+        """
+        encoding = choose_encoding(request.headers.get("accept-encoding")) if self.compressible else None
+        body = self.variant(encoding) if encoding else None
+        if body is None:
+            encoding, body = None, self.body
+        # every variant is a different representation, so it gets its own strong etag
+        etag = self.etag if encoding is None else f'"{self.digest}-{encoding}"'
+        headers = dict(headers or {}, **{"ETag": etag, "Cache-Control": cache_control})
+        if self.compressible:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+class PageCache:
+    """the last few rendered pages as CachedBody, by a key that changes whenever the page would"""
+
+    def __init__(self, max_entries=16, min_size=COMPRESS_MIN_BYTES):
+        self.max_entries = max_entries
+        self.min_size = min_size
+        self._lock = threading.Lock()
+        self._pages = collections.OrderedDict()
+
+    def get(self, key, render, media_type="text/html; charset=utf-8"):
+        """the page for `key`, rendered with render() if it isnt cached
+
+        Args:
+            key (Hashable): e.g the dataset and model version the page shows
+            render (Callable[[], str]): builds the page
+            media_type (str, optional): its content type. Defaults to html.
+
+        Returns:
+            CachedBody
+        """
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                return page
+        page = CachedBody(render(), media_type, self.min_size)
+        with self._lock:
+            self._pages[key] = page
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+
+class AssetCache:
+    """serves the files of a directory from memory. a file is read again when its size or mtime changes"""
+
+    def __init__(self, directory, prefix="/assets", min_size=COMPRESS_MIN_BYTES):
+        """
+        Args:
+            directory (str): where the files are
+            prefix (str, optional): the url the directory is served under. Defaults to "/assets".
+            min_size (int, optional): see CachedBody. Defaults to COMPRESS_MIN_BYTES.
+        """
+        self.directory = os.path.realpath(directory)
+        self.prefix = prefix
+        self.min_size = min_size
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def get(self, name):
+        """the CachedBody of a file
+
+        Returns:
+            CachedBody|None: None if there is no such file in the directory
+        """
+        path = os.path.realpath(os.path.join(self.directory, name))
+        if os.path.commonpath([path, self.directory]) != self.directory:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(path, "rb") as f:
+            body = f.read()
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+            media_type += "; charset=utf-8"
+        asset = CachedBody(body, media_type, self.min_size)
+        with self._lock:
+            self._files[path] = (key, asset)
+        return asset
+
+    def url(self, name):
+        """the content hashed url of a file, falls back to the plain url if the file is missing"""
+        asset = self.get(name)
+        url = f"{self.prefix}/{quote(name)}"
+        return url if asset is None else f"{url}?v={asset.version}"
+
+    def response(self, name, request, v=None):
+        """the response for /assets/{name}
+
+        Args:
+            name (str): the file
+            request (Request): the request
+            v (str, optional): the content hash from url(). if it matches the file the response is immutable. Defaults to None.
+
+        Returns:
+            Response|None: None if there is no such file
+        """
+        asset = self.get(name)
+        if asset is None:
+            return None
+        return asset.response(request, IMMUTABLE if v == asset.version else "no-cache")
@@ -0,0 +1,207 @@
+"""Streaming parser for raw stopwatch lap logs.
+
+A lap log looks like the data in src/clean.py: a line with just a number starts a new drop from that height (cm),
+every other non empty line is one bounce as `<bounce number> <total time> <interval time>` with times in MM:SS.SS:
+
+    180
+      01      00:00.14      00:00.14
+      02      00:00.71      00:00.57
+
+The file is read line by line and handed out in fixed size batches, so memory stays constant no matter how big the
+log is. The timestamps of a batch are converted in one vectorized numpy pass and the rows are validated against the
+BounceData schema before they go anywhere.
+"""
+import re
+from typing import List
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+
+
+TIME_PATTERN = r"^\d{1,2}:\d{1,2}(\.\d+)?$"
+
+_HEIGHT_LINE = re.compile(r"^\d+$")
+
+# how many parse/validation errors an ingest report keeps, the rest are only counted
+MAX_REPORTED_ERRORS = 50
+
+
+class BounceData(BaseModel):
+    """one bounce measurement, the schema described in FortunaModel.calibrate"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    Height: int = Field(..., gt=0, description="The height of the bounce in centimeters")
+    Bounce_Number: int = Field(..., ge=1, alias="Bounce Number", description="The sequential number of the bounce")
+    Total_Time: str = Field(..., pattern=TIME_PATTERN, alias="Total Time", description="The total time taken in 'MM:SS.SS' format")
+    Interval_Time: str = Field(..., pattern=TIME_PATTERN, alias="Interval Time", description="The time interval between bounces in 'MM:SS.SS' format")
+    Total_Time_ms: int = Field(..., ge=0, alias="Total Time (ms)", description="The total time in milliseconds")
+    Interval_Time_ms: int = Field(..., ge=0, alias="Interval Time (ms)", description="The interval time in milliseconds")
+
+
+_BATCH_ADAPTER = TypeAdapter(List[BounceData])
+
+
+def time_to_milliseconds(time_str):
+    """Convert time in format MM:SS.SS to milliseconds."""
+    minutes, seconds = time_str.split(':')
+    minutes = int(minutes)
+    seconds = float(seconds)
+    milliseconds = (minutes * 60 + seconds) * 1000
+    return int(milliseconds)
+
+
+def times_to_milliseconds(times):
+    """vectorized time_to_milliseconds() for a whole array of MM:SS.SS strings. does the exact same float math, so
+    the results are identical to converting them one by one
+
+    Args:
+        times (Array[str]): the timestamps
+
+    Returns:
+        np.ndarray: int64 milliseconds
+    """
+    times = np.asarray(times, dtype=np.str_)
+    if times.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    parts = np.char.partition(times, ':')
+    minutes = parts[:, 0].astype(np.int64)
+    seconds = parts[:, 2].astype(np.float64)
+    return ((minutes * 60 + seconds) * 1000).astype(np.int64)
+
+
+def iter_laps(lines):
+    """parses a lap log line by line
+
+    Args:
+        lines (Iterable[str]): the lines of the log, e.g an open text file
+
+    Yields:
+        tuple: (line_number, height, bounce_number, total_time, interval_time) for every bounce line,
+            or (line_number, None, None, None, error message) for a line that doesnt parse
+    """
+    current_height = None
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if _HEIGHT_LINE.match(line):  # Line with just a number indicates a new height
+            current_height = int(line)
+            continue
+        parts = line.split()
+        if len(parts) != 3 or not parts[0].isdigit():
+            yield line_number, None, None, None, f"line {line_number}: expected '<bounce> <total> <interval>', got {line!r}"
+        elif current_height is None:
+            yield line_number, None, None, None, f"line {line_number}: bounce before any height"
+        else:
+            yield line_number, current_height, int(parts[0]), parts[1], parts[2]
+
+
+def iter_batches(lines, batch_size=4096):
+    """groups the parsed laps into validated batches of measurement dicts
+
+    Args:
+        lines (Iterable[str]): the lines of the log
+        batch_size (int, optional): bounces per batch. Defaults to 4096.
+
+    Yields:
+        tuple: (rows, errors) where rows are the valid measurement dicts of the batch and errors the messages for the rejected lines
+    """
+    pending = []
+    errors = []
+    for lap in iter_laps(lines):
+        if lap[1] is None:
+            errors.append(lap[4])
+        else:
+            pending.append(lap)
+        if len(pending) + len(errors) >= batch_size:
+            yield _build_batch(pending, errors)
+            pending, errors = [], []
+    if pending or errors:
+        yield _build_batch(pending, errors)
+
+
+def _convert_times(laps, errors):
+    """converts the timestamps of a batch, vectorized when it can. a broken timestamp makes it fall back to
+    one by one, so only the bad lines get rejected
+
+    Returns:
+        tuple: (laps, total_ms, interval_ms) with the laps that converted fine
+    """
+    try:
+        return laps, times_to_milliseconds([lap[3] for lap in laps]), times_to_milliseconds([lap[4] for lap in laps])
+    except ValueError:
+        pass
+    good, total_ms, interval_ms = [], [], []
+    for lap in laps:
+        try:
+            total_time, interval_time = time_to_milliseconds(lap[3]), time_to_milliseconds(lap[4])
+        except ValueError:
+            errors.append(f"line {lap[0]}: bad timestamp in {lap[3]!r} / {lap[4]!r}")
+            continue
+        good.append(lap)
+        total_ms.append(total_time)
+        interval_ms.append(interval_time)
+    return good, np.array(total_ms, dtype=np.int64), np.array(interval_ms, dtype=np.int64)
+
+
+def _build_batch(laps, errors):
+    laps, total_ms, interval_ms = _convert_times(laps, errors)
+    rows = [
+        {
+            "Height": height,
+            "Bounce Number": bounce_number,
+            "Total Time": total,
+            "Interval Time": interval,
+            "Total Time (ms)": total_time,
+            "Interval Time (ms)": interval_time,
+        }
+        for (_, height, bounce_number, total, interval), total_time, interval_time
+        in zip(laps, total_ms.tolist(), interval_ms.tolist())
+    ]
+    return validate_rows(rows, [lap[0] for lap in laps], errors), errors
+
+
+def validate_rows(rows, line_numbers, errors):
+    """validates a batch against BounceData in one go. rows that fail are dropped and reported in `errors`
+
+    Args:
+        rows (List[dict]): measurement dicts
+        line_numbers (Sequence[int]): the log line of every row, for the error messages
+        errors (List[str]): gets the messages of the rejected rows appended
+
+    Returns:
+        List[dict]: the valid rows
+    """
+    try:
+        _BATCH_ADAPTER.validate_python(rows)
+        return rows
+    except ValidationError as e:
+        bad = {}
+        for error in e.errors():
+            index = error["loc"][0]
+            bad.setdefault(index, f"line {line_numbers[index]}: {error['loc'][-1]} {error['msg']}")
+        errors.extend(bad[index] for index in sorted(bad))
+        return [row for index, row in enumerate(rows) if index not in bad]
+
+
+def ingest_lap_log(lines, sink, batch_size=4096):
+    """streams a lap log into `sink` batch by batch
+
+    Args:
+        lines (Iterable[str]): the lines of the log
+        sink (Callable[[List[dict]], None]): gets every batch of valid rows, e.g MeasurementStore.append_many
+        batch_size (int, optional): bounces per batch. Defaults to 4096.
+
+    Returns:
+        dict: {"rows": accepted rows, "rejected": rejected lines, "batches": batches written, "errors": the first MAX_REPORTED_ERRORS messages}
+    """
+    report = {"rows": 0, "rejected": 0, "batches": 0, "errors": []}
+    for rows, errors in iter_batches(lines, batch_size):
+        if rows:
+            sink(rows)
+            report["rows"] += len(rows)
+            report["batches"] += 1
+        report["rejected"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(report["errors"])
+        report["errors"].extend(errors[:max(room, 0)])
+    return report
@@ -0,0 +1,144 @@
+"""Live bounce sessions for the /ws/bounces websocket.
+
+the timer page used to post a single (total time, last interval) pair once the drop was over. over the websocket
+the browser sends every bounce the moment it happens and gets an updated height back after each one:
+
+    -> {"type": "start"}                      the ball was released, starts a new drop
+    -> {"type": "bounce", "t_ms": 710}        a bounce, t_ms after the release (measured by the client)
+    <- {"type": "prediction", "bounce": 2, "predicted_height_cm": 171.3, ...}
+    -> {"type": "submit", "height": 180}      stores the whole drop as a measurement
+    <- {"type": "stored", "rows": 4}
+
+a session keeps every bounce of the current drop. each bounce is one (total time, interval) row like in the
+dataset, so the prediction is the mean over the first bounces the model is calibrated on instead of only the last one.
+"""
+import math
+import time
+
+import numpy as np
+
+
+# a drop with more bounces than this is a stuck key, not a tennis ball
+MAX_BOUNCES = 64
+
+
+class SessionError(ValueError):
+    """a message the session cant do anything with, it is reported back to the client"""
+
+
+def format_lap_time(ms):
+    """milliseconds as the mm:ss.cc strings of the lap log, 710 -> '00:00.71'"""
+    minutes, rest = divmod(float(ms) / 1000, 60)
+    return f"{int(minutes):02d}:{rest:05.2f}"
+
+
+class BounceSession:
+    """the bounces of the drop that is going on right now on one websocket, and the features derived from them"""
+
+    def __init__(self, max_model_bounce=4, max_bounces=MAX_BOUNCES):
+        """
+        Args:
+            max_model_bounce (int, optional): bounces after this one dont go into the prediction, like in the model
+                dataset. Defaults to 4.
+            max_bounces (int, optional): bounces per drop before the session refuses more. Defaults to MAX_BOUNCES.
+        """
+        self.max_model_bounce = max_model_bounce
+        self.max_bounces = max_bounces
+        self.drops = 0
+        self.reset()
+
+    def reset(self):
+        """forgets the current drop"""
+        self.started = None
+        self.times = []
+        self.intervals = []
+
+    def start(self, now=None):
+        """a new drop, the ball was just released
+
+        Args:
+            now (float, optional): time.monotonic() of the release, for bounces without a client timestamp. Defaults to now.
+        """
+        self.reset()
+        self.started = time.monotonic() if now is None else now
+        self.drops += 1
+
+    def bounce(self, t_ms=None):
+        """records a bounce and updates the running features
+
+        Args:
+            t_ms (float, optional): milliseconds since the release as the client measured them. without it the
+                server clock is used, which includes the network delay. Defaults to None.
+
+        Raises:
+            SessionError: before start(), for a timestamp that goes backwards or past max_bounces
+
+        Returns:
+            int: the bounce number
+        """
+        if self.started is None:
+            raise SessionError("send a start message before the first bounce")
+        if len(self.times) >= self.max_bounces:
+            raise SessionError(f"more than {self.max_bounces} bounces in one drop")
+        if t_ms is None:
+            t_ms = (time.monotonic() - self.started) * 1000
+        t_ms = float(t_ms)
+        previous = self.times[-1] if self.times else 0.0
+        if not t_ms > previous:
+            raise SessionError(f"bounce at {t_ms}ms is not after the previous one at {previous}ms")
+        self.times.append(t_ms)
+        self.intervals.append(t_ms - previous)
+        return len(self.times)
+
+    def features(self):
+        """the (total time, interval time) row of every bounce so far, like the rows of the dataset
+
+        Returns:
+            np.ndarray: (bounces, 2) float64
+        """
+        return np.column_stack([np.asarray(self.times, dtype=np.float64), np.asarray(self.intervals, dtype=np.float64)])
+
+    def model_features(self):
+        """features() cut to the bounces the model is calibrated on"""
+        return self.features()[:self.max_model_bounce]
+
+    def rows(self, height):
+        """the drop as measurements for the store, one row per bounce with its bounce number
+
+        Args:
+            height (float): the real drop height in cm
+
+        Raises:
+            SessionError: if there are no bounces yet or the height isnt a positive number
+        """
+        if not self.times:
+            raise SessionError("there are no bounces to submit")
+        height = float(height)
+        # a nan height would poison the least squares solver for good
+        if not math.isfinite(height) or height <= 0:
+            raise SessionError(f"height must be a positive number of cm, not {height}")
+        return [{
+            'Height': height,
+            'Bounce Number': number,
+            'Total Time': format_lap_time(total),
+            'Interval Time': format_lap_time(interval),
+            'Total Time (ms)': total,
+            'Interval Time (ms)': interval,
+        } for number, (total, interval) in enumerate(zip(self.times, self.intervals), start=1)]
+
+    def summary(self, heights):
+        """the message sent back after a bounce
+
+        Args:
+            heights (np.ndarray): the predicted height per bounce of model_features()
+        """
+        return {
+            "type": "prediction",
+            "drop": self.drops,
+            "bounce": len(self.times),
+            "total_time_ms": self.times[-1],
+            "interval_time_ms": self.intervals[-1],
+            "intervals_ms": list(self.intervals),
+            "bounce_heights_cm": heights.tolist(),
+            "predicted_height_cm": float(heights.mean()) if len(heights) else None,
+        }
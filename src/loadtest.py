@@ -0,0 +1,355 @@
+"""Load test for the TenniScale api.
+
+starts the app under uvicorn on a throw away database and params file, fires a weighted mix of requests at it from
+many concurrent clients and reports the throughput and the latency percentiles per route as json:
+
+    python -m src.loadtest --workers 1 --concurrency 32 --duration 20
+    python -m src.loadtest --workers 4 --rate 200 --mix predict=8,measure=1,results=1 --output w4.json
+    python -m src.loadtest --url http://localhost:8000 --concurrency 8     # an app that is already running
+
+--concurrency runs a closed loop: every client sends its next request as soon as the last one is answered.
+--rate runs an open loop: requests start on a fixed schedule whether the server keeps up or not, and the latency
+is counted from the scheduled start, so a stalled server shows up in the percentiles instead of lowering the rate.
+failed requests count in the percentiles at the time they took to fail, the ones the open loop had to drop at the
+--timeout.
+
+the "probe" route is a cheap GET that does no work. when its p99 goes up with the load, something blocks the
+event loop.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+DEFAULT_MIX = "predict=4,batch=1,measure=1,root=2,results=1,plots=1,probe=1"
+
+PLOTS = ("scatter", "lines", "histogram", "box")
+
+
+def _timings(rng):
+    total = float(rng.uniform(300, 3000))
+    return total, float(rng.uniform(100, min(total, 900)))
+
+
+def _predict(client, rng):
+    total, interval = _timings(rng)
+    return client.post("/api/predict", data={"total_time_ms": total, "interval_time_ms": interval})
+
+
+def _batch(client, rng):
+    rows = rng.uniform(100, 3000, size=(64, 2))
+    return client.post("/api/v1/predict/batch", json={"total_time_ms": rows[:, 0].tolist(),
+                                                      "interval_time_ms": rows[:, 1].tolist()})
+
+
+def _measure(client, rng):
+    total, interval = _timings(rng)
+    return client.post("/api/measure", data={"height": float(rng.choice([20, 60, 100, 140, 180])),
+                                              "total_time_ms": total, "interval_time_ms": interval})
+
+
+def _plots(client, rng):
+    return client.get(f"/api/results/plots/{PLOTS[rng.integers(len(PLOTS))]}.png")
+
+
+# route name -> (request builder, status codes that count as success)
+ROUTES = {
+    "root": (lambda client, rng: client.get("/"), (200,)),
+    "predict": (_predict, (200,)),
+    "batch": (_batch, (200,)),
+    "measure": (_measure, (303,)),
+    "results": (lambda client, rng: client.get("/api/results"), (200,)),
+    "plots": (_plots, (200,)),
+    "stats": (lambda client, rng: client.get("/api/v1/stats"), (200,)),
+    "calibrate": (lambda client, rng: client.get("/api/calibrate"), (200,)),
+    "probe": (lambda client, rng: client.get("/api/v1/startup"), (200,)),
+}
+
+
+def parse_mix(mix):
+    """'predict=4,measure=1' -> {'predict': 4.0, 'measure': 1.0}
+
+    Raises:
+        ValueError: for unknown routes or weights that arent positive
+    """
+    weights = {}
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"unknown route {name!r}, expected one of {tuple(ROUTES)}")
+        weights[name] = float(weight) if weight else 1.0
+        if weights[name] <= 0:
+            raise ValueError(f"the weight of {name!r} has to be positive")
+    if not weights:
+        raise ValueError("the mix is empty")
+    return weights
+
+
+class Recorder:
+    """collects (route, latency, ok, status) per request, leaving out the ones that started during the warmup.
+    failed requests have a latency too: how long they took to fail, or the timeout for the ones that never got sent
+    """
+
+    def __init__(self, measure_from, timeout=30.0):
+        self.measure_from = measure_from
+        self.timeout = timeout
+        self.samples = []
+        self.failures = {}
+
+    def record(self, route, started, latency, status):
+        if started < self.measure_from:
+            return
+        self.samples.append((route, latency, status in ROUTES[route][1], status))
+
+    def fail(self, route, started, error, latency=None):
+        if started < self.measure_from:
+            return
+        self.samples.append((route, self.timeout if latency is None else latency, False, None))
+        key = f"{route}: {type(error).__name__}"
+        self.failures[key] = self.failures.get(key, 0) + 1
+
+
+async def _send(client, route, rng, recorder, started):
+    try:
+        response = await ROUTES[route][0](client, rng)
+    except Exception as e:  # connection errors and timeouts are results too
+        recorder.fail(route, started, e, time.perf_counter() - started)
+        return
+    recorder.record(route, started, time.perf_counter() - started, response.status_code)
+
+
+async def closed_loop(client, routes, weights, concurrency, deadline, recorder, rng):
+    """`concurrency` clients that each send the next request as soon as they got the last answer"""
+    async def user(rng):
+        while time.perf_counter() < deadline:
+            route = routes[rng.choice(len(routes), p=weights)]
+            await _send(client, route, rng, recorder, time.perf_counter())
+
+    await asyncio.gather(*(user(np.random.default_rng(seed)) for seed in rng.integers(2 ** 63, size=concurrency)))
+
+
+async def open_loop(client, routes, weights, rate, deadline, recorder, rng, max_in_flight):
+    """starts requests at a fixed `rate` per second. a request that cant start because max_in_flight requests are
+    still waiting counts as failed, the schedule doesnt slow down for the server
+    """
+    interval = 1.0 / rate
+    in_flight = set()
+    next_start = time.perf_counter()
+    while next_start < deadline:
+        delay = next_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        route = routes[rng.choice(len(routes), p=weights)]
+        if len(in_flight) >= max_in_flight:
+            recorder.fail(route, next_start, OverflowError())
+        else:
+            task = asyncio.create_task(_send(client, route, rng, recorder, next_start))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_start += interval
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+async def run_load(url, mix, duration, warmup=0.0, concurrency=None, rate=None, max_in_flight=1000, seed=0,
+                   timeout=30.0):
+    """drives the mix at a server
+
+    Args:
+        url (str): base url of the app
+        mix (dict): route -> weight, see parse_mix()
+        duration (float): seconds that are measured
+        warmup (float, optional): seconds before that which are not measured. Defaults to 0.
+        concurrency (int, optional): clients of the closed loop. Defaults to None.
+        rate (float, optional): requests per second of the open loop, wins over concurrency. Defaults to None.
+        max_in_flight (int, optional): open loop only, see open_loop(). Defaults to 1000.
+        seed (int, optional): seed of the route choice and the request bodies. Defaults to 0.
+        timeout (float, optional): per request timeout in seconds. Defaults to 30.
+
+    Returns:
+        Recorder: the samples
+    """
+    import httpx
+    routes = list(mix)
+    weights = np.array([mix[route] for route in routes], dtype=np.float64)
+    weights /= weights.sum()
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    recorder = Recorder(started + warmup, timeout)
+    deadline = started + warmup + duration
+    connections = max_in_flight if rate else concurrency
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        if rate:
+            await open_loop(client, routes, weights, rate, deadline, recorder, rng, max_in_flight)
+        else:
+            await closed_loop(client, routes, weights, concurrency or 1, deadline, recorder, rng)
+    return recorder
+
+
+def summarize(samples, duration):
+    """throughput, error count and latency percentiles of a list of samples. the percentiles are over every
+    request, the failed ones included: a server that times out or drops requests under load has to show up in
+    the tail, not vanish from it. the ok_ percentiles are the successful requests alone
+    """
+    latencies = np.array([latency for _, latency, _, _ in samples], dtype=np.float64)
+    ok_latencies = np.array([latency for _, latency, ok, _ in samples if ok], dtype=np.float64)
+    statuses = {}
+    for _, _, _, status in samples:
+        key = str(status) if status is not None else "error"
+        statuses[key] = statuses.get(key, 0) + 1
+    summary = {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok, _ in samples if not ok),
+        "throughput_rps": len(ok_latencies) / duration if duration else None,
+        "status_codes": statuses,
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary.update(mean_s=float(latencies.mean()), p50_s=float(p50), p95_s=float(p95), p99_s=float(p99),
+                       max_s=float(latencies.max()))
+    if len(ok_latencies):
+        p50, p99 = np.percentile(ok_latencies, [50, 99])
+        summary.update(ok_p50_s=float(p50), ok_p99_s=float(p99))
+    return summary
+
+
+def report(recorder, duration):
+    """the json report: everything together and per route"""
+    by_route = {}
+    for sample in recorder.samples:
+        by_route.setdefault(sample[0], []).append(sample)
+    return {
+        "overall": summarize(recorder.samples, duration),
+        "routes": {route: summarize(samples, duration) for route, samples in sorted(by_route.items())},
+        "failures": recorder.failures,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port, workers, env=None, timeout=120.0):
+    """runs the app under uvicorn against a fresh database and params file in `workdir`, returns once it answers
+
+    Returns:
+        subprocess.Popen: the uvicorn process
+    """
+    import httpx
+    params_file = os.path.join(workdir, "best_params.json")
+    shutil.copy("assets/best_params.json", params_file)
+    server_env = dict(os.environ, **(env or {}))
+    server_env.update({
+        "TENNISCALE_DB": os.path.join(workdir, "measurements.sqlite3"),
+        "TENNISCALE_PARAMS_FILE": params_file,
+    })
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=server_env, stdout=sys.stderr, stderr=sys.stderr)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode} during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/v1/startup", timeout=1.0).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError(f"the app didnt come up within {timeout}s")
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="load test the TenniScale api")
+    parser.add_argument("--url", help="test an app that is already running instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes of the started app")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"route=weight pairs, routes: {', '.join(ROUTES)}")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients of the closed loop")
+    parser.add_argument("--rate", type=float, help="requests per second, switches to the open loop")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="open loop: requests waiting at most")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds that are measured")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds before the measurement")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the started app, e.g TENNISCALE_SOLVER=lstsq")
+    parser.add_argument("--output", help="write the json report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+    env = dict(item.split("=", 1) for item in args.env)
+
+    workdir = server = None
+    url = args.url
+    try:
+        if url is None:
+            workdir = tempfile.mkdtemp(prefix="tenniscale-load-")
+            port = free_port()
+            server = start_server(workdir, port, args.workers, env)
+            url = f"http://127.0.0.1:{port}"
+        recorder = asyncio.run(run_load(url, mix, args.duration, args.warmup, args.concurrency, args.rate,
+                                        args.max_in_flight, args.seed, args.timeout))
+    finally:
+        if server is not None:
+            stop_server(server)
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "meta": {
+            "created_at": time.time(),
+            "url": args.url,
+            "workers": None if args.url else args.workers,
+            "mode": "open" if args.rate else "closed",
+            "concurrency": None if args.rate else args.concurrency,
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": mix,
+            "env": env,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        **report(recorder, args.duration),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
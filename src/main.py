@@ -1,46 +1,315 @@
-from typing import Union
-from fastapi import FastAPI, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-import pandas as pd
-from src.fortuna import FortunaModel
-import matplotlib.pyplot as plt
+import time
+_import_started = time.perf_counter()  # first thing, so the startup report covers the imports too
+
+from contextlib import asynccontextmanager
+from typing import List, Optional, Union
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, ValidationError, model_validator
+import numpy as np
+from src.fortuna import FortunaModel, ModelSnapshot
+from src.calibration import CalibrationService
+from src.store import MeasurementStore
+from src.export import CHUNK_ROWS, FORMATS, available_formats, export_chunks
+from src.snapshot import load_dataset
+from src.ingest import ingest_lap_log
+from src.groups import GroupIndex
+from src.live import BounceSession, SessionError
+from src.registry import DEFAULT_PROFILE, ModelRegistry, check_profile_id
+from src.evaluation import Evaluator, model_config
+from src.shared import LeaderLock, SharedParams, Ticker
+from src.plots import DENSITY_THRESHOLD, PLOT_NAMES, PlotCache, plot_stats
+from src.stats import StatsEngine
+from src.http_cache import COMPRESS_MIN_BYTES, IMMUTABLE, AssetCache, PageCache, etag_matches
+from src.metrics import (BEST_MSE, CONTENT_TYPE, DATASET_ROWS, LIVE_BOUNCES, LIVE_SESSIONS, PROFILES_LOADED, REGISTRY,
+                         MetricsMiddleware)
+from src.logs import configure_logging
+import asyncio
+import contextlib
 import io
-import base64
+import logging
+import os
+import json
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """starts the calibration worker with the app and stops it again on shutdown.
+    in fast start mode the persisted best_params.json is trusted and there is no calibration at startup,
+    except when there are no params yet or the least squares solver needs its factorization for incremental updates.
+    with several uvicorn workers only the elected leader calibrates, the others pick up its params
+    """
+    if not become_leader():
+        sync_params()
+    startup_report["leader"] = leader.is_leader
+    sync_ticker.start()
+    startup_report["ready_s"] = time.perf_counter() - _import_started
+    logger.info("TenniScale startup", extra=startup_report)
+    yield
+    sync_ticker.stop()
+    calibration.stop()
+    plot_cache.shutdown()
+    profiles.close()
+    model.store.close()
+    store.close()
+    leader.release()
+    shared_params.close()
+
+
+configure_logging()
 
+# pages and assets are compressed once and cached (see src/http_cache.py), the gzip middleware compresses the
+# dynamic responses. both only from TENNISCALE_COMPRESS_MIN_BYTES on
+COMPRESS_MIN = int(os.environ.get("TENNISCALE_COMPRESS_MIN_BYTES", COMPRESS_MIN_BYTES))
+assets = AssetCache("assets", min_size=COMPRESS_MIN)
+pages = PageCache(min_size=COMPRESS_MIN)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN)
+app.add_middleware(MetricsMiddleware)
 
-app.mount("/assets", StaticFiles(directory="assets"), name="assets")
+# TENNISCALE_FAST_START=0 goes back to calibrating on every start instead of trusting assets/best_params.json
+FAST_START = os.environ.get("TENNISCALE_FAST_START", "1") != "0"
 
-# Load existing bounce data from CSV file
+# how long the different parts of the startup took, in seconds. see /api/v1/startup
+startup_report = {"imports_s": time.perf_counter() - _import_started, "fast_start": FAST_START}
+
+# all measurements live in the sqlite store. the csv is imported into it once, as the seed
 bounce_data_file = "src/tennis_ball_bounce_data.csv"
-bounce_data_df = pd.read_csv(bounce_data_file)
-full_bounce_data_df = pd.read_csv(bounce_data_file)
+_phase_started = time.perf_counter()
+store = MeasurementStore(os.environ.get("TENNISCALE_DB", "data/measurements.sqlite3"))
+store.seed_from_csv(bounce_data_file)
 
 # Consider only the first four bounces ? or three ?
-bounce_data_df = bounce_data_df[bounce_data_df['Bounce Number'] <= 4]
+MAX_MODEL_BOUNCE = 4
+
+
+def use_for_model(row):
+    """the model only learns from the first bounces. measurements from /api/measure have no bounce number and are always used"""
+    return row['Bounce Number'] is None or row['Bounce Number'] <= MAX_MODEL_BOUNCE
+
+
+# numpy columns for the model and the results page, see src/dataset.py. the bulk comes from a binary snapshot next to
+# the database, which is only rebuilt when the seed csv changes or a lot of new rows piled up
+full_bounce_data, store_offset, startup_report["dataset_source"] = load_dataset(
+    store, bounce_data_file, os.environ.get("TENNISCALE_SNAPSHOT", store.path + ".snapshot.npz"))
+bounce_data = full_bounce_data.select(full_bounce_data.mask(MAX_MODEL_BOUNCE))
+# rows grouped by height and by drop, kept up to date with the lists so nothing has to scan them per request
+full_groups = GroupIndex(full_bounce_data)
+model_groups = GroupIndex(bounce_data)
+# counts, moments and quartiles for /api/v1/stats and the histogram and box plot, also updated row by row
+full_stats = StatsEngine(full_bounce_data)
+model_stats = StatsEngine(bounce_data)
+startup_report["dataset_rows"] = len(full_bounce_data)
+startup_report["dataset_load_s"] = time.perf_counter() - _phase_started
+
+# changes every time bounce_data changes. the rendered result figures are cached per version. its the store offset,
+# so every worker process has the same version for the same data
+data_version = store_offset
+# guards the in memory datasets while rows from the store are added to them
+_data_lock = threading.Lock()
+# from TENNISCALE_DENSITY_THRESHOLD rows on the scatter and line figures show binned summaries instead of every row
+plot_cache = PlotCache(max_workers=int(os.environ.get("TENNISCALE_RENDER_WORKERS", 2)),
+                       density_threshold=int(os.environ.get("TENNISCALE_DENSITY_THRESHOLD", DENSITY_THRESHOLD)))
 
-# Convert CSV data to dictionary list format for model
-bounce_data = bounce_data_df.to_dict(orient='records')
-full_bounce_data = full_bounce_data_df.to_dict(orient='records')
+# the model is consistently off by about this much, so its added to every prediction we hand out
+HEIGHT_OFFSET_CM = 26.00
 
-model = FortunaModel()
-model.calibrate(bounce_data)
+_phase_started = time.perf_counter()
+# TENNISCALE_SOLVER=lstsq switches to the exact least squares solver, TENNISCALE_RIDGE adds ridge regularization to it.
+# params improved by single measurements are written to disk at most every TENNISCALE_PARAMS_FLUSH_INTERVAL seconds.
+# the random search tries TENNISCALE_CALIBRATION_EPOCHS candidates, spread over TENNISCALE_CALIBRATION_WORKERS processes.
+# setting TENNISCALE_CALIBRATION_SEED makes it reproducible. TENNISCALE_SEARCH_STRATEGY (random, coordinate, anneal, cma)
+# switches to an adaptive search that stops early, with TENNISCALE_CALIBRATION_EPOCHS as its evaluation budget and
+# TENNISCALE_CALIBRATION_TIME_BUDGET seconds as an optional wall clock budget. the last TENNISCALE_MODEL_HISTORY
+# published snapshots are kept for /api/v1/model/rollback
+_seed = os.environ.get("TENNISCALE_CALIBRATION_SEED")
+_time_budget = os.environ.get("TENNISCALE_CALIBRATION_TIME_BUDGET")
+model_options = dict(solver=os.environ.get("TENNISCALE_SOLVER", "random"),
+                     ridge=float(os.environ.get("TENNISCALE_RIDGE", 0.0)),
+                     epochs=int(os.environ.get("TENNISCALE_CALIBRATION_EPOCHS", 1000)),
+                     workers=int(os.environ.get("TENNISCALE_CALIBRATION_WORKERS", 1)),
+                     seed=int(_seed) if _seed else None,
+                     strategy=os.environ.get("TENNISCALE_SEARCH_STRATEGY") or None,
+                     time_budget=float(_time_budget) if _time_budget else None,
+                     history_size=int(os.environ.get("TENNISCALE_MODEL_HISTORY", 10)))
+model = FortunaModel(params_file=os.environ.get("TENNISCALE_PARAMS_FILE", "assets/best_params.json"),
+                     flush_interval=float(os.environ.get("TENNISCALE_PARAMS_FLUSH_INTERVAL", 5.0)), **model_options)
+startup_report["model_load_s"] = time.perf_counter() - _phase_started
+
+# all the calibration happens on this worker, the handlers only ask for a run.
+# requests that come in within TENNISCALE_CALIBRATION_DEBOUNCE seconds of each other get merged into one run, which
+# starts at the latest TENNISCALE_CALIBRATION_MAX_DELAY seconds (default 10x the debounce) after the first of them
+_max_delay = os.environ.get("TENNISCALE_CALIBRATION_MAX_DELAY")
+calibration = CalibrationService(model, lambda: bounce_data.snapshot(),
+                                 debounce=float(os.environ.get("TENNISCALE_CALIBRATION_DEBOUNCE", 0.5)),
+                                 max_delay=float(_max_delay) if _max_delay else None,
+                                 on_publish=lambda: publish_params(),
+                                 version_provider=lambda: data_version)
+
+# the models of the other profiles (ball types, surfaces, devices), see src/registry.py. every profile has a directory
+# in TENNISCALE_PROFILES_DIR (next to the database by default) and at most TENNISCALE_PROFILE_CACHE of them are
+# kept in memory. their params are written as soon as they change, without the flush timer of the default model
+profiles = ModelRegistry(os.environ.get("TENNISCALE_PROFILES_DIR", os.path.join(os.path.dirname(store.path), "profiles")),
+                         capacity=int(os.environ.get("TENNISCALE_PROFILE_CACHE", 64)),
+                         model_options=model_options, row_filter=use_for_model,
+                         debounce=float(os.environ.get("TENNISCALE_CALIBRATION_DEBOUNCE", 0.5)),
+                         sync_interval=float(os.environ.get("TENNISCALE_SYNC_INTERVAL", 0.5)))
+
+# state shared by the worker processes (uvicorn --workers N): the published params live in a memory mapped file
+# next to the database and only the worker holding the leader lock calibrates. every TENNISCALE_SYNC_INTERVAL
+# seconds each worker reads the rows the others appended, the new params and pending calibration requests
+shared_params = SharedParams(store.path + ".params")
+leader = LeaderLock(store.path + ".leader")
+_params_generation = 0
+_calibration_requests_seen = shared_params.calibration_requests()
+# /ws/bounces takes at most TENNISCALE_LIVE_MAX_SESSIONS sessions per worker. a session holds at most
+# TENNISCALE_LIVE_QUEUE messages it didnt get to yet, after that it stops reading from the socket until it caught up
+LIVE_MAX_SESSIONS = int(os.environ.get("TENNISCALE_LIVE_MAX_SESSIONS", 100))
+LIVE_QUEUE = int(os.environ.get("TENNISCALE_LIVE_QUEUE", 64))
+_live_sessions = 0
+# cross-validation of the model config, see /api/v1/evaluate. folds run on TENNISCALE_EVALUATION_WORKERS processes
+evaluator = Evaluator(workers=int(os.environ.get("TENNISCALE_EVALUATION_WORKERS", 1)))
+startup_report["module_s"] = time.perf_counter() - _import_started
+
+
+def become_leader():
+    """tries to take the leader lock. the new leader starts the calibration worker and publishes its params
+
+    Returns:
+        bool: whether this worker is the leader
+    """
+    if leader.is_leader:
+        return True
+    if not leader.try_acquire():
+        return False
+    calibration.start()
+    if not FAST_START or model.best_params is None or model.solver == "lstsq":
+        calibration.request("startup")
+    # whatever is in the shared file is from the previous leader, maybe from a run before the restart. the
+    # followers should serve what this leader serves
+    publish_params()
+    logger.info("this worker calibrates now", extra={"pid": os.getpid()})
+    return True
+
+
+def publish_params():
+    """hands the current snapshot of the leader's model to the other workers"""
+    snapshot = model.snapshot
+    if snapshot.params is not None:
+        offset = store_offset if snapshot.dataset_version is None else snapshot.dataset_version
+        shared_params.write(snapshot.params, snapshot.mse, offset, snapshot.version)
+
+
+def sync_params():
+    """takes over the params the leader published, if there are newer ones. without a new generation this is a
+    single read of the shared counter, so its cheap enough to do on every prediction
+    """
+    global _params_generation
+    if leader.is_leader or shared_params.generation() == _params_generation:
+        return
+    shared = shared_params.read()
+    if shared is not None:
+        model.install(ModelSnapshot(shared.version, tuple(shared.params), shared.mse, shared.offset, shared.published_at))
+        _params_generation = shared.generation
+
+
+def request_calibration(reason):
+    """schedules a calibration on the leader, wherever the request came in"""
+    if leader.is_leader:
+        calibration.request(reason)
+    else:
+        shared_params.request_calibration()
+
+
+def catch_up(reason=None):
+    """adds the rows that were appended to the store since we last looked, by this or any other worker
+
+    Args:
+        reason (str, optional): if given the leader folds the new rows into the model right away, as an
+            incremental update with the least squares solver or by scheduling a calibration. Defaults to None.
+
+    Returns:
+        int: how many new rows there were
+    """
+    global store_offset, data_version
+    with _data_lock:
+        rows, offset = store.read_since(store_offset)
+        if not rows:
+            return 0
+        model_rows = [row for row in rows if use_for_model(row)]
+        full_bounce_data.extend(rows)
+        bounce_data.extend(model_rows)
+        full_groups.extend(rows)
+        model_groups.extend(model_rows)
+        full_stats.extend(rows)
+        model_stats.extend(model_rows)
+        store_offset = data_version = offset
+    if reason is not None and model_rows and leader.is_leader:
+        if model.solver == "lstsq" and model.qr is not None:
+            # the least squares solver can fold in the new measurements without looking at the rest of the data.
+            # through the calibration service, which publishes them to the other workers
+            calibration.update(model_rows, offset)
+        else:
+            calibration.request(reason)
+    return len(rows)
+
+
+def sync():
+    """the periodic catch up of every worker, runs on the sync ticker"""
+    global _calibration_requests_seen
+    become_leader()
+    catch_up("sync")
+    if leader.is_leader:
+        requests = shared_params.calibration_requests()
+        if requests != _calibration_requests_seen:
+            _calibration_requests_seen = requests
+            calibration.request("peer")
+    else:
+        sync_params()
+
+
+sync_ticker = Ticker(float(os.environ.get("TENNISCALE_SYNC_INTERVAL", 0.5)), sync, name="worker-sync")
+
+# gauges are read when /metrics is scraped, nothing to keep up to date in the handlers
+BEST_MSE.set_function(lambda: model.best_mse)
+DATASET_ROWS.labels(dataset="full").set_function(lambda: len(full_bounce_data))
+DATASET_ROWS.labels(dataset="model").set_function(lambda: len(bounce_data))
+LIVE_SESSIONS.set_function(lambda: _live_sessions)
+PROFILES_LOADED.set_function(lambda: len(profiles.loaded()))
+
+
+def asset_links():
+    """the content hashed urls of the assets every page links to, see AssetCache.url()"""
+    return {name: assets.url(name) for name in ("styles.css", "timer.js", "logo.jpg")}
 
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
+async def read_root(request: Request):
     """Serves back html to the client side. the html is connected with a styles.css and a timer.js.
     styles.css is for extra styling on top of the tailwind classes
     timer.js is for the timer functionality in the client side.
+    the page only changes when one of the assets does, so its built once and served from the page cache
 
     Returns:
-        str: HTML to be rendred by the browser
+        Response: HTML to be rendred by the browser
+    """
+    links = asset_links()
+    return pages.get(("root",) + tuple(links.values()), lambda: render_root(links)).response(request)
+
+
+def render_root(links):
+    """the html of the landing page
+
+    Args:
+        links (dict): asset name -> url, see asset_links()
     """
-    await calibrate_model()  # might be a better way that doing it on start up. The best params are saved so no worries anyway
-    return """
+    return f"""
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -48,9 +317,9 @@ async def read_root():
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>TenniScale</title>
             <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-            <link rel="stylesheet" href="/assets/styles.css">
-            <script src="/assets/timer.js" defer></script>
-            <link rel="icon" type="image/x-icon" href="/assets/logo.jpg">
+            <link rel="stylesheet" href="{links['styles.css']}">
+            <script src="{links['timer.js']}" defer></script>
+            <link rel="icon" type="image/x-icon" href="{links['logo.jpg']}">
         </head>
         <body class="bg-custom-olive font-sans leading-normal tracking-normal">
             <div class="container mx-auto p-4">
@@ -63,6 +332,7 @@ async def read_root():
                     </div>
                     <div class="text-center mb-6">
                         <p class="text-custom-black">Elapsed Time: <span id="elapsedTime">0.00</span> seconds</p>
+                        <p class="text-custom-black">Live Prediction: <span id="livePrediction">-</span> cm</p>
                     </div>
                     <!-- Form to submit data for calibration -->
                     <form action="/api/measure" method="post" class="text-center mb-6">
@@ -92,45 +362,135 @@ async def read_root():
 
 
 @app.post("/api/measure")
-async def submit_data(height: float = Form(...), total_time_ms: float = Form(...), interval_time_ms: float = Form(...)):
+async def submit_data(height: float = Form(...), total_time_ms: float = Form(...), interval_time_ms: float = Form(...),
+                      profile: str = Form(DEFAULT_PROFILE)):
     """handles the data that is submited from the clientside incase the user clicks submit data for calibration.
 
     Args:
         height (float, optional): The height of the user in centimeters. Defaults to Form(...).
         total_time_ms (float, optional): The total time recorded. it not important from the fourth bouce and on. Defaults to Form(...).
         interval_time_ms (float, optional): the time between the bounces. Defaults to Form(...).
+        profile (str, optional): the profile the measurement belongs to, a new one is created on its first
+            measurement. Defaults to the default profile.
 
     Returns:
         RedirectResponse: redirects you back to the root of the site
     """
-    bounce_data.append({
+    row = {
         'Height': height,
+        'Bounce Number': None,
+        'Total Time': None,
+        'Interval Time': None,
         'Total Time (ms)': total_time_ms,
         'Interval Time (ms)': interval_time_ms
-    })
-    model.calibrate(bounce_data)
+    }
+    if profile != DEFAULT_PROFILE:
+        await run_in_threadpool(measure_profile, profile, row)
+    else:
+        # the commit can wait on another worker's write lock, that happens on a worker thread
+        await run_in_threadpool(store_measurement, row)
     return RedirectResponse(url="/", status_code=303)
 
 
+def store_measurement(row):
+    """stores a measurement of the default profile and folds it into the in memory datasets"""
+    store.append(row)
+    # picks up our row (and whatever the other workers appended) from the store. on the other workers the
+    # leader sees it on its next sync
+    catch_up("measure")
+
+
+def open_profile(profile_id, create=False):
+    """the registry entry of a profile for the duration of a request, see ModelRegistry.use()
+
+    Raises:
+        HTTPException: 422 for an invalid profile id, 404 if there is no such profile and create is False
+    """
+    try:
+        check_profile_id(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not create and not profiles.exists(profile_id):
+        raise HTTPException(status_code=404, detail=f"unknown profile {profile_id!r}")
+    return profiles.use(profile_id, create)
+
+
+def measure_profile(profile_id, row):
+    """stores a measurement of a profile other than the default one and updates its model"""
+    with open_profile(profile_id, create=True) as profile:
+        profile.measure([row])
+
+
+def ingest_lap_file(binary_file):
+    """streams an uploaded lap log into the store. rows are committed in batches and added to the in memory
+    datasets as they go, the model gets recalibrated once at the end
+
+    Args:
+        binary_file (BinaryIO): the uploaded file
+
+    Returns:
+        dict: the ingest report, see ingest_lap_log()
+    """
+    def append_batch(rows):
+        store.append_many(rows, source="ingest")
+        catch_up()
+
+    lines = io.TextIOWrapper(binary_file, encoding="utf-8", errors="replace", newline="")
+    try:
+        report = ingest_lap_log(lines, append_batch)
+    finally:
+        lines.detach()  # the upload closes its own file
+    if report["rows"]:
+        request_calibration("ingest")
+    return report
+
+
+@app.post("/api/v1/ingest")
+async def ingest_laps(file: UploadFile = File(...)):
+    """bulk upload of a raw stopwatch lap log (the format src/clean.py parses). the file is parsed incrementally
+    on a worker thread, so it can be as big as it wants without blocking the other requests
+
+    Args:
+        file (UploadFile): the lap log
+
+    Returns:
+        dict: how many rows were accepted and rejected, plus the first few error messages
+    """
+    return await run_in_threadpool(ingest_lap_file, file.file)
+
+
 @app.get("/api/calibrate")
 async def calibrate_model():
-    """calls the calibrate model function with the our dataset. maybe ill call it on startup or something
+    """asks the calibration worker for a run with our dataset. it returns right away, the new parameters
+    are published when the run is done. see /api/calibrate/status
+
+    Returns:
+        dict: message that the calibration is scheduled
+    """
+    request_calibration("calibrate")
+    return {"message": "Model calibration scheduled!", "queue_depth": calibration.queue_depth()}
+
+
+@app.get("/api/calibrate/status")
+async def calibration_status():
+    """reports what the calibration worker is up to
 
     Returns:
-        dict: message of success
+        dict: queue depth, if a run is going on and how long the last run took
     """
-    model.calibrate(bounce_data)
-    return {"message": "Model calibrated successfully!"}
+    return dict(calibration.status(), leader=leader.is_leader, params_generation=shared_params.generation(),
+                model_version=model.snapshot.version)
 
 
 @app.get("/api/results", response_class=HTMLResponse)
-async def get_results():
+async def get_results(request: Request):
     """Generates and returns an HTML page displaying various visualizations and model metrics 
     based on bounce data.
 
     The function performs the following steps:
-    1. Loads bounce data into pandas DataFrames for analysis.
-    2. Creates several plots:
+    1. Makes sure the plots for the current dataset version are rendered (or being rendered) by the plot cache.
+       The page only links to them, they are served by /api/results/plots/{name}.png
+    2. The plots are:
         - Scatter Plot: Shows the relationship between "Interval Time" and "Total Time" 
           across different bounce heights.
         - Line Plots: Illustrates "Total Time" and "Interval Time" over the bounce number 
@@ -139,88 +499,34 @@ async def get_results():
         - Box Plot: Summarizes the distribution of "Total Time" and "Interval Time". i dont know
     3. Retrieves and displays the best parameters and Mean Squared Error (MSE) 
        from a machine learning model.
-    4. Embeds the plots and metrics into an HTML page using Tailwind CSS and some custom css for styling.
+    4. Puts the plot urls and metrics into an HTML page using Tailwind CSS and some custom css for styling.
+       The page is cached per dataset and model version, see render_results().
 
     Returns:
         HTMLResponse: An HTML page containing the visualizations and model metrics.
     """
-    df = pd.DataFrame(bounce_data)
-    full_df = pd.DataFrame(full_bounce_data)
-
-    # Scatter Plot: Interval Time vs Total Time for Different Heights
-    fig1, ax1 = plt.subplots(figsize=(12, 6))
-    for height in df['Height'].unique():
-        subset = df[df['Height'] == height]
-        ax1.scatter(subset['Total Time (ms)'], subset['Interval Time (ms)'],
-                    label=f'Height {height} cm', alpha=0.7)
-    ax1.set_xlabel('Total Time (ms)')
-    ax1.set_ylabel('Interval Time (ms)')
-    ax1.set_title(
-        'Interval Time (ms) vs Total Time (ms) for Different Heights')
-    ax1.legend()
-    ax1.grid(True)
-    buf1 = io.BytesIO()
-    plt.savefig(buf1, format='png')
-    buf1.seek(0)
-    img_str1 = base64.b64encode(buf1.read()).decode('utf-8')
-    plt.close(fig1)
-
-    # Line Plots: Total Time and Interval Time Over Bounce Number for All Bounces
-    fig2, (ax2, ax3) = plt.subplots(1, 2, figsize=(12, 6))
-    for height in df['Height'].unique():
-        height_data = df[df['Height'] == height]
-        ax2.plot(height_data['Bounce Number'], height_data['Total Time (ms)'],
-                 marker='o', label=f'Height {height} cm')
-        ax3.plot(height_data['Bounce Number'], height_data['Interval Time (ms)'],
-                 marker='o', label=f'Height {height} cm')
-
-    ax2.set_xlabel('Bounce Number')
-    ax2.set_ylabel('Total Time (ms)')
-    ax2.set_title('Total Time vs Bounce Number')
-    ax2.legend()
-    ax2.grid(True)
-
-    ax3.set_xlabel('Bounce Number')
-    ax3.set_ylabel('Interval Time (ms)')
-    ax3.set_title('Interval Time vs Bounce Number')
-    ax3.legend()
-    ax3.grid(True)
-    plt.tight_layout()
-    buf2 = io.BytesIO()
-    plt.savefig(buf2, format='png')
-    buf2.seek(0)
-    img_str2 = base64.b64encode(buf2.read()).decode('utf-8')
-    plt.close(fig2)
-
-    # Histogram of Bounce Numbers
-    fig3, ax4 = plt.subplots(figsize=(12, 6))
-    max_bounce = int(full_df['Bounce Number'].max())
-    ax4.hist(full_df['Bounce Number'], bins=range(
-        1, max_bounce + 2), edgecolor='black')
-    ax4.set_xlabel('Bounce Number')
-    ax4.set_ylabel('Frequency')
-    ax4.set_title('Histogram of Bounce Numbers')
-    ax4.grid(True)
-    buf3 = io.BytesIO()
-    plt.savefig(buf3, format='png')
-    buf3.seek(0)
-    img_str3 = base64.b64encode(buf3.read()).decode('utf-8')
-    plt.close(fig3)
-
-    # Box Plot of Total Time and Interval Time
-    fig4, ax5 = plt.subplots(figsize=(12, 6))
-    df[['Total Time (ms)', 'Interval Time (ms)']].plot.box(ax=ax5)
-    ax5.set_title('Box Plot of Total Time and Interval Time')
-    ax5.grid(True)
-    buf4 = io.BytesIO()
-    plt.savefig(buf4, format='png')
-    buf4.seek(0)
-    img_str4 = base64.b64encode(buf4.read()).decode('utf-8')
-    plt.close(fig4)
+    # start rendering the figures right away, the browser asks for them as soon as it sees the <img> tags
+    version = data_version
+    plot_cache.prefetch(version, results_snapshot)
 
     # Retrieve best params and MSE from the model
-    best_params = model.best_params
-    best_mse = model.best_mse
+    sync_params()
+    snapshot = model.snapshot
+    links = asset_links()
+    page = pages.get(("results", version, snapshot, *links.values()), lambda: render_results(version, snapshot, links))
+    return page.response(request)
+
+
+def render_results(version, snapshot, links):
+    """the html of the results page
+
+    Args:
+        version (int): the dataset version the plot urls are for
+        snapshot (ModelSnapshot): the model to show
+        links (dict): asset name -> url, see asset_links()
+    """
+    best_params = None if snapshot.params is None else list(snapshot.params)
+    best_mse = snapshot.mse
 
     # Display the results including the best parameters and MSE
     return f"""
@@ -231,8 +537,8 @@ async def get_results():
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>Measurement Results</title>
             <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-            <link rel="stylesheet" href="/assets/styles.css">
-            <link rel="icon" type="image/x-icon" href="/assets/logo.jpg">
+            <link rel="stylesheet" href="{links['styles.css']}">
+            <link rel="icon" type="image/x-icon" href="{links['logo.jpg']}">
         </head>
         <body class="bg-custom-olive font-sans leading-normal tracking-normal">
             <div class="container mx-auto p-4">
@@ -242,26 +548,27 @@ async def get_results():
                         <h2 class="text-xl font-semibold text-center text-custom-black">Best Parameters and MSE</h2>
                         <p class="text-center text-lg text-custom-black">Best Parameters: {best_params}</p>
                         <p class="text-center text-lg text-custom-black">Best MSE: {best_mse:.4f}</p>
+                        <p class="text-center text-lg text-custom-black">Model Version: {snapshot.version}</p>
                     </div>
 
                     <div class="mb-4">
                         <h2 class="text-xl font-semibold text-center text-custom-black">Interval Time vs Total Time for Different Heights</h2>
-                        <img src="data:image/png;base64,{img_str1}" class="mx-auto">
+                        <img src="/api/results/plots/scatter.png?v={version}" class="mx-auto">
                     </div>
 
                     <div class="mb-4">
                         <h2 class="text-xl font-semibold text-center text-custom-black">Total Time and Interval Time Over Bounce Number</h2>
-                        <img src="data:image/png;base64,{img_str2}" class="mx-auto">
+                        <img src="/api/results/plots/lines.png?v={version}" class="mx-auto">
                     </div>
 
                     <div class="mb-4">
                         <h2 class="text-xl font-semibold text-center text-custom-black">Histogram of Bounce Numbers</h2>
-                        <img src="data:image/png;base64,{img_str3}" class="mx-auto">
+                        <img src="/api/results/plots/histogram.png?v={version}" class="mx-auto">
                     </div>
 
                     <div class="mb-4">
                         <h2 class="text-xl font-semibold text-center text-custom-black">Box Plot of Total Time and Interval Time</h2>
-                        <img src="data:image/png;base64,{img_str4}" class="mx-auto">
+                        <img src="/api/results/plots/box.png?v={version}" class="mx-auto">
                     </div>
 
                     <div class="text-center">
@@ -275,23 +582,196 @@ async def get_results():
     """
 
 
+@app.get("/api/v1/evaluate")
+async def evaluate_model(scheme: str = "kfold", folds: int = 5, seed: int = 0):
+    """cross-validates the model on the current dataset, split by drop. fold results are cached until the data changes
+
+    Args:
+        scheme (str, optional): "kfold" or "height" (leave one height out). Defaults to "kfold".
+        folds (int, optional): number of folds for "kfold". Defaults to 5.
+        seed (int, optional): seed of the split and of the calibration inside the folds. Defaults to 0.
+
+    Returns:
+        dict: the error distribution overall, per height and per fold
+    """
+    version = data_version
+    rows = bounce_data.snapshot()
+    drop_ids = model_groups.drop_ids()
+    # an ingest on another thread may have added rows in between, only look at what both have
+    size = min(len(rows), len(drop_ids))
+    try:
+        return await run_in_threadpool(evaluator.evaluate, model_config(model), rows[:size], drop_ids[:size], version,
+                                       scheme, folds, seed)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.get("/api/v1/startup")
+async def startup_status():
+    """how long the last startup took and where the dataset came from
+
+    Returns:
+        dict: timings in seconds per startup phase
+    """
+    return startup_report
+
+
+@app.get("/metrics")
+async def metrics():
+    """prometheus metrics: request latency per route, calibration runs and duration, the best mse, dataset size
+    and how long the results figures take to render
+
+    Returns:
+        Response: the prometheus text format
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def results_snapshot():
+    """the per height arrays and the stats for the plot cache, taken when a new version gets rendered"""
+    return model_groups.height_arrays(), plot_stats(full_stats, model_stats)
+
+
+@app.get("/api/v1/stats")
+async def dataset_stats(dataset: str = "full"):
+    """rows per bounce number, per height mean and variance and the quartiles of the times. the stats are kept up
+    to date as rows come in, so this doesnt look at the rows at all
+
+    Args:
+        dataset (str, optional): "full" for all measurements, "model" for the ones the model learns from. Defaults to "full".
+
+    Returns:
+        dict: see StatsEngine.summary(), the "heights" are the ones of /api/v1/groups
+    """
+    if dataset not in ("full", "model"):
+        raise HTTPException(status_code=422, detail="dataset must be 'full' or 'model'")
+    stats, groups = (full_stats, full_groups) if dataset == "full" else (model_stats, model_groups)
+    return dict(stats.summary(), heights=groups.summary()["heights"], dataset=dataset, version=data_version)
+
+
+@app.get("/api/v1/export")
+async def export_dataset(format: str = "csv", offset: int = 0, min_height: Optional[float] = None,
+                         max_height: Optional[float] = None, min_bounce: Optional[int] = None,
+                         max_bounce: Optional[int] = None, chunk_rows: int = CHUNK_ROWS,
+                         profile: str = DEFAULT_PROFILE):
+    """streams the measurements straight from the store, chunk_rows at a time, so even a huge export runs in
+    constant memory. see src/export.py
+
+    Args:
+        format (str, optional): "csv", "parquet" or "arrow" (ipc stream), the last two need pyarrow. Defaults to "csv".
+        offset (int, optional): only rows with a bigger id, pass the biggest id of the last export to get what
+            came in since. Defaults to 0.
+        min_height, max_height (float, optional): only these heights in cm (inclusive). Defaults to None.
+        min_bounce, max_bounce (int, optional): only these bounce numbers (inclusive), leaves out the rows without
+            one. Defaults to None.
+        chunk_rows (int, optional): rows per chunk, 1 to 100000. Defaults to CHUNK_ROWS.
+        profile (str, optional): whose measurements. Defaults to the default profile.
+
+    Returns:
+        StreamingResponse: the export as an attachment
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {tuple(FORMATS)}")
+    if format not in available_formats():
+        raise HTTPException(status_code=501, detail=f"the {format} export needs the pyarrow package")
+    if not 1 <= chunk_rows <= 100_000:
+        raise HTTPException(status_code=422, detail="chunk_rows must be between 1 and 100000")
+    # checked here, once the response started there is no way to send an error status anymore
+    entry = open_profile(profile) if profile != DEFAULT_PROFILE else contextlib.nullcontext(None)
+    filters = dict(min_height=min_height, max_height=max_height, min_bounce=min_bounce, max_bounce=max_bounce)
+
+    def chunks():
+        # runs on the thread pool like every sync iterator of a StreamingResponse, and keeps the profile in use
+        # until the export is done
+        with entry as loaded:
+            source = store if loaded is None else loaded.store
+            yield from source.read_chunks(offset, chunk_rows, **filters)
+
+    media_type, extension = FORMATS[format]
+    return StreamingResponse(export_chunks(chunks(), format), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="tenniscale-{profile}.{extension}"',
+        "Cache-Control": "no-store",
+    })
+
+
+@app.get("/api/v1/groups")
+async def dataset_groups(dataset: str = "full"):
+    """per height aggregates of the dataset, straight from the group index
+
+    Args:
+        dataset (str, optional): "full" for all measurements, "model" for the ones the model learns from. Defaults to "full".
+
+    Returns:
+        dict: rows, number of drops and per height the row count, drop count and time aggregates
+    """
+    if dataset not in ("full", "model"):
+        raise HTTPException(status_code=422, detail="dataset must be 'full' or 'model'")
+    return (full_groups if dataset == "full" else model_groups).summary()
+
+
+@app.api_route("/assets/{name:path}", methods=["GET", "HEAD"])
+async def get_asset(name: str, request: Request, v: Union[str, None] = None):
+    """serves the files in assets/ from memory, with etags and compression. see src/http_cache.py
+
+    Args:
+        name (str): the file
+        v (str, optional): the content hash from the page's links, makes the response immutable. Defaults to None.
+
+    Returns:
+        Response: the file, or an empty 304
+    """
+    response = assets.response(name, request, v)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
+
+
+@app.get("/api/results/plots/{name}.png")
+async def get_results_plot(name: str, request: Request, v: Union[int, None] = None):
+    """serves one of the results figures as a png. rendering happens on the plot cache's thread pool and is
+    only done once per dataset version. it supports If-None-Match so a browser that already has it gets a 304.
+
+    Args:
+        name (str): which figure, one of PLOT_NAMES
+        v (int, optional): the dataset version the page was built for. when it matches the current version the
+            url can never change content, so the browser may keep it forever. Defaults to None.
+
+    Returns:
+        Response: the png, or an empty 304
+    """
+    if name not in PLOT_NAMES:
+        raise HTTPException(status_code=404, detail=f"unknown plot {name!r}")
+    version = data_version
+    plot = await asyncio.wrap_future(plot_cache.get(name, version, results_snapshot))
+    if v == version:
+        cache_control = IMMUTABLE
+    else:
+        cache_control = "no-cache"
+    headers = {"ETag": plot.etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), plot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=plot.png, media_type="image/png", headers=headers)
+
+
 @app.post("/api/predict")
-async def predict_height(total_time_ms: float = Form(...), interval_time_ms: float = Form(...)):
+async def predict_height(total_time_ms: float = Form(...), interval_time_ms: float = Form(...),
+                         profile: str = Form(DEFAULT_PROFILE)):
     """use the model to predict the height
 
 
     Args:
         total_time_ms (float, optional): The total time recorded. it not important from the fourth bouce and on. Defaults to Form(...).
         interval_time_ms (float, optional): the time between the bounces. Defaults to Form(...).
+        profile (str, optional): whose model to use. Defaults to the default profile.
 
     Returns:
         HTMLResponse: the html including the prediction
     """
-    features = [total_time_ms, interval_time_ms]
-    # the predict function can handle multiple predicts at the same time. and i gave it only a list of 1 tuple the prediction on index 1 is the correct prediction
-    predicted_height = model.predict([(features)])[0]
+    heights, snapshot = await predict_profile([(total_time_ms, interval_time_ms)], profile)
+    predicted_height = heights[0]
+    links = asset_links()
 
-    return HTMLResponse(content=f"""
+    return HTMLResponse(headers={"X-Model-Version": str(snapshot.version)}, content=f"""
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -299,15 +779,15 @@ async def predict_height(total_time_ms: float = Form(...), interval_time_ms: flo
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>Prediction Result</title>
             <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-            <link rel="stylesheet" href="/assets/styles.css">
-            <link rel="icon" type="image/x-icon" href="/assets/logo.jpg">
+            <link rel="stylesheet" href="{links['styles.css']}">
+            <link rel="icon" type="image/x-icon" href="{links['logo.jpg']}">
         </head>
         <body class="bg-custom-olive font-sans leading-normal tracking-normal">
             <div class="container mx-auto p-4">
                 <div class="bg-custom-dark shadow-md rounded px-8 pt-6 pb-8 mb-4">
                     <h1 class="text-2xl font-bold mb-4 text-center text-custom-black">Prediction Result</h1>
                     <div class="text-center">
-                        <p class="text-lg font-semibold text-custom-black">Predicted Height: {26.00 + predicted_height:.2f} cm</p>
+                        <p class="text-lg font-semibold text-custom-black">Predicted Height: {predicted_height:.2f} cm</p>
                     </div>
                     <div class="text-center mt-6">
                         <a href="/" class="text-custom-black hover-text-custom-dark">Back</a>
@@ -319,6 +799,274 @@ async def predict_height(total_time_ms: float = Form(...), interval_time_ms: flo
 
     """)
 
+def predict_heights(X, profile=DEFAULT_PROFILE):
+    """the one place predictions for the api are made. evaluates the model on all rows at once and adds HEIGHT_OFFSET_CM.
+    all rows are predicted with the same snapshot, even if a calibration publishes a new one meanwhile
+
+    Args:
+        X (np.ndarray): (N, 2) array of (total time, interval time) in ms
+        profile (str, optional): whose model to use. Defaults to the default profile.
+
+    Returns:
+        tuple: (N,) predicted heights in cm and the ModelSnapshot they came from
+    """
+    if profile != DEFAULT_PROFILE:
+        with open_profile(profile) as entry:
+            return _predict_with(entry.model, X)
+    sync_params()
+    return _predict_with(model, X)
+
+
+def _predict_with(fortuna, X):
+    snapshot = fortuna.snapshot
+    try:
+        return fortuna.predict_array(X, snapshot) + HEIGHT_OFFSET_CM, snapshot
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def predict_profile(X, profile=DEFAULT_PROFILE):
+    """predict_heights() for the handlers. the default model is in memory anyway, another profile may have to be
+    loaded from disk first, so that happens on the thread pool
+    """
+    if profile == DEFAULT_PROFILE:
+        return predict_heights(X)
+    return await run_in_threadpool(predict_heights, X, profile)
+
+
+class BatchPredictRequest(BaseModel):
+    """json body of /api/v1/predict/batch, two equally long arrays of timings"""
+    total_time_ms: List[float]
+    interval_time_ms: List[float]
+
+    @model_validator(mode="after")
+    def same_length(self):
+        if len(self.total_time_ms) != len(self.interval_time_ms):
+            raise ValueError("total_time_ms and interval_time_ms must have the same length")
+        return self
+
+
+def parse_batch_body(body, content_type):
+    """turns the body of a batch request into an (N, 2) array of timings
+
+    Supported content types:
+        application/json: {"total_time_ms": [...], "interval_time_ms": [...]}
+        application/x-ndjson: one {"total_time_ms": x, "interval_time_ms": y} object (or [x, y] pair) per line
+        application/octet-stream: little endian float64 pairs, total time then interval time
+
+    Raises:
+        HTTPException: 415 for other content types, 422 if the body doesnt parse or has values that arent finite
+
+    Returns:
+        np.ndarray: (N, 2) float64 array
+    """
+    try:
+        if content_type == "application/octet-stream":
+            if len(body) % 16:
+                raise ValueError("binary body must be a whole number of float64 pairs")
+            X = np.frombuffer(body, dtype="<f8").reshape(-1, 2)
+        elif content_type in ("application/x-ndjson", "application/ndjson"):
+            rows = []
+            for number, line in enumerate(body.splitlines(), start=1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                row = (item["total_time_ms"], item["interval_time_ms"]) if isinstance(item, dict) else item
+                if not isinstance(row, (list, tuple)) or len(row) != 2:
+                    raise ValueError(f"line {number}: expected an object or a [total, interval] pair")
+                rows.append(row)
+            X = np.asarray(rows, dtype=np.float64).reshape(-1, 2)
+        elif content_type == "application/json":
+            batch = BatchPredictRequest.model_validate_json(body)
+            X = np.column_stack([np.asarray(batch.total_time_ms, dtype=np.float64),
+                                 np.asarray(batch.interval_time_ms, dtype=np.float64)])
+        else:
+            raise HTTPException(status_code=415, detail=f"unsupported content type {content_type!r}")
+        if not np.isfinite(X).all():
+            # nan and inf would come back as heights json cant encode
+            raise ValueError("timings must be finite numbers")
+        return X
+    except (ValueError, KeyError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/api/v1/predict/batch")
+async def predict_batch(request: Request):
+    """predicts the heights for a whole batch of drops in one go. see parse_batch_body() for the accepted bodies.
+    binary requests get a binary answer (little endian float64 heights in cm), everything else gets json.
+    ?profile= picks the model like the profile field of /api/predict
+
+    Returns:
+        dict|Response: {"count": N, "model_version": v, "predicted_height_cm": [...]} or the raw float64 heights with
+            the model version in the X-Model-Version header
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    X = parse_batch_body(await request.body(), content_type)
+    heights, snapshot = await predict_profile(X, request.query_params.get("profile", DEFAULT_PROFILE))
+    headers = {"X-Model-Version": str(snapshot.version)}
+    if content_type == "application/octet-stream":
+        return Response(content=heights.astype("<f8").tobytes(), media_type="application/octet-stream", headers=headers)
+    return JSONResponse({"count": len(heights), "model_version": snapshot.version,
+                         "predicted_height_cm": heights.tolist()}, headers=headers)
+
+
+def store_live_drop(rows):
+    """stores the bounces of a live session like /api/measure stores a single measurement"""
+    store.append_many(rows, source="live")
+    catch_up("measure")
+
+
+def predict_live(session):
+    """the prediction message for the drop of a live session, with the version of the model snapshot it used"""
+    sync_params()
+    snapshot = model.snapshot
+    if snapshot.params is None:
+        return {"type": "error", "detail": "Model is not calibrated yet."}
+    heights = model.predict_array(session.model_features(), snapshot) + HEIGHT_OFFSET_CM
+    return dict(session.summary(heights), model_version=snapshot.version)
+
+
+async def handle_live_messages(websocket, session, messages):
+    """handles the messages that queued up on a live session. a run of bounces gets one prediction for the
+    newest state, a client that sends faster than we answer doesnt get answers for bounces that are already old
+    """
+    pending = False
+    for text in messages:
+        try:
+            message = json.loads(text)
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "bounce":
+                session.bounce(message.get("t_ms"))
+                LIVE_BOUNCES.inc()
+                pending = True
+                continue
+            if pending:
+                await websocket.send_json(predict_live(session))
+                pending = False
+            if kind == "start":
+                session.start()
+            elif kind == "reset":
+                session.reset()
+            elif kind == "submit":
+                rows = session.rows(message["height"])
+                await run_in_threadpool(store_live_drop, rows)
+                # the drop is stored, submitting it again would store it twice
+                session.reset()
+                await websocket.send_json({"type": "stored", "drop": session.drops, "rows": len(rows)})
+            else:
+                raise SessionError(f"unknown message type {kind!r}")
+        except (SessionError, ValueError, KeyError, TypeError) as e:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+    if pending:
+        await websocket.send_json(predict_live(session))
+
+
+async def read_live_messages(websocket, inbox):
+    """moves the messages of a live session onto its bounded inbox. while the inbox is full this waits and the
+    socket isnt read, so a flood of messages is held up by the client's tcp window instead of our memory
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            break
+        await inbox.put(message.get("text") or (message.get("bytes") or b"").decode("utf-8", "replace"))
+    await inbox.put(None)
+
+
+@app.websocket("/ws/bounces")
+async def live_bounces(websocket: WebSocket):
+    """streams the bounces of a drop as they happen and answers every bounce with an updated height prediction,
+    see src/live.py for the messages
+    """
+    global _live_sessions
+    await websocket.accept()
+    if _live_sessions >= LIVE_MAX_SESSIONS:
+        await websocket.close(code=1013, reason="too many live sessions, try again later")
+        return
+    _live_sessions += 1
+    session = BounceSession(MAX_MODEL_BOUNCE)
+    inbox = asyncio.Queue(maxsize=LIVE_QUEUE)
+    reader = asyncio.create_task(read_live_messages(websocket, inbox))
+    try:
+        while True:
+            messages = [await inbox.get()]
+            while not inbox.empty():
+                messages.append(inbox.get_nowait())
+            closed = messages[-1] is None
+            await handle_live_messages(websocket, session, [text for text in messages if text is not None])
+            if closed:
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _live_sessions -= 1
+        reader.cancel()
+
+
+@app.get("/api/v1/model")
+async def model_versions():
+    """the current model snapshot and the recent ones that /api/v1/model/rollback can go back to
+
+    Returns:
+        dict: current and history (oldest first)
+    """
+    sync_params()
+    return {
+        "current": model.snapshot.as_dict(),
+        "history": [snapshot.as_dict() for snapshot in model.history],
+    }
+
+
+@app.post("/api/v1/model/rollback")
+async def rollback_model(version: Optional[int] = None):
+    """makes an earlier snapshot the current model again, on every worker. only the leader keeps the history
+    that counts, so followers answer 409
+
+    Args:
+        version (int, optional): the snapshot version. Defaults to the one before the current.
+
+    Returns:
+        dict: the snapshot that is current now
+    """
+    if not leader.is_leader:
+        raise HTTPException(status_code=409, detail="this worker is not the leader, try again")
+    try:
+        snapshot = model.rollback(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"model version {version} is not in the history")
+    publish_params()
+    return snapshot.as_dict()
+
+
+@app.get("/api/v1/profiles")
+async def list_profiles():
+    """the profiles on disk and which of them the registry holds in memory right now
+
+    Returns:
+        dict: profiles, plus capacity, loaded (least recently used first), hits, loads and evictions of the registry
+    """
+    names = await run_in_threadpool(profiles.profiles)
+    return dict(profiles.status(), default=DEFAULT_PROFILE, profiles=names)
+
+
+@app.get("/api/v1/profiles/{profile_id}")
+async def profile_status(profile_id: str):
+    """the dataset size, current model and calibration state of one profile
+
+    Returns:
+        dict: see Profile.status()
+    """
+    if profile_id == DEFAULT_PROFILE:
+        sync_params()
+        return {"profile": DEFAULT_PROFILE, "rows": len(bounce_data), "offset": data_version,
+                "model": model.snapshot.as_dict(), "calibration": calibration.status()}
+
+    def status():
+        with open_profile(profile_id) as profile:
+            return profile.status()
+    return await run_in_threadpool(status)
+
+
 # Run FastAPI
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,264 @@
+"""A tiny prometheus client: counters, gauges and histograms that render to the prometheus text format on /metrics.
+
+The metrics of the app are defined at the bottom of this module, so every part of the app can import and update them
+without going through src.main.
+"""
+import bisect
+import math
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """base class, keeps one child per combination of label values"""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, **labels):
+        """the child for these label values, e.g histogram.labels(route="/api/predict").observe(0.1)"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        """the exposition lines of this metric"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, key))
+        return lines
+
+    # metrics without labels can be used directly, they forward to their only child
+    def __getattr__(self, attr):
+        if attr.startswith("_") or self.__dict__.get("labelnames", True):
+            raise AttributeError(attr)
+        return getattr(self._children[()], attr)
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        if amount < 0:
+            raise ValueError("counters can only go up")
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labelnames, key):
+        return [f"{name}_total{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """reads the value from `function` at scrape time instead, for things that are cheaper to look up than to keep updated"""
+        self._function = function
+
+    def samples(self, name, labelnames, key):
+        value = self._function() if self._function is not None else self.value
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """context manager that observes how long its body took"""
+        return _Timer(self)
+
+    def samples(self, name, labelnames, key):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Registry:
+    """all the metrics that end up on /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """the prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsMiddleware:
+    """plain asgi middleware that times every http request into REQUEST_SECONDS, labeled by the route template
+    (e.g /api/results/plots/{name}.png) so the number of label values stays small
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(method=scope["method"], route=path, status=status[0]).observe(
+                time.perf_counter() - started)
+
+
+# the metrics of the app
+
+REQUEST_SECONDS = Histogram(
+    "tenniscale_http_request_duration_seconds", "Latency of the http requests per route",
+    labelnames=("method", "route", "status"))
+
+CALIBRATION_SECONDS = Histogram(
+    "tenniscale_calibration_duration_seconds", "Wall time of a calibration run",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+CALIBRATION_RUNS = Counter(
+    "tenniscale_calibration_runs", "Calibration runs by outcome", labelnames=("outcome",))
+
+CALIBRATION_EPOCHS = Counter(
+    "tenniscale_calibration_epochs", "Candidate parameter sets evaluated by the calibration")
+
+BEST_MSE = Gauge("tenniscale_best_mse", "Mean squared error of the parameters in use")
+
+DATASET_ROWS = Gauge("tenniscale_dataset_rows", "Number of measurements in the dataset", labelnames=("dataset",))
+
+FIGURE_RENDER_SECONDS = Histogram(
+    "tenniscale_figure_render_duration_seconds", "Time it takes to render a /api/results figure",
+    labelnames=("figure",))
+
+LIVE_SESSIONS = Gauge("tenniscale_live_sessions", "Open /ws/bounces sessions")
+
+LIVE_BOUNCES = Counter("tenniscale_live_bounces", "Bounces received over /ws/bounces")
+
+PROFILE_CACHE = Counter(
+    "tenniscale_profile_cache", "Lookups in the per profile model registry by result (hit, load, evict)",
+    labelnames=("result",))
+
+PROFILES_LOADED = Gauge("tenniscale_profiles_loaded", "Profile models held in memory by the registry")
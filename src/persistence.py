@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ParamStore:
+    """Write-behind storage for the model parameters json file.
+
+    stage() only remembers the newest parameters in memory, flush() writes them. a write goes to a temp file in the
+    same directory which then gets renamed over the real file, so a crash can never leave a half written file behind.
+    every successful write is mirrored into `<file>.bak`, and load() falls back to it when the main file is missing
+    or doesnt parse.
+
+    the file keeps the 'best_params' and 'best_mse' keys it always had, plus a 'version' counter and a 'saved_at' timestamp.
+    the counter continues from the version in the file, so processes that share the file dont write the same version twice
+    one after the other.
+    """
+
+    def __init__(self, path, flush_interval=None):
+        """
+        Args:
+            path (str): the json file, e.g assets/best_params.json
+            flush_interval (float, optional): when set, a background thread flushes staged parameters every this many seconds.
+                Defaults to None, which means the owner calls flush() itself.
+        """
+        self.path = path
+        self.backup_path = path + ".bak"
+        self.flush_interval = flush_interval
+        self.version = 0
+
+        self._lock = threading.Lock()
+        self._pending = None
+        self._closed = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._timer = threading.Thread(target=self._flush_periodically, name="param-store-flush", daemon=True)
+            self._timer.start()
+
+    def stage(self, params, mse, **extra):
+        """remembers the parameters for the next flush. cheap, no disk io
+
+        Args:
+            params (List[float]|None): (a, b, c)
+            mse (float): their mse
+            **extra: more keys for the file, e.g the model snapshot version
+        """
+        with self._lock:
+            self._pending = dict(extra, best_params=None if params is None else list(params), best_mse=mse)
+
+    @property
+    def dirty(self):
+        return self._pending is not None
+
+    def flush(self):
+        """writes the staged parameters, if there are any
+
+        Returns:
+            bool: True if something was written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if pending is None:
+                return False
+            # another process may have written the file since we last looked
+            on_disk = self._read(self.path) or self._read(self.backup_path)
+            if on_disk is not None:
+                self.version = max(self.version, int(on_disk.get('version', 0)))
+            self.version += 1
+            snapshot = dict(pending, version=self.version, saved_at=time.time())
+            try:
+                self._write_atomic(self.path, snapshot)
+                self._write_atomic(self.backup_path, snapshot)
+            except OSError:
+                # keep them staged so the next flush tries again
+                if self._pending is None:
+                    self._pending = pending
+                raise
+            return True
+
+    def load(self):
+        """reads the newest good snapshot, trying the main file first and then the backup
+
+        Returns:
+            dict|None: {'best_params': [...], 'best_mse': float, ...} or None if there is no usable file
+        """
+        for path in (self.path, self.backup_path):
+            snapshot = self._read(path)
+            if snapshot is not None:
+                self.version = max(self.version, int(snapshot.get('version', 0)))
+                return snapshot
+        return None
+
+    def close(self):
+        """stops the flush timer and writes whatever is still staged"""
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        self.flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                pass  # still staged, the next tick tries again
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+            params = snapshot['best_params']
+            if params is not None and len(params) != 3:
+                return None
+            float(snapshot['best_mse'])
+            return snapshot
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def _write_atomic(path, snapshot):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp makes it private, the params file never was. by path, os.fchmod is unix only before 3.13
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
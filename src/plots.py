@@ -0,0 +1,309 @@
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.groups import GroupIndex
+from src.metrics import FIGURE_RENDER_SECONDS
+from src.stats import StatsEngine
+
+# matplotlib is imported inside the functions that need it. it takes a good while to import
+# and the app should be able to serve without it until someone actually looks at the results page
+
+
+# the figures on the results page, served as /api/results/plots/{name}.png
+PLOT_NAMES = ("scatter", "lines", "histogram", "box")
+
+# above this many rows the scatter and the line plots draw binned summaries instead of every single row. a marker
+# per row gets slow and the plot ends up as one blob anyway
+DENSITY_THRESHOLD = 50_000
+
+# bins per axis of the 2d histogram that replaces the scatter plot
+DENSITY_BINS = 200
+
+
+def count_rows(groups):
+    """the number of rows in the per height arrays"""
+    return sum(len(arrays['Total Time (ms)']) for arrays in groups.values())
+
+
+def render_scatter(groups, stats, dense=False):
+    """Scatter Plot: Interval Time vs Total Time for Different Heights"""
+    if dense:
+        return render_scatter_density(groups)
+    fig = new_figure()
+    ax1 = fig.subplots()
+    for height, subset in groups.items():
+        ax1.scatter(subset['Total Time (ms)'], subset['Interval Time (ms)'],
+                    label=f'Height {height} cm', alpha=0.7)
+    ax1.set_xlabel('Total Time (ms)')
+    ax1.set_ylabel('Interval Time (ms)')
+    ax1.set_title(
+        'Interval Time (ms) vs Total Time (ms) for Different Heights')
+    ax1.legend()
+    ax1.grid(True)
+    return fig
+
+
+def render_scatter_density(groups):
+    """the scatter plot for large datasets: a 2d histogram of all rows (log color scale) with the mean of every
+    height on top. the cost of drawing it doesnt depend on the number of rows, only the binning does
+    """
+    from matplotlib.colors import LogNorm
+    fig = new_figure()
+    ax1 = fig.subplots()
+    total = np.concatenate([arrays['Total Time (ms)'] for arrays in groups.values()])
+    interval = np.concatenate([arrays['Interval Time (ms)'] for arrays in groups.values()])
+    keep = np.isfinite(total) & np.isfinite(interval)
+    counts, x_edges, y_edges = np.histogram2d(total[keep], interval[keep], bins=DENSITY_BINS)
+    # empty bins stay white, the log scale cant show them anyway
+    mesh = ax1.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), norm=LogNorm(), cmap='viridis')
+    fig.colorbar(mesh, ax=ax1, label='Measurements per bin')
+    for height, subset in groups.items():
+        ax1.scatter(np.nanmean(subset['Total Time (ms)']), np.nanmean(subset['Interval Time (ms)']),
+                    marker='X', s=80, edgecolors='white', label=f'Height {height} cm (mean)')
+    ax1.set_xlabel('Total Time (ms)')
+    ax1.set_ylabel('Interval Time (ms)')
+    ax1.set_title(
+        'Interval Time (ms) vs Total Time (ms) for Different Heights')
+    ax1.legend()
+    ax1.grid(True)
+    return fig
+
+
+def render_lines(groups, stats, dense=False):
+    """Line Plots: Total Time and Interval Time Over Bounce Number for All Bounces"""
+    if dense:
+        return render_lines_density(groups)
+    fig = new_figure()
+    ax2, ax3 = fig.subplots(1, 2)
+    for height, height_data in groups.items():
+        ax2.plot(height_data['Bounce Number'], height_data['Total Time (ms)'],
+                 marker='o', label=f'Height {height} cm')
+        ax3.plot(height_data['Bounce Number'], height_data['Interval Time (ms)'],
+                 marker='o', label=f'Height {height} cm')
+
+    ax2.set_xlabel('Bounce Number')
+    ax2.set_ylabel('Total Time (ms)')
+    ax2.set_title('Total Time vs Bounce Number')
+    ax2.legend()
+    ax2.grid(True)
+
+    ax3.set_xlabel('Bounce Number')
+    ax3.set_ylabel('Interval Time (ms)')
+    ax3.set_title('Interval Time vs Bounce Number')
+    ax3.legend()
+    ax3.grid(True)
+    fig.tight_layout()
+    return fig
+
+
+def bounce_profile(bounces, values):
+    """mean and standard deviation of `values` per bounce number, vectorized with np.bincount. the std is taken
+    from the deviations from the mean in a second pass, sum(x²)/n - mean² cancels when the mean is large next to
+    the spread, like the totals of thousands of ms are
+
+    Args:
+        bounces (np.ndarray): bounce number per row, nan for rows without one
+        values (np.ndarray): the column to summarize
+
+    Returns:
+        tuple: (bounce numbers, means, stds), one entry per bounce number that has rows
+    """
+    keep = np.isfinite(bounces) & np.isfinite(values) & (bounces >= 0)
+    bounces = bounces[keep].astype(np.int64)
+    values = values[keep]
+    counts = np.bincount(bounces)
+    present = np.flatnonzero(counts)
+    means = np.zeros(len(counts))
+    means[present] = np.bincount(bounces, weights=values)[present] / counts[present]
+    squares = np.bincount(bounces, weights=(values - means[bounces]) ** 2, minlength=len(counts))
+    return present, means[present], np.sqrt(squares[present] / counts[present])
+
+
+def render_lines_density(groups):
+    """the line plots for large datasets: per height one line through the mean of every bounce number with a
+    band of one standard deviation, instead of a line through every single row
+    """
+    fig = new_figure()
+    ax2, ax3 = fig.subplots(1, 2)
+    for height, height_data in groups.items():
+        for ax, column in ((ax2, 'Total Time (ms)'), (ax3, 'Interval Time (ms)')):
+            bounces, means, stds = bounce_profile(height_data['Bounce Number'], height_data[column])
+            if len(bounces) == 0:
+                continue
+            line, = ax.plot(bounces, means, marker='o', label=f'Height {height} cm')
+            ax.fill_between(bounces, means - stds, means + stds, color=line.get_color(), alpha=0.2)
+
+    ax2.set_xlabel('Bounce Number')
+    ax2.set_ylabel('Total Time (ms)')
+    ax2.set_title('Total Time vs Bounce Number (mean ± std)')
+    ax2.legend()
+    ax2.grid(True)
+
+    ax3.set_xlabel('Bounce Number')
+    ax3.set_ylabel('Interval Time (ms)')
+    ax3.set_title('Interval Time vs Bounce Number (mean ± std)')
+    ax3.legend()
+    ax3.grid(True)
+    fig.tight_layout()
+    return fig
+
+
+def render_histogram(groups, stats, dense=False):
+    """Histogram of Bounce Numbers, from the counts the stats engine keeps"""
+    fig = new_figure()
+    ax4 = fig.subplots()
+    # measurements from /api/measure dont have a bounce number, they are not counted
+    bounce_counts = stats["bounce_counts"]
+    # one bar per bounce number over [n, n + 1), the same bins the histogram of the rows had
+    ax4.bar([bounce for bounce, _ in bounce_counts], [count for _, count in bounce_counts],
+            width=1.0, align='edge', edgecolor='black')
+    ax4.set_xlabel('Bounce Number')
+    ax4.set_ylabel('Frequency')
+    ax4.set_title('Histogram of Bounce Numbers')
+    ax4.grid(True)
+    return fig
+
+
+def render_box(groups, stats, dense=False):
+    """Box Plot of Total Time and Interval Time, drawn from the streaming quartiles of the stats engine"""
+    fig = new_figure()
+    ax5 = fig.subplots()
+    ax5.bxp(stats["boxes"], showfliers=False)
+    ax5.set_title('Box Plot of Total Time and Interval Time')
+    ax5.grid(True)
+    return fig
+
+
+def new_figure():
+    """a fresh 12x6 figure, drawn with Agg and not registered with pyplot"""
+    from matplotlib.figure import Figure
+    return Figure(figsize=(12, 6))
+
+
+RENDERERS = {
+    "scatter": render_scatter,
+    "lines": render_lines,
+    "histogram": render_histogram,
+    "box": render_box,
+}
+
+
+def render_png(name, groups, stats, density_threshold=DENSITY_THRESHOLD):
+    """renders one of the results figures to png bytes with the object oriented Agg api, so no pyplot global state is involved
+    and several figures can be drawn on different threads at the same time
+
+    Args:
+        name (str): one of PLOT_NAMES
+        groups (dict): height -> column arrays of the data the model is calibrated on, see GroupIndex.height_arrays()
+        stats (dict): bounce_counts of the full dataset and the boxes of the model data, see plot_stats()
+        density_threshold (int, optional): from this many rows on the figures are drawn from binned summaries.
+            Defaults to DENSITY_THRESHOLD.
+
+    Returns:
+        bytes: the png
+    """
+    fig = RENDERERS[name](groups, stats, dense=count_rows(groups) > density_threshold)
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def plot_stats(full_stats, model_stats):
+    """what the histogram and the box plot need, taken from the stats engines of the two datasets
+
+    Args:
+        full_stats (StatsEngine): stats of the full dataset
+        model_stats (StatsEngine): stats of the data the model is calibrated on
+    """
+    return {"bounce_counts": full_stats.bounce_counts(), "boxes": model_stats.box_stats()}
+
+
+def plot_inputs(data, full_data):
+    """the (groups, stats) the renderers want, built from scratch from the rows. the app keeps both up to date
+    as the data comes in instead, this is for the benchmarks
+
+    Args:
+        data (BounceDataset|List[dict]): the data the model is calibrated on
+        full_data (BounceDataset|List[dict]): the full dataset
+    """
+    return GroupIndex(data).height_arrays(), plot_stats(StatsEngine(full_data), StatsEngine(data))
+
+
+class RenderedPlot:
+    """a rendered png together with its strong etag"""
+
+    def __init__(self, png):
+        self.png = png
+        self.etag = '"' + hashlib.sha1(png).hexdigest() + '"'
+
+
+class PlotCache:
+    """Caches the rendered results figures until the dataset version changes.
+
+    every figure is rendered at most once per version on a small thread pool. concurrent requests for the same
+    figure share one render, and a new version throws the old figures away.
+    """
+
+    def __init__(self, max_workers=2, density_threshold=DENSITY_THRESHOLD):
+        """
+        Args:
+            max_workers (int, optional): render threads. Defaults to 2.
+            density_threshold (int, optional): see render_png(). Defaults to DENSITY_THRESHOLD.
+        """
+        self.density_threshold = density_threshold
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plot-render")
+        self._lock = threading.Lock()
+        self._version = None
+        self._inputs = None
+        self._plots = {}
+
+    def get(self, name, version, snapshot):
+        """returns a future for the rendered figure, starting the render if this version doesnt have it yet
+
+        Args:
+            name (str): one of PLOT_NAMES
+            version (int): the dataset version the figure has to belong to
+            snapshot (Callable[[], tuple]): returns (groups, stats) for this version, see render_png(). only called
+                when the version changed, and right away, so it should be cheap
+
+        Returns:
+            concurrent.futures.Future: resolves to a RenderedPlot
+        """
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._inputs = snapshot()
+                self._plots = {}
+            future = self._plots.get(name)
+            if future is not None:
+                return future
+            future = self._pool.submit(self._render, name, self._inputs, self.density_threshold)
+            self._plots[name] = future
+        # outside the lock, a render that is done already runs the callback right here and it takes the lock
+        future.add_done_callback(lambda f, name=name, version=version: self._forget_failed(f, name, version))
+        return future
+
+    def prefetch(self, version, snapshot):
+        """starts rendering every figure of a version in the background"""
+        for name in PLOT_NAMES:
+            self.get(name, version, snapshot)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _render(name, inputs, density_threshold):
+        with FIGURE_RENDER_SECONDS.labels(figure=name).time():
+            png = render_png(name, *inputs, density_threshold)
+        return RenderedPlot(png)
+
+    def _forget_failed(self, future, name, version):
+        # a failed render should be retried on the next request instead of serving the error forever
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                if self._version == version and self._plots.get(name) is future:
+                    del self._plots[name]
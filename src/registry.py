@@ -0,0 +1,315 @@
+"""Separately calibrated models per profile (ball type, court surface, timing device...).
+
+the default profile is the model the app always had: assets/best_params.json and the main database. every other
+profile lives in a directory of its own with its own measurements and params file:
+
+    <profiles dir>/<profile id>/measurements.sqlite3
+    <profiles dir>/<profile id>/best_params.json
+
+a profile is only loaded when a request asks for it, and the registry keeps at most `capacity` of them in memory.
+the least recently used one is closed when another one has to be loaded:
+
+    registry = ModelRegistry("data/profiles", capacity=64, model_options={"solver": "lstsq"})
+    with registry.use("clay-dunlop", create=True) as profile:
+        profile.measure([row])
+    with registry.use("clay-dunlop") as profile:
+        profile.model.predict_array(X)
+
+with several uvicorn workers every worker has its own registry. the worker that got a measurement calibrates the
+profile, the others read the new rows from its database and the params file when they use the profile next.
+"""
+import collections
+import contextlib
+import os
+import re
+import threading
+import time
+
+from src.calibration import CalibrationService
+from src.dataset import BounceDataset
+from src.fortuna import FortunaModel
+from src.metrics import PROFILE_CACHE
+from src.store import MeasurementStore
+
+
+DEFAULT_PROFILE = "default"
+
+# profiles held in memory by default
+DEFAULT_CAPACITY = 64
+
+# profile ids become directory names, so only a safe set of characters
+PROFILE_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+
+class UnknownProfile(KeyError):
+    """a profile that has no directory yet and wasnt asked to be created"""
+
+
+def check_profile_id(profile_id):
+    """
+    Raises:
+        ValueError: if the id cant be used as a profile directory
+    """
+    if not isinstance(profile_id, str) or not PROFILE_ID.fullmatch(profile_id) or ".." in profile_id:
+        raise ValueError(f"invalid profile id {profile_id!r}, use up to 64 letters, digits, '-', '_' and '.'")
+    return profile_id
+
+
+class Profile:
+    """the measurements, the model and the calibration worker of one profile"""
+
+    def __init__(self, profile_id, directory, model_options=None, row_filter=None, debounce=0.5, sync_interval=0.5):
+        """
+        Args:
+            profile_id (str): the id
+            directory (str): where its database and params file are, created if needed
+            model_options (dict, optional): keyword arguments for FortunaModel, besides the params file. Defaults to None.
+            row_filter (Callable[[dict], bool], optional): which rows the model learns from. Defaults to all.
+            debounce (float, optional): see CalibrationService. Defaults to 0.5.
+            sync_interval (float, optional): refresh() looks for rows and params of other workers at most this
+                often, in seconds. Defaults to 0.5.
+        """
+        self.id = profile_id
+        self.directory = directory
+        self.row_filter = row_filter or (lambda row: True)
+        self.sync_interval = sync_interval
+        os.makedirs(directory, exist_ok=True)
+        self.store = MeasurementStore(os.path.join(directory, "measurements.sqlite3"))
+        rows, self.offset = self.store.read_since(0)
+        rows = [row for row in rows if self.row_filter(row)]
+        self.data = BounceDataset(rows, capacity=max(len(rows), 64))
+        self.model = FortunaModel(params_file=os.path.join(directory, "best_params.json"), **(model_options or {}))
+        # the thread only starts with the first calibration, most profiles are only ever used for predictions
+        self.calibration = CalibrationService(self.model, lambda: self.data.snapshot(), debounce=debounce,
+                                              version_provider=lambda: self.offset)
+        self._lock = threading.Lock()
+        self._params_mtime = _mtime(self.model.params_file)
+        self._refreshed = time.monotonic()
+        # guarded by the registry lock: requests using the profile right now, and whether it was evicted meanwhile
+        self.users = 0
+        self.evicted = False
+
+    def measure(self, rows, source="api"):
+        """stores measurements and folds them into the model, right away for the least squares solver and with a
+        calibration run otherwise
+
+        Args:
+            rows (List[dict]): the measurements
+            source (str, optional): where they came from. Defaults to "api".
+        """
+        with self._lock:
+            self.store.append_many(rows, source)
+            new = self._catch_up()
+            if new and self.model.solver == "lstsq" and self.model.qr is not None:
+                self.calibration.update(new, self.offset)
+                return
+        if new:
+            self.calibration.start()
+            self.calibration.request("measure")
+
+    def refresh(self, force=False):
+        """picks up the rows other workers appended and the params they saved, at most every sync_interval seconds
+
+        Args:
+            force (bool, optional): ignore the sync interval. Defaults to False.
+        """
+        now = time.monotonic()
+        if not force and now - self._refreshed < self.sync_interval:
+            return
+        with self._lock:
+            self._refreshed = now
+            self._catch_up()
+            mtime = _mtime(self.model.params_file)
+            if mtime == self._params_mtime or self.calibration.running:
+                return
+            self._params_mtime = mtime
+            # our own saves change the file too, only params other than the ones we serve are news. compared by
+            # content, the write counters of two workers can end up on the same number
+            saved = self.model.store.load()
+            snapshot = self.model.snapshot
+            current = None if snapshot.params is None else list(snapshot.params)
+            if saved is not None and (saved['best_params'], saved['best_mse']) != (current, snapshot.mse):
+                self.model.load_params()
+
+    def _catch_up(self):
+        rows, self.offset = self.store.read_since(self.offset)
+        rows = [row for row in rows if self.row_filter(row)]
+        self.data.extend(rows)
+        return rows
+
+    def status(self):
+        snapshot = self.model.snapshot
+        return {
+            "profile": self.id,
+            "rows": len(self.data),
+            "offset": self.offset,
+            "model": snapshot.as_dict(),
+            "calibration": self.calibration.status(),
+        }
+
+    def close(self):
+        """stops the calibration worker (a running calibration finishes first) and closes the files"""
+        self.calibration.stop()
+        with self._lock:
+            self.model.store.close()
+            self.store.close()
+
+
+class ModelRegistry:
+    """the profiles by id, loaded on first use and kept in an LRU of `capacity` entries. see the module docstring"""
+
+    def __init__(self, directory, capacity=DEFAULT_CAPACITY, model_options=None, row_filter=None, debounce=0.5,
+                 sync_interval=0.5):
+        """
+        Args:
+            directory (str): the profile directories are in here
+            capacity (int, optional): profiles kept in memory. Defaults to DEFAULT_CAPACITY.
+            model_options, row_filter, debounce, sync_interval: passed on to every Profile
+        """
+        if capacity < 1:
+            raise ValueError("the registry needs room for at least one profile")
+        self.directory = directory
+        self.capacity = capacity
+        self.model_options = dict(model_options or {})
+        self.row_filter = row_filter
+        self.debounce = debounce
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._profiles = collections.OrderedDict()
+        # one lock per profile that is being loaded, so two requests for it dont load it twice
+        self._loading = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def path(self, profile_id):
+        return os.path.join(self.directory, check_profile_id(profile_id))
+
+    def exists(self, profile_id):
+        """whether the profile has a directory, loaded or not"""
+        return profile_id in self._profiles or os.path.isdir(self.path(profile_id))
+
+    def profiles(self):
+        """the ids of all profiles on disk, sorted"""
+        try:
+            entries = os.scandir(self.directory)
+        except FileNotFoundError:
+            return []
+        with entries:
+            return sorted(entry.name for entry in entries if entry.is_dir() and PROFILE_ID.fullmatch(entry.name))
+
+    def loaded(self):
+        """the ids of the profiles in memory, least recently used first"""
+        with self._lock:
+            return list(self._profiles)
+
+    @contextlib.contextmanager
+    def use(self, profile_id, create=False):
+        """the profile for the duration of a request. it isnt closed while in use, even if it gets evicted meanwhile
+
+        Args:
+            profile_id (str): the id
+            create (bool, optional): make a new profile if there is none. Defaults to False.
+
+        Raises:
+            ValueError: for an invalid id
+            UnknownProfile: if there is no such profile and create is False
+
+        Yields:
+            Profile: loaded and refreshed
+        """
+        profile = self._acquire(profile_id, create)
+        try:
+            profile.refresh()
+            yield profile
+        finally:
+            self._release(profile)
+
+    def _acquire(self, profile_id, create):
+        path = self.path(profile_id)
+        while True:
+            with self._lock:
+                profile = self._hit(profile_id)
+                if profile is not None:
+                    return profile
+                loading = self._loading.setdefault(profile_id, threading.Lock())
+            # the loading happens outside the registry lock, the other profiles stay usable meanwhile
+            with loading:
+                with self._lock:
+                    profile = self._hit(profile_id)
+                    if profile is not None:
+                        return profile
+                    if self._loading.get(profile_id) is not loading:
+                        continue  # the load we waited for failed and dropped its lock, start over
+                try:
+                    if not create and not os.path.isdir(path):
+                        raise UnknownProfile(profile_id)
+                    profile = Profile(profile_id, path, self.model_options, self.row_filter, self.debounce,
+                                      self.sync_interval)
+                except BaseException:
+                    with self._lock:
+                        self._loading.pop(profile_id, None)
+                    raise
+                evicted = []
+                with self._lock:
+                    # in the same block as the insert, whoever misses the lock finds the profile instead
+                    self._loading.pop(profile_id, None)
+                    self._profiles[profile_id] = profile
+                    profile.users += 1
+                    self.loads += 1
+                    PROFILE_CACHE.labels(result="load").inc()
+                    while len(self._profiles) > self.capacity:
+                        _, old = self._profiles.popitem(last=False)
+                        old.evicted = True
+                        self.evictions += 1
+                        PROFILE_CACHE.labels(result="evict").inc()
+                        if old.users == 0:
+                            evicted.append(old)
+            # closing waits for a running calibration, nobody else has to wait for that
+            for old in evicted:
+                old.close()
+            return profile
+
+    def _hit(self, profile_id):
+        # with self._lock held
+        profile = self._profiles.get(profile_id)
+        if profile is not None:
+            self._profiles.move_to_end(profile_id)
+            profile.users += 1
+            self.hits += 1
+            PROFILE_CACHE.labels(result="hit").inc()
+        return profile
+
+    def _release(self, profile):
+        with self._lock:
+            profile.users -= 1
+            close = profile.evicted and profile.users == 0
+        if close:
+            profile.close()
+
+    def status(self):
+        """a json friendly summary of the registry"""
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "loaded": list(self._profiles),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        """closes every loaded profile, for the shutdown"""
+        with self._lock:
+            profiles = list(self._profiles.values())
+            self._profiles.clear()
+        for profile in profiles:
+            profile.evicted = True
+            profile.close()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
@@ -0,0 +1,230 @@
+"""State shared between the uvicorn/gunicorn worker processes of one host.
+
+with several workers every process has its own copy of the model. to keep their predictions consistent:
+
+- SharedParams is a small memory mapped file that holds the published model snapshot: (a, b, c), mse and the
+  snapshot version, so every worker reports the same model version for the same params. it is guarded by a
+  generation counter used as a seqlock: the writer makes the counter odd, writes, and makes it even again. readers
+  never lock, they read the counter, the payload and the counter again and retry when it changed in between. the
+  counter alone tells a reader if there is anything new, which is a single 8 byte read per request.
+- LeaderLock elects the one worker that runs the calibration, with an flock on a file next to the database. the
+  kernel drops the lock when the process dies, so another worker can take over.
+- Ticker runs the periodic catch up of every worker (new rows in the store, new params, calibration requests).
+
+the measurements themselves are already shared through the sqlite store, every worker reads what the others
+appended with MeasurementStore.read_since().
+
+the locks are flocks, so several workers need a platform with fcntl. elsewhere (windows) the app runs as a single
+worker: nothing is locked and LeaderLock always makes it the leader.
+"""
+import contextlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # windows, single worker only, see the module docstring
+    fcntl = None
+
+
+# generation | calibration requests | a, b, c, mse | data offset | published at | model version
+_GENERATION = struct.Struct("<Q")
+_REQUESTS = struct.Struct("<Q")
+_PAYLOAD = struct.Struct("<4dqdq")
+_REQUESTS_AT = _GENERATION.size
+_PAYLOAD_AT = _REQUESTS_AT + _REQUESTS.size
+SIZE = _PAYLOAD_AT + _PAYLOAD.size
+
+# a reader gives up after this many tries while a write seems to be going on, a writer that died half way through
+# must not hang the event loop of every worker
+READ_RETRIES = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class ParamsSnapshot:
+    """one consistent read of SharedParams"""
+
+    def __init__(self, generation, params, mse, offset, published_at, version):
+        self.generation = generation
+        self.params = params
+        self.mse = mse
+        self.offset = offset
+        self.published_at = published_at
+        self.version = version
+
+
+class SharedParams:
+    """the published model parameters in a memory mapped file, see the module docstring"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): the file, created (zeroed) if it doesnt exist yet
+        """
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        _lock(self._fd)
+        try:
+            if os.fstat(self._fd).st_size < SIZE:
+                os.ftruncate(self._fd, SIZE)
+            self._map = mmap.mmap(self._fd, SIZE)
+            # the file outlives the processes. an odd generation left behind by a writer that was killed mid write
+            # would look like a write in progress forever, so it is moved on to the next even one
+            generation = self.generation()
+            if generation & 1:
+                logger.warning("recovered shared params from an interrupted write", extra={"generation": generation})
+                _GENERATION.pack_into(self._map, 0, generation + 1)
+        finally:
+            _unlock(self._fd)
+
+    def generation(self):
+        """the current generation, 0 means nothing was published yet. odd while a write is in progress"""
+        return _GENERATION.unpack_from(self._map, 0)[0]
+
+    def read(self):
+        """reads the published params without taking any lock
+
+        Returns:
+            ParamsSnapshot|None: None if nothing was published yet, or if a write didnt finish within READ_RETRIES tries
+        """
+        for _ in range(READ_RETRIES):
+            before = self.generation()
+            if before & 1:
+                time.sleep(0)  # a writer is busy, let it finish
+                continue
+            a, b, c, mse, offset, published_at, version = _PAYLOAD.unpack_from(self._map, _PAYLOAD_AT)
+            if self.generation() == before:
+                if before == 0:
+                    return None
+                return ParamsSnapshot(before, [a, b, c], mse, offset, published_at, version)
+        logger.warning("shared params stayed locked by a writer, keeping the current ones",
+                       extra={"generation": self.generation()})
+        return None
+
+    def write(self, params, mse, offset, version=0):
+        """publishes new params to every process
+
+        Args:
+            params (List[float]): (a, b, c)
+            mse (float): their mse
+            offset (int): the store offset of the data they were calibrated on
+            version (int, optional): the model snapshot version of the params. Defaults to 0.
+        """
+        a, b, c = params
+        with self._exclusive():
+            generation = self.generation()
+            if generation & 1:
+                # a writer in another process died half way through, its write never counted
+                generation += 1
+            _GENERATION.pack_into(self._map, 0, generation + 1)
+            _PAYLOAD.pack_into(self._map, _PAYLOAD_AT, a, b, c, mse, offset, time.time(), version)
+            _GENERATION.pack_into(self._map, 0, generation + 2)
+
+    def calibration_requests(self):
+        """how many calibrations the workers asked the leader for, ever"""
+        return _REQUESTS.unpack_from(self._map, _REQUESTS_AT)[0]
+
+    def request_calibration(self):
+        """asks the leader for a calibration run, for workers that cant run one themselves"""
+        with self._exclusive():
+            _REQUESTS.pack_into(self._map, _REQUESTS_AT, self.calibration_requests() + 1)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        # writers (the leader publishing, followers counting requests) still serialize among themselves
+        _lock(self._fd)
+        try:
+            yield
+        finally:
+            _unlock(self._fd)
+
+
+class LeaderLock:
+    """leader election between the worker processes with a non blocking flock. the worker holding the lock is the leader"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    @property
+    def is_leader(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        """becomes the leader if nobody else is
+
+        Returns:
+            bool: whether this process is the leader now
+        """
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock(fd, blocking=False)
+        except OSError:
+            os.close(fd)
+            return False
+        # only for humans looking at the file
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)  # closing the file drops the flock
+            self._fd = None
+
+
+def _lock(fd, blocking=True):
+    """an exclusive flock on the file. without fcntl there is only the one process, so nothing to lock against
+
+    Raises:
+        OSError: if blocking is False and another process holds the lock
+    """
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class Ticker:
+    """calls `callback` every `interval` seconds on a daemon thread until stop()"""
+
+    def __init__(self, interval, callback, name="ticker"):
+        self.interval = interval
+        self.callback = callback
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.callback()
+            except Exception:  # keep ticking, the next round may work again
+                logger.exception("periodic task failed", extra={"task": self.name})
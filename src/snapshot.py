@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+
+from src.dataset import STRING_COLUMNS, BounceDataset
+from src.store import COLUMNS
+
+
+# bump when the layout of the snapshot file changes, old snapshots are then rebuilt
+SNAPSHOT_FORMAT = 1
+
+# rewrite the snapshot once this many rows had to be read from the store on top of it
+REBUILD_AFTER_ROWS = 1000
+
+# dataset column -> name of the array in the file
+_FILE_COLUMNS = {
+    'Height': 'height',
+    'Bounce Number': 'bounce_number',
+    'Total Time': 'total_time',
+    'Interval Time': 'interval_time',
+    'Total Time (ms)': 'total_time_ms',
+    'Interval Time (ms)': 'interval_time_ms',
+}
+
+
+def csv_signature(csv_path, store_id):
+    """size and modification time of the seed csv plus the id of the store. a changed csv or a different database means the snapshot is stale"""
+    try:
+        st = os.stat(csv_path)
+        size, mtime = st.st_size, st.st_mtime_ns
+    except FileNotFoundError:
+        size, mtime = -1, -1
+    return np.array([f"{size}:{mtime}:{store_id}"])
+
+
+def save_snapshot(path, dataset, offset, signature):
+    """writes the dataset as numpy columns into an .npz file (atomically, via a temp file)
+
+    Args:
+        path (str): the snapshot file
+        dataset (BounceDataset): the measurements
+        offset (int): the store offset the rows go up to
+        signature (np.ndarray): csv_signature() of the seed csv
+    """
+    columns = {name: dataset.column(column) for column, name in _FILE_COLUMNS.items()}
+    for column in STRING_COLUMNS:
+        # npz without pickles only takes fixed width strings, a missing lap time is stored as ''
+        values = columns[_FILE_COLUMNS[column]]
+        columns[_FILE_COLUMNS[column]] = np.where(np.equal(values, None), '', values).astype(np.str_)
+    # one temp file per process, several workers may rebuild the snapshot at the same time
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, format=np.array(SNAPSHOT_FORMAT), offset=np.array(offset, dtype=np.int64),
+             signature=signature, **columns)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path, signature):
+    """reads a snapshot written by save_snapshot()
+
+    Args:
+        path (str): the snapshot file
+        signature (np.ndarray): the current csv_signature(), the snapshot is only used when it matches
+
+    Returns:
+        tuple|None: (columns, offset) with columns like MeasurementStore.load_arrays() has them, or None if there
+            is no valid snapshot for this csv
+    """
+    try:
+        with np.load(path, allow_pickle=False) as snapshot:
+            if int(snapshot['format']) != SNAPSHOT_FORMAT or not np.array_equal(snapshot['signature'], signature):
+                return None
+            offset = int(snapshot['offset'])
+            columns = {column: snapshot[name] for column, name in _FILE_COLUMNS.items()}
+    except (OSError, KeyError, ValueError):
+        return None
+    for column in STRING_COLUMNS:
+        values = columns[column].astype(object)
+        values[columns[column] == ''] = None
+        columns[column] = values
+    return columns, offset
+
+
+def load_dataset(store, csv_path, snapshot_path):
+    """loads all measurements for startup. the bulk comes from the binary snapshot, only the rows appended to the
+    store after it was written are read from sqlite. the snapshot is rebuilt when the csv changed or too many rows
+    piled up on top of it. both go column by column into the dataset, no dict per row
+
+    Args:
+        store (MeasurementStore): the measurement store, already seeded
+        csv_path (str): the seed csv
+        snapshot_path (str): where the snapshot lives
+
+    Returns:
+        tuple: (dataset, offset, source) where dataset is a BounceDataset and source is "snapshot" or "store", for
+            the startup report
+    """
+    signature = csv_signature(csv_path, store.store_id)
+    snapshot = load_snapshot(snapshot_path, signature)
+    if snapshot is not None and snapshot[1] <= store.last_offset():
+        columns, offset = snapshot
+        tail, offset = store.load_arrays(offset)
+        dataset = BounceDataset.from_columns({column: np.concatenate([columns[column], tail[column]])
+                                              for column in COLUMNS})
+        source = "snapshot"
+        rebuild = len(tail['id']) >= REBUILD_AFTER_ROWS
+    else:
+        columns, offset = store.load_arrays(0)
+        dataset = BounceDataset.from_columns(columns)
+        source = "store"
+        rebuild = True
+    if rebuild:
+        try:
+            save_snapshot(snapshot_path, dataset, offset, signature)
+        except OSError:
+            pass  # only an optimization, the next start just reads the store again
+    return dataset, offset, source
@@ -0,0 +1,225 @@
+"""Incremental statistics over the bounce measurements.
+
+the histogram of the bounce numbers and the box plot on the results page used to be computed from every row on
+every new dataset version. StatsEngine keeps the numbers they need up to date row by row instead:
+
+- how many rows there are per bounce number
+- per time column min, max, mean, variance (welford) and streaming quartiles (the P² algorithm), which is what a
+  box plot needs
+
+the per height aggregates are the ones of the group index, see GroupIndex.summary().
+
+adding a row is O(1) and reading the summary doesnt depend on the number of rows:
+
+    stats = StatsEngine(rows)
+    stats.append(row)
+    stats.summary()["columns"]["Interval Time (ms)"]["median"]
+"""
+import bisect
+import math
+import threading
+
+
+# the columns that get moments and streaming quantiles
+STAT_COLUMNS = ('Total Time (ms)', 'Interval Time (ms)')
+
+# the quantiles of every column, the quartiles of a box plot
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+class Welford:
+    """running count, mean and variance with welford's update, stable even when the mean is large"""
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def variance(self):
+        """the population variance, like np.var"""
+        return self._m2 / self.count if self.count else None
+
+    def as_dict(self):
+        variance = self.variance()
+        return {
+            "count": self.count,
+            "mean": self.mean if self.count else None,
+            "variance": variance,
+            "std": None if variance is None else math.sqrt(variance),
+        }
+
+
+class P2Quantile:
+    """streaming estimate of one quantile with the P² algorithm (Jain and Chlamtac, 1985).
+
+    it keeps five markers (min, p/2, p, (1+p)/2, max) and moves them along a parabola fitted through their
+    neighbours as the rows come in, so memory and update time are constant. the first five values are exact.
+    """
+    __slots__ = ('p', 'count', '_heights', '_positions', '_desired', '_increments')
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value):
+        self.count += 1
+        q = self._heights
+        if self.count <= 5:
+            bisect.insort(q, value)
+            return
+        n = self._positions
+        if value < q[0]:
+            q[0] = value
+            cell = 0
+        elif value >= q[4]:
+            q[4] = value
+            cell = 3
+        else:
+            cell = bisect.bisect_right(q, value) - 1
+        for i in range(cell + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        """the current estimate, None before the first value"""
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            # exact, interpolated like np.percentile
+            q = self._heights
+            rank = self.p * (len(q) - 1)
+            low = int(math.floor(rank))
+            high = min(low + 1, len(q) - 1)
+            return q[low] + (q[high] - q[low]) * (rank - low)
+        return self._heights[2]
+
+
+class ColumnSketch:
+    """min, max, moments and QUANTILES of one column"""
+
+    def __init__(self):
+        self.min = math.inf
+        self.max = -math.inf
+        self.moments = Welford()
+        self.quantiles = {p: P2Quantile(p) for p in QUANTILES}
+
+    def add(self, value):
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.moments.add(value)
+        for quantile in self.quantiles.values():
+            quantile.add(value)
+
+    def as_dict(self):
+        count = self.moments.count
+        q1, median, q3 = (self.quantiles[p].value() for p in QUANTILES)
+        return dict(self.moments.as_dict(), min=self.min if count else None, max=self.max if count else None,
+                    q1=q1, median=median, q3=q3)
+
+
+class StatsEngine:
+    """the statistics of a growing dataset, updated row by row. see the module docstring"""
+
+    def __init__(self, rows=()):
+        """
+        Args:
+            rows (Iterable[dict], optional): the measurements already in the dataset. Defaults to ().
+        """
+        self._lock = threading.Lock()
+        self.rows = 0
+        self._bounces = {}
+        self._without_bounce = 0
+        self._columns = {column: ColumnSketch() for column in STAT_COLUMNS}
+        self.extend(rows)
+
+    def append(self, row):
+        self.extend((row,))
+
+    def extend(self, rows):
+        with self._lock:
+            for row in rows:
+                self._add(row)
+
+    def _add(self, row):
+        self.rows += 1
+        bounce = row['Bounce Number']
+        if bounce is None or bounce != bounce:
+            self._without_bounce += 1
+        else:
+            self._bounces[int(bounce)] = self._bounces.get(int(bounce), 0) + 1
+        for column in STAT_COLUMNS:
+            value = row[column]
+            if value is None or value != value:
+                continue
+            self._columns[column].add(value)
+
+    def bounce_counts(self):
+        """rows per bounce number, sorted by bounce number. rows without a bounce number are left out
+
+        Returns:
+            List[tuple]: (bounce number, count)
+        """
+        with self._lock:
+            return sorted(self._bounces.items())
+
+    def box_stats(self):
+        """the STAT_COLUMNS as matplotlib bxp() dicts. the quartiles are the streaming estimates and the whiskers
+        end at 1.5 IQR or the extreme value, whichever is closer. without the rows there are no fliers to draw
+
+        Returns:
+            List[dict]: one per column
+        """
+        with self._lock:
+            columns = {column: sketch.as_dict() for column, sketch in self._columns.items()}
+        boxes = []
+        for column, stats in columns.items():
+            if not stats["count"]:
+                continue
+            spread = 1.5 * (stats["q3"] - stats["q1"])
+            boxes.append({
+                "label": column,
+                "q1": stats["q1"],
+                "med": stats["median"],
+                "q3": stats["q3"],
+                "whislo": max(stats["min"], stats["q1"] - spread),
+                "whishi": min(stats["max"], stats["q3"] + spread),
+                "fliers": [],
+            })
+        return boxes
+
+    def summary(self):
+        """everything as json friendly dicts. O(bounce numbers), independent of the number of rows"""
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "bounce_numbers": [{"bounce": bounce, "count": count} for bounce, count in sorted(self._bounces.items())],
+                "without_bounce_number": self._without_bounce,
+                "columns": {column: sketch.as_dict() for column, sketch in self._columns.items()},
+            }
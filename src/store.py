@@ -0,0 +1,240 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+
+
+# the keys of a measurement dict, same names as the columns of src/tennis_ball_bounce_data.csv
+COLUMNS = ("Height", "Bounce Number", "Total Time", "Interval Time", "Total Time (ms)", "Interval Time (ms)")
+
+# csv/dict column -> sqlite column
+_SQL_COLUMNS = {
+    "Height": "height",
+    "Bounce Number": "bounce_number",
+    "Total Time": "total_time",
+    "Interval Time": "interval_time",
+    "Total Time (ms)": "total_time_ms",
+    "Interval Time (ms)": "interval_time_ms",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    height NUMERIC NOT NULL,
+    bounce_number INTEGER,
+    total_time TEXT,
+    interval_time TEXT,
+    total_time_ms NUMERIC NOT NULL,
+    interval_time_ms NUMERIC NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class MeasurementStore:
+    """Durable, append-only storage for the bounce measurements, backed by an sqlite file in WAL mode.
+
+    rows are only ever inserted, never updated, so the autoincrement id doubles as an offset into the log:
+    read_since(offset) returns everything that was appended after the row with that id. WAL mode lets several
+    processes read while one of them writes, so every uvicorn worker sees the same dataset.
+    """
+
+    def __init__(self, path="data/measurements.sqlite3"):
+        """
+        Args:
+            path (str, optional): the sqlite file, its directory is created if needed. Defaults to "data/measurements.sqlite3".
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # autocommit mode, transactions are opened explicitly so a batch is one commit
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # identifies this database, so caches built from it (like the startup snapshot) notice when its replaced
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex,))
+        self.store_id = self._conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+
+    def seed_from_csv(self, csv_path):
+        """imports a csv like src/tennis_ball_bounce_data.csv once. later calls see the marker in the meta table and do nothing
+
+        Args:
+            csv_path (str): the csv file with the COLUMNS header
+
+        Returns:
+            int: how many rows got imported
+        """
+        marker = "seed:" + os.path.basename(csv_path)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+        with open(csv_path, newline='') as f:
+            rows = [from_csv_row(row) for row in csv.DictReader(f)]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # check again inside the write transaction, another worker may have seeded in the meantime
+                if self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                    self._conn.execute("ROLLBACK")
+                    return 0
+                self._insert(rows, "seed")
+                self._conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(time.time())))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def append(self, row, source="api"):
+        """appends a single measurement and commits it
+
+        Args:
+            row (dict): measurement with (some of) the COLUMNS keys. Height and the two (ms) times are required
+            source (str, optional): where the row came from. Defaults to "api".
+
+        Returns:
+            int: the id (offset) of the row
+        """
+        return self.append_many([row], source)
+
+    def append_many(self, rows, source="api"):
+        """appends a batch of measurements in a single transaction, so the whole batch costs one commit (and one fsync)
+
+        Args:
+            rows (Iterable[dict]): the measurements
+            source (str, optional): where the rows came from. Defaults to "api".
+
+        Returns:
+            int: the id (offset) of the last row in the store after the append
+        """
+        rows = list(rows)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert(rows, source)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._last_id()
+
+    def read_since(self, offset=0, limit=None):
+        """returns the measurements appended after `offset`
+
+        Args:
+            offset (int, optional): the id of the last row the caller already has. Defaults to 0, which reads everything.
+            limit (int, optional): max number of rows. Defaults to None.
+
+        Returns:
+            tuple: (rows, offset) where rows is a list of measurement dicts and offset the id to pass in next time
+        """
+        sql = f"SELECT id, {', '.join(_SQL_COLUMNS.values())} FROM measurements WHERE id > ? ORDER BY id"
+        params = [offset]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            records = self._conn.execute(sql, params).fetchall()
+        rows = [dict(zip(COLUMNS, record[1:])) for record in records]
+        return rows, (records[-1][0] if records else offset)
+
+    def read_chunks(self, offset=0, chunk_size=10_000, min_height=None, max_height=None, min_bounce=None,
+                    max_bounce=None):
+        """reads the measurements after `offset` in chunks of at most `chunk_size` rows, for exports that shouldnt
+        hold the whole table in memory. it stops at the rows that were there when it started, so a long export
+        doesnt chase the appends. the lock is only held while a chunk is read
+
+        Args:
+            offset (int, optional): the id of the last row the caller already has. Defaults to 0.
+            chunk_size (int, optional): rows per chunk. Defaults to 10_000.
+            min_height, max_height (float, optional): only heights in this range (inclusive). Defaults to None.
+            min_bounce, max_bounce (int, optional): only bounce numbers in this range (inclusive). rows without a
+                bounce number are left out as soon as one of them is set. Defaults to None.
+
+        Yields:
+            List[tuple]: (id, *COLUMNS) per row, ordered by id
+        """
+        conditions, params = ["id > ?", "id <= ?"], []
+        for column, operator, value in (("height", ">=", min_height), ("height", "<=", max_height),
+                                        ("bounce_number", ">=", min_bounce), ("bounce_number", "<=", max_bounce)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        sql = (f"SELECT id, {', '.join(_SQL_COLUMNS.values())} FROM measurements WHERE {' AND '.join(conditions)} "
+               "ORDER BY id LIMIT ?")
+        until = self.last_offset()
+        while True:
+            with self._lock:
+                records = self._conn.execute(sql, [offset, until, *params, chunk_size]).fetchall()
+            if not records:
+                return
+            yield records
+            if len(records) < chunk_size:
+                return
+            offset = records[-1][0]
+
+    def load_arrays(self, offset=0):
+        """bulk loads the measurements after `offset` straight into numpy columns, without building a dict per row.
+        this is what startup reads the whole store with, see BounceDataset.from_columns()
+
+        Args:
+            offset (int, optional): the id of the last row the caller already has. Defaults to 0.
+
+        Returns:
+            tuple: (columns, offset) where columns maps 'id' and the COLUMNS to np.ndarray and offset is the id to
+                pass to read_since() next. the numbers are float64 with nan for a missing bounce number, the lap
+                time strings are object arrays with None for missing ones
+        """
+        with self._lock:
+            records = self._conn.execute(
+                f"SELECT id, {', '.join(_SQL_COLUMNS.values())} FROM measurements WHERE id > ? ORDER BY id",
+                (offset,)).fetchall()
+        values = list(zip(*records)) if records else [()] * (len(COLUMNS) + 1)
+        columns = {'id': np.array(values[0], dtype=np.int64)}
+        for column, column_values in zip(COLUMNS, values[1:]):
+            dtype = object if column in ("Total Time", "Interval Time") else np.float64
+            # None becomes nan in the float columns
+            columns[column] = np.array(column_values, dtype=dtype)
+        return columns, (records[-1][0] if records else offset)
+
+    def last_offset(self):
+        """the id of the newest row, 0 for an empty store"""
+        with self._lock:
+            return self._last_id()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _insert(self, rows, source):
+        now = time.time()
+        self._conn.executemany(
+            f"INSERT INTO measurements ({', '.join(_SQL_COLUMNS.values())}, source, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [tuple(row.get(column) for column in COLUMNS) + (source, now) for row in rows])
+
+    def _last_id(self):
+        return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM measurements").fetchone()[0]
+
+
+def from_csv_row(row):
+    """converts the strings csv.DictReader gives us to the right types"""
+    return {
+        "Height": int(row["Height"]),
+        "Bounce Number": int(row["Bounce Number"]),
+        "Total Time": row["Total Time"],
+        "Interval Time": row["Interval Time"],
+        "Total Time (ms)": int(row["Total Time (ms)"]),
+        "Interval Time (ms)": int(row["Interval Time (ms)"]),
+    }
@@ -0,0 +1,323 @@
+"""Search strategies for FortunaModel.calibrate.
+
+the original calibration draws a fixed number of uniform (a, b, c) candidates from [-1, 1] and keeps the best.
+the strategies here spend their budget where it matters instead: they start from a box that is derived from the
+scale of the data (so the intercept can actually reach the heights), move and resize it as they learn where the
+good parameters are, and stop as soon as the mse stops improving.
+
+every strategy scores a whole population of candidates per step through FortunaModel.score_candidates, so the
+numpy side stays vectorized. pick one by name from STRATEGIES:
+
+    model = FortunaModel(strategy="cma")
+    model.calibrate(data, epochs=5000)   # epochs is the evaluation budget, usually only a fraction gets used
+"""
+import math
+import time
+
+import numpy as np
+
+
+class SearchResult:
+    """what a search ended up with"""
+
+    def __init__(self, params, mse, evaluations, iterations, stopped):
+        self.params = params
+        self.mse = mse
+        self.evaluations = evaluations
+        self.iterations = iterations
+        self.stopped = stopped
+
+    def as_dict(self):
+        return {
+            "params": self.params,
+            "mse": self.mse,
+            "evaluations": self.evaluations,
+            "iterations": self.iterations,
+            "stopped": self.stopped,
+        }
+
+
+class Objective:
+    """wraps the scoring function with the budget. counts every candidate it scores, remembers the best one and
+    cuts a population short when it would go over the evaluation budget
+    """
+
+    def __init__(self, score, max_evaluations=None, max_seconds=None):
+        """
+        Args:
+            score (Callable[[np.ndarray], np.ndarray]): (K, 3) candidates -> (K,) mses
+            max_evaluations (int, optional): evaluation budget. Defaults to None (no limit).
+            max_seconds (float, optional): wall clock budget. Defaults to None (no limit).
+        """
+        self.score = score
+        self.max_evaluations = max_evaluations
+        self.deadline = time.monotonic() + max_seconds if max_seconds else None
+        self.evaluations = 0
+        self.best_params = None
+        self.best_mse = float('inf')
+
+    def remaining(self):
+        """evaluations left, None if there is no evaluation budget"""
+        if self.max_evaluations is None:
+            return None
+        return max(self.max_evaluations - self.evaluations, 0)
+
+    def exhausted(self):
+        if self.remaining() == 0:
+            return "evaluations"
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time"
+        return None
+
+    def __call__(self, candidates):
+        """scores candidates
+
+        Returns:
+            tuple: (candidates, mses), candidates may be cut short by the budget
+        """
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=np.float64))
+        room = self.remaining()
+        if room is not None:
+            candidates = candidates[:room]
+        if len(candidates) == 0:
+            return candidates, np.empty(0)
+        mses = self.score(candidates)
+        self.evaluations += len(candidates)
+        best = int(np.argmin(mses))
+        if mses[best] < self.best_mse:
+            self.best_mse = float(mses[best])
+            self.best_params = candidates[best].tolist()
+        return candidates, mses
+
+
+class Plateau:
+    """early stopping: stalls once the best mse improved by less than `tolerance` (relative) for `patience` steps in a row"""
+
+    def __init__(self, patience=10, tolerance=1e-6):
+        self.patience = patience
+        self.tolerance = tolerance
+        self.best = float('inf')
+        self.stale = 0
+
+    def stalled(self, mse):
+        if mse < self.best - self.tolerance * abs(self.best) or self.best == float('inf'):
+            self.best = mse
+            self.stale = 0
+        else:
+            self.stale += 1
+        return self.stale >= self.patience
+
+
+def initial_bounds(X, y):
+    """a box around the origin that is wide enough for the scale of the data.
+
+    a and b have to turn milliseconds into centimeters, so their range follows height / time. the intercept has
+    to be able to reach the heights themselves. the box never gets smaller than the old [-1, 1]
+
+    Returns:
+        tuple: (center, half_width), both (3,) arrays
+    """
+    height = float(np.max(np.abs(y))) if len(y) else 1.0
+    times = np.mean(np.abs(X), axis=0) if len(X) else np.ones(2)
+    half_width = np.array([
+        2 * height / max(times[0], 1e-9),
+        2 * height / max(times[1], 1e-9),
+        2 * height,
+    ])
+    return np.zeros(3), np.maximum(half_width, 1.0)
+
+
+class SearchStrategy:
+    """base class. a strategy keeps its state on the instance, so use a new instance per search"""
+    name = None
+
+    def __init__(self, population=32, patience=10, tolerance=1e-6):
+        """
+        Args:
+            population (int, optional): candidates scored per step. Defaults to 32.
+            patience (int, optional): steps without improvement before stopping. Defaults to 10.
+            tolerance (float, optional): relative improvement that still counts. Defaults to 1e-6.
+        """
+        self.population = population
+        self.patience = patience
+        self.tolerance = tolerance
+
+    def search(self, objective, start, bounds, rng):
+        """runs the search until the budget is used up or the mse plateaus
+
+        Args:
+            objective (Objective): scores the candidates and keeps track of the budget
+            start (np.ndarray|None): (3,) params to start from, e.g the current best. None starts in the middle of the box
+            bounds (tuple): (center, half_width) from initial_bounds()
+            rng (np.random.Generator): the randomness of the search
+
+        Returns:
+            SearchResult
+        """
+        center, half_width = (np.asarray(b, dtype=np.float64) for b in bounds)
+        start = center.copy() if start is None else np.asarray(start, dtype=np.float64)
+        self.begin(objective, start, half_width, rng)
+        plateau = Plateau(self.patience, self.tolerance)
+        iterations = 0
+        stopped = objective.exhausted()
+        while stopped is None:
+            self.step(objective, rng)
+            iterations += 1
+            stopped = objective.exhausted()
+            if stopped is None and plateau.stalled(objective.best_mse):
+                stopped = "plateau"
+        return SearchResult(objective.best_params, objective.best_mse, objective.evaluations, iterations, stopped)
+
+    def begin(self, objective, start, half_width, rng):
+        raise NotImplementedError
+
+    def step(self, objective, rng):
+        raise NotImplementedError
+
+
+class RandomSearch(SearchStrategy):
+    """uniform sampling in a box around the best candidate so far. the box shrinks while a step brings nothing
+    and grows back when it finds something better
+    """
+    name = "random"
+
+    def begin(self, objective, start, half_width, rng):
+        self.center = start
+        self.half_width = half_width
+        objective(start)
+
+    def step(self, objective, rng):
+        before = objective.best_mse
+        objective(self.center + rng.uniform(-1, 1, size=(self.population, 3)) * self.half_width)
+        if objective.best_mse < before:
+            self.center = np.asarray(objective.best_params)
+            self.half_width = self.half_width * 1.2
+        else:
+            self.half_width = self.half_width * 0.7
+
+
+class CoordinateDescent(SearchStrategy):
+    """pattern search: line searches along one parameter at a time, then along the direction the whole sweep moved.
+    every line search tries a spread of step sizes in a single batch, the step size of an axis doubles when it moved
+    and halves when it didnt. a and b are strongly correlated, so the axes alone zigzag down the narrow valley
+    between them; the pattern move (hooke-jeeves) follows the valley instead. one step is a full sweep, so the
+    patience counts sweeps and not single axes
+    """
+    name = "coordinate"
+
+    MULTIPLIERS = np.array([-8.0, -4.0, -2.0, -1.0, -0.5, -0.25, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0])
+
+    # how far along the direction of the last sweep the pattern move looks
+    PATTERN = np.array([0.5, 1.0, 2.0, 4.0, 8.0, 16.0])
+
+    def begin(self, objective, start, half_width, rng):
+        self.x = start
+        self.fx = float(objective(start)[1][0])
+        self.steps = half_width / 4
+
+    def step(self, objective, rng):
+        before = self.x.copy()
+        for axis in range(3):
+            direction = np.zeros(3)
+            direction[axis] = self.steps[axis]
+            if self._line_search(objective, direction, self.MULTIPLIERS):
+                self.steps[axis] *= 2
+            else:
+                self.steps[axis] *= 0.5
+        moved = self.x - before
+        if np.any(moved):
+            self._line_search(objective, moved, self.PATTERN)
+
+    def _line_search(self, objective, direction, multipliers):
+        """moves to the best of x + multiplier * direction if it beats x
+
+        Returns:
+            bool: whether x moved
+        """
+        candidates, mses = objective(self.x + multipliers[:, None] * direction)
+        if len(mses) and mses.min() < self.fx:
+            best = int(np.argmin(mses))
+            self.x, self.fx = candidates[best], float(mses[best])
+            return True
+        return False
+
+
+class SimulatedAnnealing(SearchStrategy):
+    """gaussian moves from the current point. worse moves are taken with probability exp(-delta / temperature)
+    so it can leave a bad valley early on, the temperature and the step size cool down over time
+    """
+    name = "anneal"
+
+    def __init__(self, population=32, patience=15, tolerance=1e-6, cooling=0.9):
+        super().__init__(population, patience, tolerance)
+        self.cooling = cooling
+
+    def begin(self, objective, start, half_width, rng):
+        self.x = start
+        self.fx = float(objective(start)[1][0])
+        self.sigma = half_width / 2
+        self.temperature = max(self.fx, 1.0) * 0.1
+
+    def step(self, objective, rng):
+        candidates, mses = objective(self.x + rng.normal(size=(self.population, 3)) * self.sigma)
+        if len(mses):
+            best = int(np.argmin(mses))
+            delta = float(mses[best]) - self.fx
+            if delta < 0 or rng.random() < math.exp(-delta / max(self.temperature, 1e-300)):
+                self.x, self.fx = candidates[best], float(mses[best])
+            self.sigma = self.sigma * (1.2 if delta < 0 else 0.7)
+        self.temperature *= self.cooling
+
+
+class AdaptiveSampling(SearchStrategy):
+    """cma-es style: samples a population from a multivariate normal, moves the mean to the weighted best quarter
+    and learns the covariance from where the good candidates were. the covariance soaks up the very different
+    scales of a, b and c and the correlation between them. a population without any improvement shrinks the step
+    size around the best point instead
+    """
+    name = "cma"
+
+    def begin(self, objective, start, half_width, rng):
+        self.mean = start
+        self.cov = np.diag((half_width / 2) ** 2)
+        self.sigma = 1.0
+        objective(start)
+        elite = max(2, self.population // 4)
+        weights = np.log(elite + 0.5) - np.log(np.arange(1, elite + 1))
+        self.weights = weights / weights.sum()
+        # how much of the covariance is replaced by what this step saw
+        self.learning_rate = 0.3
+
+    def step(self, objective, rng):
+        try:
+            root = np.linalg.cholesky(self.cov)
+        except np.linalg.LinAlgError:
+            root = np.diag(np.sqrt(np.abs(np.diag(self.cov))) + 1e-12)
+        before = objective.best_mse
+        candidates, mses = objective(self.mean + self.sigma * rng.normal(size=(self.population, 3)) @ root.T)
+        if len(mses) < len(self.weights):
+            return
+        if objective.best_mse >= before:
+            # nothing better in this population: go back to the best point and look closer around it
+            self.mean = np.asarray(objective.best_params)
+            self.sigma *= 0.7
+            return
+        order = np.argsort(mses)[:len(self.weights)]
+        deviations = (candidates[order] - self.mean) / self.sigma
+        self.mean = self.mean + self.sigma * (self.weights @ deviations)
+        self.cov = (1 - self.learning_rate) * self.cov + self.learning_rate * (deviations.T * self.weights) @ deviations
+        self.sigma *= 1.2
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (RandomSearch, CoordinateDescent, SimulatedAnnealing, AdaptiveSampling)}
+
+
+def make_strategy(name, **options):
+    """a fresh strategy instance by name
+
+    Raises:
+        ValueError: for unknown names
+    """
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown search strategy {name!r}, expected one of {tuple(STRATEGIES)}")
+    return STRATEGIES[name](**options)
@@ -0,0 +1,25 @@
+import importlib
+import os
+import shutil
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """src.main on a throw away database and params file. imported once, the module sets the app up on import"""
+    workdir = tmp_path_factory.mktemp("app")
+    shutil.copy("assets/best_params.json", workdir / "best_params.json")
+    os.environ.update({
+        "TENNISCALE_DB": str(workdir / "measurements.sqlite3"),
+        "TENNISCALE_PARAMS_FILE": str(workdir / "best_params.json"),
+        "TENNISCALE_CALIBRATION_DEBOUNCE": "0.05",
+    })
+    return importlib.import_module("src.main")
+
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    from fastapi.testclient import TestClient
+    with TestClient(app_module.app) as client:
+        yield client
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+
+def _parse(app_module, body, content_type):
+    return app_module.parse_batch_body(body if isinstance(body, bytes) else body.encode(), content_type)
+
+
+def test_json_body(app_module):
+    X = _parse(app_module, json.dumps({"total_time_ms": [800, 1600], "interval_time_ms": [300, 600]}),
+               "application/json")
+    np.testing.assert_array_equal(X, [[800, 300], [1600, 600]])
+
+
+def test_ndjson_objects_and_pairs(app_module):
+    body = '{"total_time_ms": 800, "interval_time_ms": 300}\n\n[1600, 600]\n'
+    np.testing.assert_array_equal(_parse(app_module, body, "application/x-ndjson"), [[800, 300], [1600, 600]])
+
+
+def test_binary_body(app_module):
+    pairs = np.array([[800.0, 300.0], [1600.0, 600.0]])
+    np.testing.assert_array_equal(_parse(app_module, pairs.astype("<f8").tobytes(), "application/octet-stream"), pairs)
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ("[1, 2, 3]\n[4, 5, 6]\n", "application/x-ndjson"),
+    ("[1]\n", "application/x-ndjson"),
+    ("7\n", "application/x-ndjson"),
+    ('{"total_time_ms": 1}\n', "application/x-ndjson"),
+    ('{"total_time_ms": [1, 2], "interval_time_ms": [1]}', "application/json"),
+    ('{"total_time_ms": [NaN], "interval_time_ms": [1]}', "application/json"),
+    ("[Infinity, 1]\n", "application/x-ndjson"),
+    (np.array([np.nan, 1.0]).tobytes(), "application/octet-stream"),
+    (b"\x00" * 12, "application/octet-stream"),
+])
+def test_bad_bodies_are_rejected(app_module, body, content_type):
+    with pytest.raises(HTTPException) as error:
+        _parse(app_module, body, content_type)
+    assert error.value.status_code == 422
+
+
+def test_unknown_content_type(app_module):
+    with pytest.raises(HTTPException) as error:
+        _parse(app_module, "1,2", "text/csv")
+    assert error.value.status_code == 415
+
+
+def test_endpoint_answers_nan_with_422(client):
+    response = client.post("/api/v1/predict/batch", content=b'{"total_time_ms": [NaN], "interval_time_ms": [1]}',
+                           headers={"content-type": "application/json"})
+    assert response.status_code == 422
+    response = client.post("/api/v1/predict/batch", json={"total_time_ms": [800], "interval_time_ms": [300]})
+    assert response.status_code == 200
+    assert response.json()["count"] == 1
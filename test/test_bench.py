@@ -0,0 +1,32 @@
+from src.bench import compare, measure
+
+
+def result(min_s, median_s, name="fortuna.fit", rows=100):
+    return {"name": name, "rows": rows, "min_s": min_s, "median_s": median_s}
+
+
+def test_measure_loops_fast_functions():
+    timing = measure(lambda: sum(range(10)), repeat=3, min_time=0.01)
+    assert timing["loops"] >= 100 and timing["repeat"] == 3
+    assert 0 < timing["min_s"] <= timing["median_s"] < 0.01
+
+
+def test_compare_flags_slowdowns_above_the_noise():
+    baseline = {"results": [result(0.010, 0.011)]}
+    [entry] = compare([result(0.015, 0.016)], baseline, threshold=0.2)
+    assert entry["regression"] and entry["ratio"] == 1.5
+    # 30% slower, but the runs scatter more than that
+    [entry] = compare([result(0.013, 0.020)], baseline, threshold=0.2)
+    assert not entry["regression"] and entry["noise_s"] == 0.020 - 0.013
+    # 50% slower, but only by half a microsecond per call
+    [entry] = compare([result(1.5e-6, 1.5e-6)], {"results": [result(1e-6, 1e-6)]}, threshold=0.2)
+    assert not entry["regression"]
+
+
+def test_compare_uses_the_min_by_default():
+    baseline = {"results": [result(0.010, 0.010)]}
+    # one slow run drags the median up, the fastest run is as fast as before
+    [entry] = compare([result(0.010, 0.030)], baseline, threshold=0.2)
+    assert not entry["regression"] and entry["ratio"] == 1.0
+    [entry] = compare([result(0.020, 0.020)], baseline, threshold=0.2, statistic="median_s", noise_floor=0)
+    assert entry["regression"]
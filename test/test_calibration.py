@@ -0,0 +1,104 @@
+import threading
+import time
+
+import numpy as np
+
+from src.calibration import CalibrationService
+from src.dataset import BounceDataset
+from src.fortuna import FortunaModel
+
+
+def _dataset():
+    rng = np.random.default_rng(0)
+    return BounceDataset({'Height': h, 'Bounce Number': None, 'Total Time': None, 'Interval Time': None,
+                          'Total Time (ms)': 8.0 * h + rng.normal(), 'Interval Time (ms)': 3.0 * h + rng.normal()}
+                         for h in rng.uniform(20, 200, 50))
+
+
+def _service(tmp_path, **kwargs):
+    model = FortunaModel(params_file=str(tmp_path / "params.json"), solver="lstsq")
+    data = _dataset()
+    published = []
+    service = CalibrationService(model, data.snapshot, on_publish=lambda: published.append(model.snapshot),
+                                 **kwargs)
+    return service, model, published
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_a_burst_of_requests_is_one_run(tmp_path):
+    service, model, published = _service(tmp_path, debounce=0.1)
+    service.start()
+    for _ in range(5):
+        service.request("test")
+    assert service.queue_depth() == 5
+    _wait(lambda: service.runs == 1)
+    time.sleep(0.2)
+    service.stop()
+    assert service.runs == 1 and service.coalesced == 4
+    assert service.queue_depth() == 0
+    assert len(published) == 1 and model.snapshot.params is not None
+
+
+def test_a_steady_stream_of_requests_still_gets_a_run(tmp_path):
+    service, model, published = _service(tmp_path, debounce=0.2, max_delay=0.3)
+    service.start()
+    started = time.monotonic()
+    while service.runs == 0:
+        assert time.monotonic() - started < 3.0, "the debounce never ended"
+        service.request("stream")
+        time.sleep(0.05)  # always within the debounce of the last request
+    assert time.monotonic() - started < 1.0
+    service.stop()
+
+
+def test_errors_are_reported_and_the_worker_keeps_going(tmp_path):
+    service, model, published = _service(tmp_path, debounce=0.01)
+    calls = []
+
+    def broken():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("no data")
+        return _dataset()
+    service.data_provider = broken
+    service.start()
+    service.request()
+    _wait(lambda: service.runs == 1)
+    assert "no data" in service.status()["last_error"]
+    service.request()
+    _wait(lambda: service.runs == 2 and not service.running)
+    assert service.status()["last_error"] is None
+    service.stop()
+
+
+def test_a_finishing_run_doesnt_drop_rows_an_update_added(tmp_path):
+    service, model, published = _service(tmp_path)
+    data = _dataset()
+    model.calibrate(data)
+    staging = model.staging_copy()
+    baseline = staging.snapshot
+    staging.calibrate(data)  # the run, it doesnt know about the row below
+    service.update([{'Height': 100.0, 'Total Time (ms)': 800.0, 'Interval Time (ms)': 300.0}])
+    updated = model.snapshot
+    assert model.qr.n == 51 and published == [updated]
+    service.publish(staging, baseline)
+    assert model.qr.n == 51 and model.snapshot is updated
+
+
+def test_updates_wait_for_a_publish_in_progress(tmp_path):
+    service, model, published = _service(tmp_path)
+    model.calibrate(_dataset())
+    row = {'Height': 100.0, 'Total Time (ms)': 800.0, 'Interval Time (ms)': 300.0}
+    with service._publish_lock:
+        updater = threading.Thread(target=service.update, args=([row],))
+        updater.start()
+        time.sleep(0.05)
+        assert model.qr.n == 50
+    updater.join()
+    assert model.qr.n == 51
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src.dataset import BounceDataset
+from src.store import COLUMNS
+
+
+def measurement(height, bounce=1, total=1000.0):
+    return {'Height': height, 'Bounce Number': bounce, 'Total Time': "00:01.00", 'Interval Time': None,
+            'Total Time (ms)': total, 'Interval Time (ms)': 700.5}
+
+
+def test_rows_come_back_as_they_went_in():
+    rows = [measurement(100), measurement(150.5, None, 1234.5)]
+    dataset = BounceDataset(rows)
+    assert len(dataset) == 2 and dataset.rows() == rows
+    assert dataset[-1] == rows[1] and isinstance(dataset[0]['Height'], int)
+    with pytest.raises(IndexError):
+        dataset[2]
+    assert list(dataset.to_frame().columns) == list(COLUMNS)
+
+
+def test_growing_keeps_the_rows_and_the_views_handed_out():
+    dataset = BounceDataset(capacity=2)
+    dataset.append(measurement(100))
+    X, y = dataset.arrays()
+    snapshot = dataset.snapshot()
+    dataset.extend(measurement(100 + i, total=1000.0 + i) for i in range(1, 10))
+
+    assert dataset.capacity == 16 and len(dataset) == 10
+    np.testing.assert_array_equal(dataset.column('Height'), np.arange(100, 110))
+    np.testing.assert_array_equal(dataset.arrays()[0][:, 0], 1000.0 + np.arange(10))
+    # the views and the snapshot from before still show the one row they had
+    assert X.shape == (1, 2) and y.tolist() == [100.0]
+    assert len(snapshot) == 1 and snapshot.rows() == [measurement(100)]
+    assert not X.flags.writeable and X.flags.c_contiguous
+
+
+def test_snapshots_dont_see_later_appends_and_are_read_only():
+    dataset = BounceDataset([measurement(100), measurement(150)])
+    snapshot = dataset.snapshot()
+    first = dataset[:1]
+    dataset.append(measurement(200))
+    assert len(snapshot) == 2 and [row['Height'] for row in snapshot] == [100, 150]
+    assert snapshot.arrays()[1].tolist() == [100.0, 150.0]
+    assert len(first) == 1 and len(dataset) == 3
+    with pytest.raises(ValueError):
+        snapshot.append(measurement(300))
+
+
+def test_from_columns_mask_and_select():
+    columns = {
+        'id': np.arange(4),
+        'Height': np.array([100.0, 100.0, 150.0, 150.0]),
+        'Bounce Number': np.array([1.0, 5.0, np.nan, 2.0]),
+        'Total Time': np.array(["a", None, "c", "d"], dtype=object),
+        'Interval Time': np.array([None] * 4, dtype=object),
+        'Total Time (ms)': np.array([1.0, 2.0, 3.0, 4.0]),
+        'Interval Time (ms)': np.array([5.0, 6.0, 7.0, 8.0]),
+    }
+    dataset = BounceDataset.from_columns(columns)
+    assert len(dataset) == 4 and dataset[2]['Bounce Number'] is None and dataset[1]['Total Time'] is None
+    mask = dataset.mask(4)
+    assert mask.tolist() == [True, False, True, True]
+    selected = dataset.select(mask)
+    assert [row['Total Time (ms)'] for row in selected] == [1, 3, 4]
+    # a selection is a dataset of its own that can grow
+    selected.append(measurement(200))
+    assert len(selected) == 4 and len(dataset) == 4
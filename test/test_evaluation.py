@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import src.evaluation
+from src.evaluation import Evaluator, make_folds
+
+LSTSQ = {"solver": "lstsq", "ridge": 0.0, "strategy": None, "epochs": 10}
+
+
+def drops(count=12, bounces=3):
+    """`count` drops of `bounces` rows each, the height follows the features exactly"""
+    rows, drop_ids = [], []
+    rng = np.random.default_rng(1)
+    for drop in range(count):
+        for _ in range(bounces):
+            total, interval = rng.uniform(500, 3000), rng.uniform(200, 800)
+            rows.append({'Height': 0.01 * total + 0.2 * interval + 50, 'Bounce Number': None,
+                         'Total Time (ms)': total, 'Interval Time (ms)': interval})
+            drop_ids.append(drop)
+    return rows, np.array(drop_ids)
+
+
+def test_kfold_never_splits_a_drop():
+    drop_ids = np.repeat(np.arange(11), [1, 2, 3, 4, 1, 2, 3, 4, 1, 2, 3])
+    folds = make_folds(drop_ids, np.zeros(len(drop_ids)), "kfold", k=4, seed=3)
+    assert len(folds) == 4
+    held_out = np.sum([mask for _, mask in folds], axis=0)
+    # every row is held out exactly once
+    assert held_out.tolist() == [1] * len(drop_ids)
+    for _, mask in folds:
+        for drop in np.unique(drop_ids[mask]):
+            assert mask[drop_ids == drop].all()
+    # the split only depends on the seed
+    again = make_folds(drop_ids, np.zeros(len(drop_ids)), "kfold", k=4, seed=3)
+    assert all((a == b).all() for (_, a), (_, b) in zip(folds, again))
+
+
+def test_kfold_is_capped_at_the_number_of_drops():
+    assert len(make_folds(np.array([0, 0, 1, 2]), np.zeros(4), "kfold", k=10)) == 3
+    with pytest.raises(ValueError):
+        make_folds(np.array([0, 0, 0]), np.zeros(3), "kfold")
+    with pytest.raises(ValueError):
+        make_folds(np.array([0, 1]), np.zeros(2), "random")
+
+
+def test_leave_one_height_out():
+    heights = np.array([150.0, 100.0, 150.0, 200.5])
+    folds = make_folds(np.arange(4), heights, "height")
+    assert [(name, mask.tolist()) for name, mask in folds] == [
+        ("height=150", [True, False, True, False]),
+        ("height=100", [False, True, False, False]),
+        ("height=200.5", [False, False, False, True]),
+    ]
+
+
+def test_fold_results_are_cached_per_version(monkeypatch):
+    runs = []
+    run_fold = src.evaluation.run_fold
+    monkeypatch.setattr(src.evaluation, "run_fold", lambda *args: runs.append(1) or run_fold(*args))
+    rows, drop_ids = drops()
+    evaluator = Evaluator()
+
+    report = evaluator.evaluate(LSTSQ, rows, drop_ids, version=1, k=4)
+    assert len(runs) == 4 and len(report["folds"]) == 4
+    assert report["overall"]["count"] == len(rows)
+    # the data is exactly linear, so the held out drops are predicted exactly too
+    assert report["overall"]["max_abs"] < 1e-6
+    assert sum(fold["test_rows"] for fold in report["folds"]) == len(rows)
+
+    assert evaluator.evaluate(LSTSQ, rows, drop_ids, version=1, k=4) == report
+    assert len(runs) == 4
+    evaluator.evaluate(LSTSQ, rows, drop_ids, version=2, k=4)
+    assert len(runs) == 8
+
+
+def test_evaluate_endpoint(client):
+    report = client.get("/api/v1/evaluate", params={"scheme": "height"}).json()
+    assert report["scheme"] == "height" and report["folds"]
+    assert sum(fold["test_rows"] for fold in report["folds"]) == report["overall"]["count"]
+    assert client.get("/api/v1/evaluate", params={"scheme": "random"}).status_code == 422
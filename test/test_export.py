@@ -0,0 +1,71 @@
+import csv
+import io
+
+import pytest
+
+from src.export import EXPORT_COLUMNS
+
+
+def measurement(height, bounce):
+    return {'Height': height, 'Bounce Number': bounce, 'Total Time': "00:00.70", 'Interval Time': "00:00.70",
+            'Total Time (ms)': 700, 'Interval Time (ms)': 700}
+
+
+@pytest.fixture(scope="module")
+def exported(app_module):
+    """rows only this module adds, everything is exported from the offset before them"""
+    offset = app_module.store.last_offset()
+    app_module.store.append_many([measurement(5000 + i, i % 4 + 1) for i in range(25)], source="test")
+    # into the app as well, or the next test that stores a row would find them on top of its own
+    app_module.catch_up()
+    return offset
+
+
+def export_csv(client, **params):
+    response = client.get("/api/v1/export", params=dict(format="csv", **params))
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv")
+    return list(csv.reader(io.StringIO(response.text)))
+
+
+def test_csv_export_in_chunks(client, exported):
+    rows = export_csv(client, offset=exported, chunk_rows=10)
+    assert tuple(rows[0]) == EXPORT_COLUMNS
+    assert [int(row[0]) for row in rows[1:]] == list(range(exported + 1, exported + 26))
+    assert [row[1] for row in rows[1:3]] == ["5000", "5001"]
+    # the same rows no matter how they are chunked
+    assert export_csv(client, offset=exported, chunk_rows=7) == rows
+
+
+def test_offset_returns_only_what_came_after(client, exported):
+    rows = export_csv(client, offset=exported + 20)
+    assert [int(row[0]) for row in rows[1:]] == list(range(exported + 21, exported + 26))
+
+
+def test_range_filters(client, exported):
+    rows = export_csv(client, offset=exported, min_height=5010, max_height=5019, min_bounce=2, max_bounce=3)
+    assert [(row[1], row[2]) for row in rows[1:]] == [(str(5000 + i), str(i % 4 + 1)) for i in range(10, 20)
+                                                      if i % 4 + 1 in (2, 3)]
+
+
+def test_bad_requests(client):
+    assert client.get("/api/v1/export", params={"format": "xml"}).status_code == 422
+    assert client.get("/api/v1/export", params={"chunk_rows": 0}).status_code == 422
+    assert client.get("/api/v1/export", params={"profile": "nobody-has-this"}).status_code == 404
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_arrow_formats(client, exported, format):
+    pa = pytest.importorskip("pyarrow")
+    response = client.get("/api/v1/export", params={"format": format, "offset": exported, "chunk_rows": 10})
+    assert response.status_code == 200
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(pa.BufferReader(response.content))
+        assert parquet.num_row_groups == 3  # one per chunk
+        table = parquet.read()
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == list(EXPORT_COLUMNS)
+    assert table.column("id").to_pylist() == list(range(exported + 1, exported + 26))
+    assert table.column("Height").to_pylist() == [5000.0 + i for i in range(25)]
+    assert table.column("Bounce Number").to_pylist()[:5] == [1, 2, 3, 4, 1]
@@ -0,0 +1,54 @@
+import numpy as np
+
+from src.groups import GroupIndex, RunningStats
+
+
+def bounce(height, number, interval):
+    return {'Height': height, 'Bounce Number': number, 'Total Time (ms)': 1000 + interval,
+            'Interval Time (ms)': interval}
+
+
+def test_drops_and_heights():
+    rows = [bounce(100, 1, 700), bounce(100, 2, 600), bounce(100, 1, 710), bounce(150, 1, 800),
+            bounce(150, None, 790)]
+    index = GroupIndex(rows)
+    assert index.heights() == [100, 150] and index.drop_count() == 4
+    assert index.drop_ids().tolist() == [0, 0, 1, 2, 3]
+    group = index.height(100)
+    assert len(group) == 3 and group.positions.tolist() == [0, 1, 2]
+    np.testing.assert_array_equal(group.arrays()['Interval Time (ms)'], [700, 600, 710])
+    assert np.isnan(index.height(150).arrays()['Bounce Number'][1])
+
+
+def test_arrays_are_views_that_dont_change_when_the_group_grows():
+    index = GroupIndex()
+    index.append(bounce(100, 1, 700))
+    before = index.height(100).arrays()
+    for number in range(2, 40):
+        index.append(bounce(100, number, 700 - number))
+    assert len(before['Interval Time (ms)']) == 1 and before['Interval Time (ms)'][0] == 700
+    after = index.height(100).arrays()['Interval Time (ms)']
+    assert len(after) == 39 and after[-1] == 661 and not after.flags.writeable
+    assert index.height(100).positions.tolist() == list(range(39))
+
+
+def test_running_stats_keep_their_digits_with_a_large_mean():
+    values = 1e9 + np.array([0.5, 1.5, 2.5, 3.5])
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    stats.add(None)
+    assert stats.count == 4
+    assert stats.mean() == values.mean()
+    assert abs(stats.variance() - values.var()) < 1e-9
+    assert stats.as_dict()["std"] == np.sqrt(stats.variance())
+    assert (stats.min, stats.max) == (values[0], values[-1])
+
+
+def test_stats_and_groups_report_the_same_heights(client):
+    for dataset in ("full", "model"):
+        stats = client.get("/api/v1/stats", params={"dataset": dataset}).json()
+        groups = client.get("/api/v1/groups", params={"dataset": dataset}).json()
+        assert stats["heights"] == groups["heights"] and stats["rows"] == groups["rows"]
+        first = stats["heights"][0]["Interval Time (ms)"]
+        assert abs(first["variance"] - first["std"] ** 2) < 1e-6
@@ -0,0 +1,108 @@
+import gzip
+
+import pytest
+
+from src.http_cache import IMMUTABLE, AssetCache, CachedBody, PageCache, choose_encoding, etag_matches
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+
+def test_choose_encoding():
+    assert choose_encoding(None) is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("deflate") is None
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("gzip, br", available=("br", "gzip")) == "br"
+    assert choose_encoding("gzip, br;q=0", available=("br", "gzip")) == "gzip"
+
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('"b", W/"a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_bodies_are_compressed_from_the_minimum_size_on():
+    body = CachedBody("x" * 2000, "text/plain", min_size=1000)
+    response = body.response(FakeRequest(accept_encoding="gzip"))
+    assert response.headers["content-encoding"] == "gzip" and response.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.body) == body.body
+    # the compressed variant is another representation with its own etag
+    assert response.headers["etag"] == f'"{body.digest}-gzip"'
+    plain = body.response(FakeRequest())
+    assert plain.body == body.body and plain.headers["etag"] == body.etag and "content-encoding" not in plain.headers
+
+    assert "content-encoding" not in CachedBody("x" * 999, "text/plain", 1000).response(
+        FakeRequest(accept_encoding="gzip")).headers
+    assert "content-encoding" not in CachedBody(b"x" * 2000, "image/png", 1000).response(
+        FakeRequest(accept_encoding="gzip")).headers
+
+
+def test_if_none_match_gets_an_empty_304():
+    body = CachedBody("x" * 2000, "text/plain", min_size=1000)
+    etag = body.response(FakeRequest(accept_encoding="gzip")).headers["etag"]
+    response = body.response(FakeRequest(accept_encoding="gzip", if_none_match=etag), cache_control=IMMUTABLE)
+    assert response.status_code == 304 and response.body == b""
+    assert response.headers["etag"] == etag and response.headers["cache-control"] == IMMUTABLE
+    # the uncompressed representation has a different etag
+    assert body.response(FakeRequest(if_none_match=etag)).status_code == 200
+
+
+def test_brotli_is_preferred_when_its_installed():
+    brotli = pytest.importorskip("brotli")
+    body = CachedBody("x" * 2000, "text/plain", min_size=1000)
+    response = body.response(FakeRequest(accept_encoding="gzip, br"))
+    assert response.headers["content-encoding"] == "br" and brotli.decompress(response.body) == body.body
+
+
+def test_page_cache_renders_a_key_once():
+    renders = []
+    pages = PageCache(max_entries=2)
+    render = lambda key: lambda: renders.append(key) or f"page {key}"
+    assert pages.get(1, render(1)) is pages.get(1, render(1))
+    pages.get(2, render(2))
+    pages.get(3, render(3))
+    assert pages.get(1, render(1)).body == b"page 1"
+    assert renders == [1, 2, 3, 1]
+
+
+def test_asset_urls_change_with_the_content(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "app.js").write_text("one")
+    (tmp_path / "secret.txt").write_text("secret")
+    assets = AssetCache(str(tmp_path / "assets"))
+    first = assets.url("app.js")
+    assert first == f"/assets/app.js?v={assets.get('app.js').version}"
+    # a different size, so its noticed even within the resolution of the mtime
+    (tmp_path / "assets" / "app.js").write_text("two!")
+    assert assets.url("app.js") != first and assets.get("app.js").body == b"two!"
+    assert assets.url("missing.js") == "/assets/missing.js"
+    assert assets.get("../secret.txt") is None
+
+
+def test_hashed_asset_urls_are_immutable(client):
+    page = client.get("/")
+    assert page.status_code == 200
+    url = next(part.split('"')[0] for part in page.text.split('src="')[1:] if part.startswith("/assets/timer.js?v="))
+    with open("assets/timer.js", "rb") as f:
+        timer = f.read()
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and response.content == timer
+    assert response.headers["cache-control"] == IMMUTABLE and response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].split(";")[0] in ("text/javascript", "application/javascript")
+
+    unversioned = client.get("/assets/timer.js", headers={"Accept-Encoding": "gzip"})
+    assert unversioned.headers["cache-control"] == "no-cache"
+    revalidated = client.get("/assets/timer.js", headers={"Accept-Encoding": "gzip",
+                                                         "If-None-Match": unversioned.headers["etag"]})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+
+    assert client.get("/", headers={"If-None-Match": page.headers["etag"]}).status_code == 304
+    assert client.get("/assets/nothing.js").status_code == 404
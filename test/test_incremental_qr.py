@@ -0,0 +1,71 @@
+import numpy as np
+
+from src.fortuna import IncrementalQR
+
+
+def _data(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(100, 3000, size=(n, 2))
+    y = 0.05 * X[:, 0] - 0.02 * X[:, 1] + 7 + rng.normal(0, 1, n)
+    return X, y
+
+
+def test_solve_matches_numpy_lstsq():
+    X, y = _data()
+    qr = IncrementalQR()
+    qr.add_many(X, y)
+    design = np.column_stack([X, np.ones(len(X))])
+    expected, rss, _, _ = np.linalg.lstsq(design, y, rcond=None)
+    np.testing.assert_allclose(qr.solve(), expected, rtol=1e-8)
+    assert np.isclose(qr.mse(qr.solve()), rss[0] / len(X))
+
+
+def test_single_rows_and_batches_agree():
+    X, y = _data()
+    one_by_one, batched = IncrementalQR(), IncrementalQR()
+    for (x1, x2), target in zip(X, y):
+        one_by_one.add(x1, x2, target)
+    batched.add_many(X[:50], y[:50])
+    batched.add_many(X[50:], y[50:])
+    np.testing.assert_allclose(one_by_one.solve(), batched.solve(), rtol=1e-8)
+    assert one_by_one.n == batched.n == len(X)
+
+
+def test_collinear_rows_give_the_minimum_norm_solution():
+    # only first bounces: the total time is the interval time
+    rng = np.random.default_rng(1)
+    t = rng.uniform(100, 900, 50)
+    X = np.column_stack([t, t])
+    y = 0.3 * t + 20 + rng.normal(0, 5, 50)
+    design = np.column_stack([X, np.ones(len(X))])
+    expected = np.linalg.lstsq(design, y, rcond=None)[0]
+    for add in ("add_many", "add"):
+        qr = IncrementalQR()
+        if add == "add_many":
+            qr.add_many(X, y)
+        else:
+            for (x1, x2), target in zip(X, y):
+                qr.add(x1, x2, target)
+        np.testing.assert_allclose(qr.solve(), expected, rtol=1e-6)
+
+
+def test_constant_interval_is_rank_deficient_too():
+    qr = IncrementalQR()
+    qr.add_many(np.array([[500.0, 200.0], [800.0, 200.0], [1100.0, 200.0]]), np.array([50.0, 80.0, 110.0]))
+    params = np.array(qr.solve())
+    assert np.all(np.isfinite(params)) and np.all(np.abs(params) < 1e3)
+    assert qr.mse(params) < 1e-12
+
+
+def test_ridge_shrinks_the_slopes():
+    X, y = _data()
+    plain, ridge = IncrementalQR(), IncrementalQR(ridge=1e9)
+    plain.add_many(X, y)
+    ridge.add_many(X, y)
+    assert np.hypot(*ridge.solve()[:2]) < np.hypot(*plain.solve()[:2])
+
+
+def test_empty_solver():
+    qr = IncrementalQR()
+    assert qr.solve() == [0.0, 0.0, 0.0]
+    assert qr.mse([1, 2, 3]) == float("inf")
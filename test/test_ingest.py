@@ -0,0 +1,52 @@
+import io
+
+import numpy as np
+
+from src.ingest import MAX_REPORTED_ERRORS, ingest_lap_log, time_to_milliseconds, times_to_milliseconds
+
+
+LOG = """180
+  01      00:00.14      00:00.14
+  02      00:00.71      00:00.57
+
+90
+  01      00:00.10      00:00.10
+"""
+
+
+def ingest(text, batch_size=4096):
+    batches = []
+    report = ingest_lap_log(io.StringIO(text), batches.append, batch_size)
+    return report, batches
+
+
+def test_lap_log_becomes_rows():
+    report, batches = ingest(LOG)
+    assert report == {"rows": 3, "rejected": 0, "batches": 1, "errors": []}
+    [rows] = batches
+    assert rows[1] == {"Height": 180, "Bounce Number": 2, "Total Time": "00:00.71", "Interval Time": "00:00.57",
+                       "Total Time (ms)": 710, "Interval Time (ms)": 570}
+    assert rows[2]["Height"] == 90
+
+
+def test_vectorized_times_match_the_scalar_conversion():
+    times = ["00:00.14", "00:00.57", "01:02.35", "9:59.99", "00:00.29"]
+    np.testing.assert_array_equal(times_to_milliseconds(times), [time_to_milliseconds(t) for t in times])
+    assert times_to_milliseconds([]).dtype == np.int64
+
+
+def test_bad_lines_are_rejected_with_their_line_number():
+    text = "  01 00:00.10 00:00.10\n120\n  01 00:00.20\n  02 00:xx.20 00:00.10\n  00 00:00.30 00:00.30\n  03 00:00.40 00:00.20\n"
+    report, batches = ingest(text)
+    assert report["rows"] == 1 and report["rejected"] == 4
+    assert [error.split(":")[0] for error in report["errors"]] == ["line 1", "line 3", "line 4", "line 5"]
+    assert batches == [[{"Height": 120, "Bounce Number": 3, "Total Time": "00:00.40", "Interval Time": "00:00.20",
+                         "Total Time (ms)": 400, "Interval Time (ms)": 200}]]
+
+
+def test_batches_and_error_cap():
+    report, batches = ingest("100\n" + "  01 00:00.10 00:00.10\n" * 10, batch_size=4)
+    assert [len(rows) for rows in batches] == [4, 4, 2] and report["batches"] == 3
+    report, _ = ingest("garbage line\n" * (MAX_REPORTED_ERRORS + 10))
+    assert report["rejected"] == MAX_REPORTED_ERRORS + 10 and len(report["errors"]) == MAX_REPORTED_ERRORS
+    assert report["batches"] == 0
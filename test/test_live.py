@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.live import BounceSession, SessionError, format_lap_time
+
+
+def test_format_lap_time():
+    assert format_lap_time(710) == "00:00.71"
+    assert format_lap_time(61_250) == "01:01.25"
+
+
+def test_bounces_become_dataset_rows():
+    session = BounceSession(max_model_bounce=2)
+    session.start()
+    assert [session.bounce(t) for t in (700, 1300, 1800)] == [1, 2, 3]
+    np.testing.assert_array_equal(session.features(), [[700, 700], [1300, 600], [1800, 500]])
+    np.testing.assert_array_equal(session.model_features(), [[700, 700], [1300, 600]])
+    rows = session.rows(120)
+    assert [row['Bounce Number'] for row in rows] == [1, 2, 3]
+    assert rows[1]['Interval Time'] == "00:00.60"
+    assert rows[2]['Total Time (ms)'] == 1800 and rows[2]['Height'] == 120.0
+
+
+def test_summary_is_the_mean_of_the_bounce_predictions():
+    session = BounceSession()
+    session.start()
+    session.bounce(700)
+    session.bounce(1300)
+    summary = session.summary(np.array([100.0, 110.0]))
+    assert summary["bounce"] == 2 and summary["predicted_height_cm"] == 105.0
+    assert summary["intervals_ms"] == [700, 600]
+
+
+def test_bounce_errors():
+    session = BounceSession(max_bounces=2)
+    with pytest.raises(SessionError):
+        session.bounce(100)  # before start
+    session.start()
+    session.bounce(100)
+    with pytest.raises(SessionError):
+        session.bounce(100)  # not after the previous one
+    session.bounce(200)
+    with pytest.raises(SessionError):
+        session.bounce(300)  # more than max_bounces
+
+
+@pytest.mark.parametrize("height", [math.nan, math.inf, -10, 0])
+def test_invalid_heights_are_refused(height):
+    session = BounceSession()
+    session.start()
+    session.bounce(500)
+    with pytest.raises(SessionError):
+        session.rows(height)
+
+
+def test_nothing_to_submit():
+    session = BounceSession()
+    session.start()
+    with pytest.raises(SessionError):
+        session.rows(100)
+
+
+def test_websocket_submit_stores_a_drop_once(client, app_module):
+    rows = len(app_module.full_bounce_data)
+    with client.websocket_connect("/ws/bounces") as ws:
+        ws.send_json({"type": "start"})
+        ws.send_json({"type": "bounce", "t_ms": 700})
+        assert ws.receive_json()["type"] == "prediction"
+        ws.send_json({"type": "submit", "height": float("nan")})
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "submit", "height": 90})
+        assert ws.receive_json() == {"type": "stored", "drop": 1, "rows": 1}
+        ws.send_json({"type": "submit", "height": 90})
+        assert ws.receive_json()["type"] == "error"
+    assert len(app_module.full_bounce_data) == rows + 1
@@ -0,0 +1,28 @@
+import pytest
+
+from src.loadtest import Recorder, summarize
+
+
+def test_failed_requests_count_in_the_percentiles():
+    recorder = Recorder(measure_from=0.0, timeout=30.0)
+    for _ in range(90):
+        recorder.record("predict", 1.0, 0.01, 200)
+    for _ in range(5):
+        recorder.fail("predict", 1.0, TimeoutError(), 30.0)
+    for _ in range(5):
+        recorder.fail("predict", 1.0, OverflowError())  # never sent, counted at the timeout
+    recorder.fail("predict", -1.0, TimeoutError(), 30.0)  # during the warmup
+    summary = summarize(recorder.samples, duration=10.0)
+    assert summary["requests"] == 100 and summary["errors"] == 10
+    assert summary["throughput_rps"] == 9.0
+    assert summary["p95_s"] == pytest.approx(30.0) and summary["max_s"] == 30.0
+    assert summary["ok_p99_s"] == pytest.approx(0.01)
+    assert recorder.failures == {"predict: TimeoutError": 5, "predict: OverflowError": 5}
+
+
+def test_error_statuses_count_at_their_latency():
+    recorder = Recorder(measure_from=0.0)
+    recorder.record("measure", 1.0, 0.5, 500)
+    summary = summarize(recorder.samples, duration=1.0)
+    assert summary["errors"] == 1 and summary["p50_s"] == 0.5 and "ok_p50_s" not in summary
+    assert summary["status_codes"] == {"500": 1}
@@ -0,0 +1,56 @@
+import pytest
+
+from src.metrics import CONTENT_TYPE, Counter, Gauge, Histogram, Registry
+
+
+def test_exposition_format():
+    registry = Registry()
+    runs = Counter("test_runs", "Runs by outcome", labelnames=("outcome",), registry=registry)
+    rows = Gauge("test_rows", "Rows", registry=registry)
+    seconds = Histogram("test_seconds", "Durations", buckets=(1.0, 0.1), registry=registry)
+    runs.labels(outcome="ok").inc()
+    runs.labels(outcome="ok").inc(2)
+    runs.labels(outcome='say "hi"\n').inc()
+    rows.set_function(lambda: 42)
+    for value in (0.05, 0.1, 0.5, 3):
+        seconds.observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_runs Runs by outcome",
+        "# TYPE test_runs counter",
+        'test_runs_total{outcome="ok"} 3.0',
+        'test_runs_total{outcome="say \\"hi\\"\\n"} 1.0',
+        "# HELP test_rows Rows",
+        "# TYPE test_rows gauge",
+        "test_rows 42.0",
+        "# HELP test_seconds Durations",
+        "# TYPE test_seconds histogram",
+        # cumulative, a value on a bound counts into that bucket
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 3.65",
+        "test_seconds_count 4",
+    ]
+
+
+def test_counters_only_go_up_and_names_are_unique():
+    registry = Registry()
+    runs = Counter("test_runs", "Runs", registry=registry)
+    with pytest.raises(ValueError):
+        runs.inc(-1)
+    with pytest.raises(ValueError):
+        Gauge("test_runs", "Again", registry=registry)
+
+
+def test_metrics_endpoint(client):
+    assert client.get("/api/v1/stats").status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"] == CONTENT_TYPE
+    lines = response.text.splitlines()
+    assert "# TYPE tenniscale_http_request_duration_seconds histogram" in lines
+    # labeled by the route template, not by the path
+    assert any(line.startswith('tenniscale_http_request_duration_seconds_count{method="GET",route="/api/v1/stats",'
+                               'status="200"}') for line in lines)
+    assert any(line.startswith('tenniscale_dataset_rows{dataset="full"}') for line in lines)
+    assert any(line.startswith("tenniscale_best_mse ") for line in lines)
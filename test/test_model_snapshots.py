@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from src.fortuna import FortunaModel, ModelSnapshot
+
+
+def _publish(model, params, mse):
+    snapshot = model.publish(params, mse)
+    model.save_params()
+    return snapshot
+
+
+def test_versions_continue_after_a_restart(tmp_path):
+    path = str(tmp_path / "params.json")
+    model = FortunaModel(params_file=path)
+    versions = [_publish(model, [0.1, 0.2, i], 10.0 - i).version for i in range(5)]
+    assert versions == [1, 2, 3, 4, 5]
+    reloaded = FortunaModel(params_file=path)
+    assert reloaded.snapshot.version == 5
+    assert reloaded.snapshot.params == (0.1, 0.2, 4.0)
+    assert _publish(reloaded, [0.3, 0.2, 0.1], 1.0).version == 6
+
+
+def test_versions_are_not_reused_after_a_rollback_and_restart(tmp_path):
+    path = str(tmp_path / "params.json")
+    model = FortunaModel(params_file=path)
+    for i in range(3):
+        _publish(model, [0.1, 0.2, i], 10.0 - i)
+    assert model.rollback(1).version == 1
+    with open(path) as f:
+        assert json.load(f)["model_version"] == 1
+    reloaded = FortunaModel(params_file=path)
+    assert reloaded.snapshot.version == 1
+    assert _publish(reloaded, [0.5, 0.5, 0.5], 0.5).version == 4
+
+
+def test_installed_snapshots_move_the_counter(tmp_path):
+    # a follower that installed the leader's version 20 publishes above it once it leads itself
+    model = FortunaModel(params_file=str(tmp_path / "params.json"))
+    model.install(ModelSnapshot(20, (0.1, 0.2, 0.3), 5.0, None, 0.0))
+    assert model.publish([0.1, 0.2, 0.4], 4.0).version == 21
+    staging = model.staging_copy()
+    assert staging.publish([0.1, 0.2, 0.5], 3.0).version == 22
+    assert model.publish([0.1, 0.2, 0.6], 2.0).version == 23
+
+
+def test_old_params_files_still_load(tmp_path):
+    path = tmp_path / "params.json"
+    path.write_text(json.dumps({"best_params": [0.1, 0.2, 0.3], "best_mse": 2.0, "version": 3}))
+    model = FortunaModel(params_file=str(path))
+    assert model.snapshot.version == 3
+    assert model.publish([0.1, 0.2, 0.4], 1.0).version == 4
+
+
+def test_rollback_to_an_unknown_version(tmp_path):
+    model = FortunaModel(params_file=str(tmp_path / "params.json"))
+    _publish(model, [0.1, 0.2, 0.3], 1.0)
+    with pytest.raises(KeyError):
+        model.rollback(99)
+
+
+def test_params_and_mse_only_change_together(tmp_path):
+    model = FortunaModel(params_file=str(tmp_path / "params.json"))
+    snapshot = model.publish([0.1, 0.2, 0.3], 5.0)
+    with pytest.raises(AttributeError):
+        model.best_mse = float('inf')
+    with pytest.raises(AttributeError):
+        model.best_params = [1.0, 2.0, 3.0]
+    assert model.snapshot is snapshot
+    assert (model.best_params, model.best_mse) == ([0.1, 0.2, 0.3], 5.0)
@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+from src.persistence import ParamStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ParamStore(str(tmp_path / "best_params.json"))
+    yield store
+    store.close()
+
+
+def test_stage_writes_nothing_until_flush(store):
+    assert not store.flush()
+    store.stage([1.0, 2.0, 3.0], 12.5, model_version=4)
+    assert store.dirty and not os.path.exists(store.path)
+    assert store.flush() and not store.dirty
+    with open(store.path) as f:
+        saved = json.load(f)
+    assert saved["best_params"] == [1.0, 2.0, 3.0] and saved["best_mse"] == 12.5
+    assert saved["model_version"] == 4 and saved["version"] == 1
+    assert store.load() == saved
+    # no temp files left behind
+    assert sorted(os.listdir(os.path.dirname(store.path))) == ["best_params.json", "best_params.json.bak"]
+
+
+def test_load_falls_back_to_the_backup(store):
+    store.stage([1.0, 2.0, 3.0], 12.5)
+    store.flush()
+    with open(store.path, "w") as f:
+        f.write('{"best_params": [1.0, 2.')  # a torn write
+    assert store.load()["best_params"] == [1.0, 2.0, 3.0]
+    os.unlink(store.path)
+    assert store.load()["best_mse"] == 12.5
+    os.unlink(store.backup_path)
+    assert store.load() is None
+
+
+def test_a_failed_write_keeps_the_params_staged(store, monkeypatch):
+    def fail(path, snapshot):
+        raise OSError("disk full")
+
+    store.stage([1.0, 2.0, 3.0], 12.5)
+    monkeypatch.setattr(ParamStore, "_write_atomic", staticmethod(fail))
+    with pytest.raises(OSError):
+        store.flush()
+    assert store.dirty
+    monkeypatch.undo()
+    assert store.flush() and store.load()["best_mse"] == 12.5
+
+
+def test_versions_continue_from_the_file(tmp_path):
+    path = str(tmp_path / "best_params.json")
+    first, second = ParamStore(path), ParamStore(path)
+    first.stage([1.0, 2.0, 3.0], 12.5)
+    first.flush()
+    second.stage([1.0, 2.0, 3.5], 11.0)
+    second.flush()
+    first.stage([1.0, 2.0, 4.0], 10.0)
+    first.flush()
+    assert [first.version, second.version] == [3, 2]
+    assert ParamStore(path).load()["version"] == 3
+
+
+def test_invalid_params_are_not_loaded(store):
+    with open(store.path, "w") as f:
+        json.dump({"best_params": [1.0, 2.0], "best_mse": 1.0}, f)
+    assert store.load() is None
+
+
+def test_flush_doesnt_need_fchmod(store, monkeypatch):
+    # os.fchmod only exists on windows since python 3.13
+    monkeypatch.delattr(os, "fchmod", raising=False)
+    store.stage([1.0, 2.0, 3.0], 12.5)
+    assert store.flush()
+    if os.name == "posix":
+        assert os.stat(store.path).st_mode & 0o777 == 0o644
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from src.http_cache import IMMUTABLE
+from src.plots import (PLOT_NAMES, RENDERERS, PlotCache, RenderedPlot, bounce_profile, count_rows, new_figure,
+                       render_lines, render_png, render_scatter)
+
+
+def test_bounce_profile_keeps_its_digits_with_a_large_mean():
+    bounces = np.array([1, 1, 1, 2, 2, np.nan, 3])
+    values = 1e9 + np.array([0.5, 1.5, 2.5, 10.0, 12.0, 5.0, 7.0])
+    present, means, stds = bounce_profile(bounces, values)
+    assert present.tolist() == [1, 2, 3]
+    np.testing.assert_allclose(means, [values[:3].mean(), values[3:5].mean(), values[6]])
+    np.testing.assert_allclose(stds, [values[:3].std(), values[3:5].std(), 0.0], atol=1e-6)
+
+
+def test_plot_cache_renders_a_figure_once_per_version(monkeypatch):
+    renders, snapshots = [], []
+    monkeypatch.setattr(PlotCache, "_render", staticmethod(
+        lambda name, inputs, threshold: renders.append((name, inputs)) or RenderedPlot(f"{name} {inputs}".encode())))
+
+    def snapshot(version):
+        def take():
+            snapshots.append(version)
+            return version
+        return take
+
+    cache = PlotCache(max_workers=1)
+    try:
+        first = cache.get("scatter", 1, snapshot(1))
+        assert cache.get("scatter", 1, snapshot(1)) is first
+        assert first.result().png == b"scatter 1"
+        cache.prefetch(1, snapshot(1))
+        assert cache.get("box", 1, snapshot(1)).result().png == b"box 1"
+        # a new version takes a new snapshot and renders again
+        assert cache.get("scatter", 2, snapshot(2)).result().png == b"scatter 2"
+    finally:
+        cache.shutdown()
+    assert snapshots == [1, 2]
+    assert sorted(renders) == sorted([(name, 1) for name in PLOT_NAMES] + [("scatter", 2)])
+
+
+def test_a_failed_render_is_tried_again(monkeypatch):
+    attempts = []
+
+    def render(name, inputs, threshold):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise RuntimeError("no figure")
+        return RenderedPlot(b"png")
+
+    monkeypatch.setattr(PlotCache, "_render", staticmethod(render))
+    cache = PlotCache(max_workers=1)
+    try:
+        with pytest.raises(RuntimeError):
+            cache.get("lines", 1, lambda: None).result()
+        assert cache.get("lines", 1, lambda: None).result().png == b"png"
+    finally:
+        cache.shutdown()
+    assert attempts == ["lines", "lines"]
+
+
+def test_results_plots_answer_if_none_match_with_304(client, app_module):
+    # take in whatever other tests appended, so the version doesnt change halfway through
+    app_module.catch_up()
+    version = app_module.data_version
+    response = client.get("/api/results/plots/scatter.png")
+    assert response.status_code == 200 and response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    cached = client.get("/api/results/plots/scatter.png", params={"v": version}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["etag"] == etag and cached.headers["cache-control"] == IMMUTABLE
+    assert client.get("/api/results/plots/scatter.png", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert client.get("/api/results/plots/pie.png").status_code == 404
+
+
+def groups_of(rows_per_height):
+    rng = np.random.default_rng(0)
+    return {height: {'Bounce Number': np.tile(np.arange(1.0, 5.0), rows // 4),
+                     'Total Time (ms)': rng.uniform(500, 3000, rows),
+                     'Interval Time (ms)': rng.uniform(200, 800, rows)}
+            for height, rows in rows_per_height.items()}
+
+
+def test_density_mode_switches_on_above_the_threshold(monkeypatch):
+    seen = []
+    monkeypatch.setitem(RENDERERS, "scatter", lambda groups, stats, dense=False: seen.append(dense) or new_figure())
+    groups = groups_of({100: 8, 150: 4})
+    assert count_rows(groups) == 12
+    render_png("scatter", groups, None, density_threshold=12)
+    render_png("scatter", groups, None, density_threshold=11)
+    assert seen == [False, True]
+
+
+def test_density_figures_draw_summaries_instead_of_rows():
+    from matplotlib.collections import PathCollection, PolyCollection, QuadMesh
+    groups = groups_of({100: 400, 150: 200})
+
+    scatter = render_scatter(groups, None, dense=True).axes[0]
+    assert [type(c) for c in scatter.collections].count(QuadMesh) == 1
+    # one marker per height for the means
+    assert [len(c.get_offsets()) for c in scatter.collections if isinstance(c, PathCollection)] == [1, 1]
+
+    total, interval = render_lines(groups, None, dense=True).axes
+    for ax in (total, interval):
+        assert [len(line.get_xdata()) for line in ax.lines] == [4, 4]
+        assert sum(isinstance(c, PolyCollection) for c in ax.collections) == 2
+    assert len(render_lines(groups, None, dense=False).axes[0].lines[0].get_xdata()) == 400
@@ -0,0 +1,22 @@
+import os
+import signal
+
+import numpy as np
+
+from src.fortuna import FortunaModel, process_pool, shutdown_pools
+
+
+def test_parallel_search_survives_a_dead_pool_process(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(100, 3000, size=(100, 2))
+    y = 0.05 * X[:, 0] - 0.02 * X[:, 1] + 7
+    model = FortunaModel(params_file=str(tmp_path / "params.json"))
+    try:
+        expected = model.parallel_search(X, y, 200, workers=2, seed=1)
+        pool = process_pool(2)
+        for pid in list(pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert model.parallel_search(X, y, 200, workers=2, seed=1) == expected
+        assert process_pool(2) is not pool
+    finally:
+        shutdown_pools()
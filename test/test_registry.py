@@ -0,0 +1,181 @@
+import threading
+import time
+
+import pytest
+
+from src.registry import ModelRegistry, Profile, UnknownProfile, check_profile_id
+
+OPTIONS = {"solver": "lstsq"}
+
+
+def _rows(heights=(50, 100, 150, 200), bounce=None):
+    return [{'Height': h, 'Bounce Number': bounce, 'Total Time': None, 'Interval Time': None,
+             'Total Time (ms)': 8.0 * h + i, 'Interval Time (ms)': 3.0 * h - i} for i, h in enumerate(heights)]
+
+
+def _wait_for_calibration(profile, runs=1, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while profile.calibration.runs < runs or profile.calibration.running:
+        assert time.monotonic() < deadline, "calibration didnt finish"
+        time.sleep(0.01)
+
+
+def test_profile_ids_are_checked():
+    assert check_profile_id("clay-dunlop_2.0") == "clay-dunlop_2.0"
+    for bad in ("", "../etc", "a/b", ".hidden", "x" * 65, None):
+        with pytest.raises(ValueError):
+            check_profile_id(bad)
+
+
+def test_unknown_profiles_are_only_created_on_request(tmp_path):
+    registry = ModelRegistry(str(tmp_path), model_options=OPTIONS)
+    with pytest.raises(UnknownProfile):
+        with registry.use("clay"):
+            pass
+    with registry.use("clay", create=True) as profile:
+        assert profile.id == "clay"
+    assert registry.exists("clay")
+    assert registry.profiles() == ["clay"]
+    registry.close()
+
+
+def test_least_recently_used_profile_is_evicted_and_closed(tmp_path):
+    registry = ModelRegistry(str(tmp_path), capacity=2, model_options=OPTIONS)
+    for name in ("a", "b"):
+        with registry.use(name, create=True):
+            pass
+    with registry.use("a") as a:  # b is the least recently used now
+        pass
+    with registry.use("c", create=True):
+        pass
+    assert registry.loaded() == ["a", "c"]
+    assert registry.status()["evictions"] == 1
+    assert not a.evicted
+    registry.close()
+
+
+def test_a_profile_in_use_is_closed_when_its_last_user_is_done(tmp_path):
+    registry = ModelRegistry(str(tmp_path), capacity=1, model_options=OPTIONS)
+    with registry.use("a", create=True) as a:
+        with registry.use("b", create=True):
+            pass
+        assert a.evicted
+        a.store.last_offset()  # still open while in use
+    with pytest.raises(Exception):
+        a.store.last_offset()
+    registry.close()
+
+
+def test_evicted_profile_reloads_its_data_and_params(tmp_path):
+    registry = ModelRegistry(str(tmp_path), capacity=1, model_options=OPTIONS, debounce=0.01)
+    with registry.use("a", create=True) as profile:
+        profile.measure(_rows())
+        _wait_for_calibration(profile)
+        params = profile.model.snapshot.params
+    with registry.use("b", create=True):
+        pass
+    with registry.use("a") as profile:
+        assert len(profile.data) == 4
+        assert profile.model.snapshot.params == params
+    registry.close()
+
+
+def test_two_workers_on_one_profile_converge(tmp_path):
+    first = Profile("p", str(tmp_path / "p"), OPTIONS, debounce=0.01, sync_interval=0)
+    second = Profile("p", str(tmp_path / "p"), OPTIONS, debounce=0.01, sync_interval=0)
+    first.measure(_rows())
+    _wait_for_calibration(first)
+    second.refresh(force=True)
+    assert len(second.data) == 4
+    assert second.model.snapshot.params == first.model.snapshot.params
+
+    second.measure(_rows(heights=(60, 120, 180)))
+    _wait_for_calibration(second)
+    first.refresh(force=True)
+    assert len(first.data) == len(second.data) == 7
+    assert first.model.snapshot.params == second.model.snapshot.params
+    first.close()
+    second.close()
+
+
+def test_row_filter_keeps_the_late_bounces_out(tmp_path):
+    profile = Profile("p", str(tmp_path / "p"), OPTIONS,
+                      row_filter=lambda row: row['Bounce Number'] is None or row['Bounce Number'] <= 4)
+    profile.measure(_rows(bounce=2) + _rows(bounce=7))
+    assert len(profile.data) == 4
+    profile.close()
+
+
+def test_workers_that_calibrated_independently_converge(tmp_path):
+    first = Profile("p", str(tmp_path / "p"), OPTIONS, debounce=0.01, sync_interval=0)
+    second = Profile("p", str(tmp_path / "p"), OPTIONS, debounce=0.01, sync_interval=0)
+    first.measure(_rows())
+    _wait_for_calibration(first)
+    second.measure(_rows(heights=(60, 120, 180)))  # calibrates on all 7 rows, without having read first's params
+    _wait_for_calibration(second)
+    assert first.model.snapshot.params != second.model.snapshot.params
+    first.refresh(force=True)
+    assert first.model.snapshot.params == second.model.snapshot.params
+    assert first.model.store.version == second.model.store.version == 2
+    first.close()
+    second.close()
+
+
+def test_concurrent_first_uses_load_a_profile_once(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path), model_options=OPTIONS)
+    popped = threading.local()
+
+    class Loading(dict):
+        def pop(self, *args):
+            popped.now = True
+            return super().pop(*args)
+
+    class SlowLock:
+        # lets the other threads run right after the loading lock is dropped, a second load would happen then
+        def __init__(self):
+            self._lock = threading.Lock()
+
+        def __enter__(self):
+            self._lock.acquire()
+
+        def __exit__(self, *exc):
+            self._lock.release()
+            if getattr(popped, "now", False):
+                popped.now = False
+                time.sleep(0.2)
+
+    def slow_profile(*args):
+        time.sleep(0.05)
+        return Profile(*args)
+
+    registry._lock = SlowLock()
+    registry._loading = Loading()
+    monkeypatch.setattr("src.registry.Profile", slow_profile)
+    loaded = []
+
+    def use(delay):
+        time.sleep(delay)
+        with registry.use("clay", create=True) as profile:
+            loaded.append(profile)
+
+    # the requests keep coming in while the first one loads the profile
+    threads = [threading.Thread(target=use, args=(0.02 * i,)) for i in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.loads == 1 and len(loaded) == 12
+    assert all(profile is loaded[0] for profile in loaded)
+    registry.close()
+
+
+def test_a_failed_load_lets_the_next_request_try_again(tmp_path):
+    registry = ModelRegistry(str(tmp_path), model_options=OPTIONS)
+    with pytest.raises(UnknownProfile):
+        with registry.use("clay"):
+            pass
+    assert registry._loading == {}
+    with registry.use("clay", create=True):
+        pass
+    assert registry.loads == 1
+    registry.close()
@@ -0,0 +1,94 @@
+import mmap
+import os
+import shutil
+import subprocess
+import sys
+
+from src.shared import _GENERATION, LeaderLock, SharedParams
+
+
+def test_read_before_anything_was_published(tmp_path):
+    shared = SharedParams(str(tmp_path / "params"))
+    assert shared.generation() == 0
+    assert shared.read() is None
+    shared.close()
+
+
+def test_write_and_read_back_from_another_handle(tmp_path):
+    path = str(tmp_path / "params")
+    writer, reader = SharedParams(path), SharedParams(path)
+    writer.write([0.1, 0.2, 0.3], 12.5, 42, version=7)
+    snapshot = reader.read()
+    assert snapshot.params == [0.1, 0.2, 0.3]
+    assert (snapshot.mse, snapshot.offset, snapshot.version) == (12.5, 42, 7)
+    assert snapshot.generation == reader.generation() == 2
+    writer.close()
+    reader.close()
+
+
+def _leave_odd_generation(path):
+    fd = os.open(path, os.O_RDWR)
+    with mmap.mmap(fd, _GENERATION.size) as m:
+        _GENERATION.pack_into(m, 0, 5)
+    os.close(fd)
+
+
+def test_reopen_recovers_from_an_interrupted_write(tmp_path):
+    path = str(tmp_path / "params")
+    SharedParams(path).close()
+    _leave_odd_generation(path)
+    shared = SharedParams(path)
+    assert shared.generation() == 6
+    assert shared.read() is not None
+    shared.write([1.0, 2.0, 3.0], 1.0, 1)
+    assert shared.generation() == 8
+    shared.close()
+
+
+def test_read_gives_up_on_a_writer_that_never_finishes(tmp_path):
+    path = str(tmp_path / "params")
+    shared = SharedParams(path)
+    _leave_odd_generation(path)  # after the open, like a writer dying in another live process
+    assert shared.read() is None
+    shared.write([1.0, 2.0, 3.0], 1.0, 1)
+    assert shared.generation() % 2 == 0
+    assert shared.read().params == [1.0, 2.0, 3.0]
+    shared.close()
+
+
+def test_calibration_requests_count_up(tmp_path):
+    shared = SharedParams(str(tmp_path / "params"))
+    shared.request_calibration()
+    shared.request_calibration()
+    assert shared.calibration_requests() == 2
+    shared.close()
+
+
+def test_only_one_leader_until_it_releases(tmp_path):
+    path = str(tmp_path / "leader")
+    first, second = LeaderLock(path), LeaderLock(path)
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert first.is_leader and not second.is_leader
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_without_fcntl_the_app_runs_as_its_own_leader(tmp_path):
+    # like windows: there is no fcntl module, src.main still has to import and this worker leads
+    script = (
+        "import sys\n"
+        "sys.modules['fcntl'] = None\n"
+        "import src.main\n"
+        "from src.shared import LeaderLock\n"
+        "other = LeaderLock(src.main.leader.path)\n"
+        "assert src.main.leader.try_acquire() and other.try_acquire()\n"
+        "src.main.shared_params.write([0.1, 0.2, 0.3], 1.0, 1)\n"
+        "assert src.main.shared_params.read().params == [0.1, 0.2, 0.3]\n"
+    )
+    shutil.copy("assets/best_params.json", tmp_path / "best_params.json")
+    env = dict(os.environ, TENNISCALE_DB=str(tmp_path / "measurements.sqlite3"),
+               TENNISCALE_PARAMS_FILE=str(tmp_path / "best_params.json"))
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
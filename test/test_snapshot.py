@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.dataset import BounceDataset
+from src.snapshot import REBUILD_AFTER_ROWS, csv_signature, load_dataset, load_snapshot
+from src.store import MeasurementStore
+
+
+def rows(count, start=0):
+    return [{'Height': 100 + i, 'Bounce Number': None if i % 3 == 0 else i % 5, 'Total Time': None if i % 2 else "00:00.70",
+             'Interval Time': "00:00.70", 'Total Time (ms)': 700 + i, 'Interval Time (ms)': 650.5}
+            for i in range(start, start + count)]
+
+
+def test_from_columns_matches_the_rows(tmp_path):
+    store = MeasurementStore(str(tmp_path / "measurements.sqlite3"))
+    store.append_many(rows(20))
+    columns, offset = store.load_arrays()
+    assert offset == 20 and list(columns['id']) == list(range(1, 21))
+    assert BounceDataset.from_columns(columns).rows() == BounceDataset(rows(20)).rows() == rows(20)
+    tail, offset = store.load_arrays(15)
+    assert offset == 20 and BounceDataset.from_columns(tail).rows() == rows(5, start=15)
+    empty, offset = store.load_arrays(20)
+    assert offset == 20 and len(BounceDataset.from_columns(empty)) == 0
+    store.close()
+
+
+def test_load_dataset_writes_and_reuses_the_snapshot(tmp_path):
+    store = MeasurementStore(str(tmp_path / "measurements.sqlite3"))
+    csv_path, snapshot_path = str(tmp_path / "seed.csv"), str(tmp_path / "snapshot.npz")
+    store.append_many(rows(30))
+    dataset, offset, source = load_dataset(store, csv_path, snapshot_path)
+    assert (source, offset, dataset.rows()) == ("store", 30, rows(30))
+
+    store.append_many(rows(5, start=30))
+    dataset, offset, source = load_dataset(store, csv_path, snapshot_path)
+    assert (source, offset, dataset.rows()) == ("snapshot", 35, rows(35))
+    # the tail was too short to rebuild the snapshot
+    columns, snapshot_offset = load_snapshot(snapshot_path, csv_signature(csv_path, store.store_id))
+    assert snapshot_offset == 30 and np.array_equal(columns['Height'], np.arange(100, 130))
+    assert columns['Total Time'][1] is None and columns['Total Time'][0] == "00:00.70"
+
+    store.append_many(rows(REBUILD_AFTER_ROWS, start=35))
+    dataset, offset, source = load_dataset(store, csv_path, snapshot_path)
+    assert source == "snapshot" and len(dataset) == offset == 35 + REBUILD_AFTER_ROWS
+    assert load_snapshot(snapshot_path, csv_signature(csv_path, store.store_id))[1] == offset
+    store.close()
+
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from src.store import COLUMNS, MeasurementStore
+
+
+def measurement(height, total=700, interval=700):
+    return {'Height': height, 'Bounce Number': None, 'Total Time': None, 'Interval Time': None,
+            'Total Time (ms)': total, 'Interval Time (ms)': interval}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MeasurementStore(str(tmp_path / "measurements.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_read_since_returns_the_rows_after_the_offset(store):
+    assert store.read_since(0) == ([], 0)
+    first = store.append_many([measurement(100), measurement(110)])
+    store.append(measurement(120))
+    rows, offset = store.read_since(0)
+    assert [row['Height'] for row in rows] == [100, 110, 120] and offset == 3
+    rows, offset = store.read_since(first)
+    assert [row['Height'] for row in rows] == [120] and offset == 3
+    assert store.read_since(offset) == ([], 3)
+    rows, offset = store.read_since(0, limit=2)
+    assert len(rows) == 2 and offset == 2
+    assert set(rows[0]) == set(COLUMNS)
+
+
+def test_two_stores_on_one_file_see_each_others_rows(store):
+    other = MeasurementStore(store.path)
+    try:
+        other.append(measurement(130))
+        rows, offset = store.read_since(0)
+        assert [row['Height'] for row in rows] == [130] and offset == store.last_offset() == 1
+    finally:
+        other.close()
+
+
+def test_read_chunks(store):
+    store.append_many([measurement(100 + i) for i in range(25)])
+    chunks = list(store.read_chunks(chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert [record[0] for chunk in chunks for record in chunk] == list(range(1, 26))
+    assert [len(chunk) for chunk in store.read_chunks(offset=20, chunk_size=10)] == [5]
+    heights = [record[1] for chunk in store.read_chunks(min_height=105, max_height=107) for record in chunk]
+    assert heights == [105, 106, 107]
+
+
+def test_read_chunks_stops_at_the_rows_that_were_there_when_it_started(store):
+    store.append_many([measurement(100 + i) for i in range(4)])
+    chunks = store.read_chunks(chunk_size=2)
+    assert len(next(chunks)) == 2
+    store.append(measurement(200))
+    assert [record[0] for chunk in chunks for record in chunk] == [3, 4]
+
+
+def test_measure_stores_off_the_event_loop(app_module, client, monkeypatch):
+    calls = []
+
+    def store_measurement(row):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()  # a worker thread, not the event loop
+        calls.append(row)
+        original(row)
+
+    original = app_module.store_measurement
+    monkeypatch.setattr(app_module, "store_measurement", store_measurement)
+    rows = len(app_module.full_bounce_data)
+    response = client.post("/api/measure", data={"height": 150, "total_time_ms": 720, "interval_time_ms": 720},
+                           follow_redirects=False)
+    assert response.status_code == 303
+    assert [row['Height'] for row in calls] == [150]
+    assert len(app_module.full_bounce_data) == rows + 1
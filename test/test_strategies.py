@@ -0,0 +1,42 @@
+import csv
+
+import numpy as np
+import pytest
+
+from src.fortuna import FortunaModel
+from src.store import from_csv_row
+from src.strategies import STRATEGIES, Objective, initial_bounds, make_strategy
+
+
+@pytest.fixture(scope="module")
+def data():
+    with open("src/tennis_ball_bounce_data.csv", newline="") as f:
+        rows = [row for row in map(from_csv_row, csv.DictReader(f)) if row["Bounce Number"] <= 4]
+    X = np.array([(row["Total Time (ms)"], row["Interval Time (ms)"]) for row in rows], dtype=np.float64)
+    y = np.array([row["Height"] for row in rows], dtype=np.float64)
+    design = np.column_stack([X, np.ones(len(X))])
+    optimum = np.linalg.lstsq(design, y, rcond=None)[0]
+    return X, y, float(np.mean((design @ optimum - y) ** 2))
+
+
+@pytest.mark.parametrize("name, tolerance", [("random", 1e-3), ("coordinate", 1e-3), ("cma", 1e-3), ("anneal", 0.05)])
+def test_strategies_get_close_to_the_least_squares_optimum(data, name, tolerance):
+    X, y, optimum = data
+    for seed in range(3):
+        objective = Objective(lambda candidates: FortunaModel.score_candidates(X, y, candidates), max_evaluations=5000)
+        result = make_strategy(name).search(objective, None, initial_bounds(X, y), np.random.default_rng(seed))
+        assert result.mse <= optimum * (1 + tolerance), (seed, result.as_dict())
+        assert result.evaluations <= 5000
+
+
+def test_budget_is_respected(data):
+    X, y, _ = data
+    for name in STRATEGIES:
+        objective = Objective(lambda candidates: FortunaModel.score_candidates(X, y, candidates), max_evaluations=50)
+        result = make_strategy(name).search(objective, None, initial_bounds(X, y), np.random.default_rng(0))
+        assert result.evaluations == 50 and result.stopped == "evaluations"
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        make_strategy("gradient")